@@ -0,0 +1,121 @@
+"""
+How much does drawing the LCD delay input handling?
+
+Replays synthetic key reports every millisecond while a busy terminal is drawn
+and converted at 30 Hz, first on the event loop and then on a worker thread
+(`G13DeviceOutputManager.parallel_render`), and reports how late the input was
+handled and how many frames were drawn. No G13 is needed.
+
+Run it from the top of the repo, on both builds to compare them:
+
+    python -m benchmarks.render_parallel
+    python3.14t -m benchmarks.render_parallel
+
+On the regular build the worker thread still has to take turns with the loop
+for the GIL; on the free-threaded build it doesn't.
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+
+import blinker
+
+from g13lib.device.g13_output import G13DeviceOutputManager
+from g13lib.device_manager import G13Manager
+from g13lib.lcd.terminal import LogEmulator
+from g13lib.render_fb import ImageToLPBM, LCDCompositor
+
+INPUT_INTERVAL_S = 0.001
+# roughly what a pynput key press costs
+HANDLER_WORK_S = 0.0001
+
+REPORTS = [
+    bytes([1, 0x80, 0x80, 0b00000001, 0, 0, 0, 0]),
+    bytes([1, 0x80, 0x80, 0, 0, 0, 0, 0]),
+]
+
+
+class FakeDevice:
+    """Converts frames as the real device does, but sends nothing."""
+
+    last_read_at = 0.0
+
+    def setLCD(self, fb_image):
+        ImageToLPBM(fb_image)
+
+    def update_leds(self, led_status):
+        pass
+
+    def set_backlight(self, r, g, b):
+        pass
+
+
+async def handle_key(event):
+    # stand in for the work of pressing a key
+    until = time.perf_counter() + HANDLER_WORK_S
+    while time.perf_counter() < until:
+        pass
+
+
+async def run(parallel: bool, seconds: float) -> tuple[list[float], int]:
+    output = G13DeviceOutputManager(FakeDevice())
+    output.parallel_render = parallel
+    terminal = LogEmulator()
+    output.set_compositor(LCDCompositor(terminal))
+    manager = G13Manager(FakeDevice())
+
+    frames = 0
+    lateness = []
+    end = time.perf_counter() + seconds
+
+    async def draw():
+        nonlocal frames
+        line = 0
+        while time.perf_counter() < end:
+            # something new to draw every frame
+            terminal.output(f"line {line} " * 4)
+            line += 1
+            await output.lcd_tick()
+            frames += 1
+            await asyncio.sleep(output.LCD_REFRESH_MS / 1000)
+
+    async def feed():
+        due = time.perf_counter()
+        i = 0
+        while due < end:
+            due += INPUT_INTERVAL_S
+            await asyncio.sleep(max(0.0, due - time.perf_counter()))
+            await manager.process_report(REPORTS[i % 2])
+            lateness.append(time.perf_counter() - due)
+            i += 1
+
+    with blinker.signal("g13_key").connected_to(handle_key):
+        await asyncio.gather(draw(), feed())
+    await output.stop_tasks()
+    return lateness, frames
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--seconds", type=float, default=3.0)
+    args = parser.parse_args()
+
+    gil = "enabled" if sys._is_gil_enabled() else "disabled"
+    print(f"Python {sys.version.split()[0]}, GIL {gil}")
+    for parallel in (False, True):
+        lateness, frames = asyncio.run(run(parallel, args.seconds))
+        lateness_ms = sorted(late * 1000 for late in lateness)
+        p99 = lateness_ms[int(len(lateness_ms) * 0.99)]
+        print(
+            f"{'worker thread' if parallel else 'event loop':>13}: "
+            f"{frames / args.seconds:5.1f} fps, input handled "
+            f"{statistics.median(lateness_ms):.2f} ms late (median), "
+            f"{p99:.2f} ms (p99), {lateness_ms[-1]:.2f} ms (worst)"
+        )
+
+
+if __name__ == "__main__":
+    main()
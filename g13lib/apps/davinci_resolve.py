@@ -1,3 +1,6 @@
+import functools
+from pathlib import Path
+
 import blinker
 from PIL import Image
 
@@ -6,6 +9,8 @@ from g13lib.lcd.images import DecayingImage
 from g13lib.render_fb import LCDCompositor
 from g13lib.single_app_manager import SingleAppManager
 
+ICON_DIR = Path(__file__).resolve().parents[2] / "icons"
+
 
 class DavinciInputManager(SingleAppManager):
     app_name = "DaVinci Resolve"
@@ -14,8 +19,10 @@ class DavinciInputManager(SingleAppManager):
 
     workspace_page: str = "edit"  # "edit", "fusion", "color"
 
-    # 32x32 icon for DaVinci Resolve
-    icon = Image.open("icons/davinci_resolve_icon.png")
+    @functools.cached_property
+    def icon(self) -> Image.Image:
+        """32x32 icon for DaVinci Resolve, loaded with the plugin."""
+        return Image.open(ICON_DIR / "davinci_resolve_icon.png")
 
     def __init__(self):
 
@@ -34,9 +41,9 @@ class DavinciInputManager(SingleAppManager):
         blinker.signal("g13_set_status").send("edit   fusion  color")
         return res
 
-    def deactivate(self):
+    def deactivate(self, release_focus: bool = True):
         blinker.signal("g13_clear_status").send()
-        return super().deactivate()
+        return super().deactivate(release_focus)
 
     def toggle_blade(self, action, key_code):
         """Cycle through playhead actions: normal -> blade -> trim -> normal"""
@@ -19,31 +19,36 @@ class GeneralManager(InputManager):
     """
 
     _compositor: LCDCompositor
+    # the current app's icon, fading out, once there's been one
+    _icon: DecayingImage | None = None
 
     def __init__(self):
         super().__init__()
         self._log_emulator = LogEmulator()
-        self._icon_image = None
+        self._compositor = self.compositor()
 
-        blinker.signal("release_focus").connect(self.activate)
-        blinker.signal("single_focus").connect(self.deactivate)
-        blinker.signal("current_app_icon").connect(self.update_icon)
+        self.connect("release_focus", self.activate)
+        self.connect("single_focus", self.deactivate)
+        self.connect("current_app_icon", self.update_icon)
 
     def compositor(self):
 
         return LCDCompositor(
             self._log_emulator,
-            self._icon_image,
         )
 
     def update_icon(self, icon: Image.Image):
-
-        self._icon_image = DecayingImage(
-            image=icon,
-            position=(64, 0),
-        )
-        blinker.signal("set_compositor").send(self.compositor())
+        if self._icon is None:
+            self._icon = DecayingImage(
+                image=icon,
+                position=(64, 0),
+            )
+            self._compositor.scene.append(self._icon)
+            if self.active:
+                self._icon.show()
+        else:
+            self._icon.set_image(icon)
 
     def activate(self, msg):
-        blinker.signal("set_compositor").send(self.compositor())
+        blinker.signal("set_compositor").send(self._compositor)
         return super().activate(msg)
@@ -1,45 +1,364 @@
-"""Helper functions and classes for async operations."""
+"""Helper functions and classes for async operations.
+
+Periodic work (the LCD refresh, the app monitor, joystick repeat, ...) runs on
+a single `Scheduler` rather than one coroutine per component. Timers that fall
+due within the same `resolution` window fire together on one wakeup, timers
+can be suspended while they have nothing to do, and the scheduler keeps track
+of how late each timer fires.
+
+The scheduler reads time from a clock object, so tests can swap in a
+`VirtualClock` and run through minutes of timers instantly.
+"""
 
 import asyncio
 import contextlib
+import functools
+import heapq
+import inspect
+import math
+import time
 import typing
 
+import blinker
+from loguru import logger
+
+
+class MonotonicClock:
+    """The real clock."""
+
+    def now(self) -> float:
+        return time.monotonic()
+
+    async def sleep(self, seconds: float | None, wakeup: asyncio.Event):
+        """Sleep for `seconds` (or forever, if None), or until `wakeup` is set."""
+        with contextlib.suppress(TimeoutError):
+            await asyncio.wait_for(wakeup.wait(), seconds)
+
+
+class VirtualClock:
+    """A clock that jumps straight to the next deadline instead of waiting."""
+
+    _now: float
+
+    def __init__(self, start: float = 0.0):
+        self._now = start
+
+    def now(self) -> float:
+        return self._now
+
+    def advance(self, seconds: float):
+        self._now += seconds
+
+    async def sleep(self, seconds: float | None, wakeup: asyncio.Event):
+        if seconds is None:
+            await wakeup.wait()
+            return
+        self._now += seconds
+        # let other tasks run, as a real sleep would
+        await asyncio.sleep(0)
+
+
+class Clock(typing.Protocol):
+    def now(self) -> float: ...
+
+    async def sleep(self, seconds: float | None, wakeup: asyncio.Event): ...
+
+
+class Timer:
+    """A periodic callback registered with a Scheduler."""
+
+    callback: typing.Callable
+    interval: float
+    name: str
+
+    due: float = 0.0
+    suspended: bool = False
+    cancelled: bool = False
+    # fire once, then cancel
+    once: bool = False
+
+    # how late the timer fired, in seconds
+    last_drift: float = 0.0
+    max_drift: float = 0.0
+    fired: int = 0
+
+    # the last async callback run, if it's still going
+    _running: asyncio.Future | None = None
+
+    def __init__(self, scheduler: "Scheduler", callback, interval: float, name: str):
+        self.scheduler = scheduler
+        self.callback = callback
+        self.interval = interval
+        self.name = name
+
+    def suspend(self):
+        """Stop firing until resumed."""
+        self.suspended = True
+
+    def resume(self):
+        """Start firing again, one interval from now. Does nothing if already running."""
+        if self.suspended and not self.cancelled:
+            self.suspended = False
+            self.scheduler._arm(self, self.scheduler.clock.now() + self.interval)
+
+    def fire_soon(self):
+        """Fire on the scheduler's next wakeup, then every interval from then.
+        Does nothing if suspended."""
+        if not self.suspended:
+            self.scheduler._arm(self, self.scheduler.clock.now())
+
+    def cancel(self):
+        self.cancelled = True
+        self.suspended = True
 
-async def run_periodic(callback, interval_ms: int, *, initial_delay_ms: int = 0):
-    """Run a callback periodically at the specified interval in milliseconds."""
-    loop = asyncio.get_running_loop()
-    if initial_delay_ms:
-        await asyncio.sleep(initial_delay_ms / 1000.0)
-    next_at = loop.time()
-    step = interval_ms / 1000.0
-    try:
+
+class Scheduler:
+    """Runs all periodic timers from a single task.
+
+    Timers live in a hashed wheel of `resolution`-sized slots: all timers due in
+    the same slot fire on the same wakeup, and the scheduler sleeps until the
+    next non-empty slot (or indefinitely, if every timer is suspended).
+    """
+
+    # warn when a timer fires at least this late (and more than an interval late)
+    DRIFT_WARNING_S = 0.05
+
+    clock: Clock
+    resolution: float
+
+    # if set, called as wrapper(callback, name) on each new timer's callback
+    callback_wrapper: typing.Callable[[typing.Callable, str], typing.Callable] | None = (
+        None
+    )
+
+    _slots: dict[int, list[Timer]]
+    _slot_heap: list[int]
+    _wakeup: asyncio.Event | None = None
+
+    def __init__(self, clock: Clock | None = None, resolution_ms: float = 1):
+        self.clock = clock or MonotonicClock()
+        self.resolution = resolution_ms / 1000.0
+        self.timers: list[Timer] = []
+        self._slots = {}
+        self._slot_heap = []
+
+    def every(
+        self,
+        interval_ms: float,
+        callback: typing.Callable,
+        *,
+        initial_delay_ms: float | None = None,
+        suspended: bool = False,
+        name: str | None = None,
+    ) -> Timer:
+        """Call `callback` every `interval_ms`. The callback may be async."""
+        interval = interval_ms / 1000.0
+        name = name or callback.__qualname__
+        if self.callback_wrapper is not None:
+            callback = self.callback_wrapper(callback, name)
+        timer = Timer(self, callback, interval, name)
+        self.timers.append(timer)
+        if suspended:
+            timer.suspended = True
+        else:
+            first = interval if initial_delay_ms is None else initial_delay_ms / 1000.0
+            self._arm(timer, self.clock.now() + first)
+        return timer
+
+    def after(
+        self, delay_ms: float, callback: typing.Callable, *, name: str | None = None
+    ) -> Timer:
+        """Call `callback` once, `delay_ms` from now, unless the timer's cancelled first."""
+        name = name or callback.__qualname__
+        if self.callback_wrapper is not None:
+            callback = self.callback_wrapper(callback, name)
+        timer = Timer(self, callback, delay_ms / 1000.0, name)
+        timer.once = True
+        self.timers.append(timer)
+        self._arm(timer, self.clock.now() + timer.interval)
+        return timer
+
+    def cancel(self, timer: Timer):
+        """Cancel a timer and forget it, so the scheduler holds no reference to it."""
+        timer.cancel()
+        self._disarm(timer)
+        if timer in self.timers:
+            self.timers.remove(timer)
+
+    def drift_report(self) -> dict[str, tuple[float, float]]:
+        """Last and worst drift of each timer, in ms."""
+        return {
+            timer.name: (timer.last_drift * 1000.0, timer.max_drift * 1000.0)
+            for timer in self.timers
+        }
+
+    def _slot(self, due: float) -> int:
+        # round up, so a timer never fires early (allowing for float error)
+        return math.ceil(due / self.resolution - 1e-9)
+
+    def _disarm(self, timer: Timer):
+        # an emptied slot stays in the heap, and is skipped when it comes up
+        bucket = self._slots.get(self._slot(timer.due))
+        if bucket is not None and timer in bucket:
+            bucket.remove(timer)
+
+    def _arm(self, timer: Timer, due: float):
+        # a timer's only ever in one slot
+        self._disarm(timer)
+        timer.due = due
+        slot = self._slot(due)
+        bucket = self._slots.get(slot)
+        if bucket is None:
+            self._slots[slot] = bucket = []
+            heapq.heappush(self._slot_heap, slot)
+        bucket.append(timer)
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def run(self, until: float | None = None):
+        """Fire timers as they fall due. Returns at clock time `until`, if given."""
+        self._wakeup = asyncio.Event()
         while True:
-            next_at += step
-            await asyncio.sleep(max(0.0, next_at - loop.time()))
-            await callback()
-    except asyncio.CancelledError:
-        return
+            self._wakeup.clear()
+            next_at = self._slot_heap[0] * self.resolution if self._slot_heap else None
+            if until is not None and (next_at is None or next_at > until):
+                if self.clock.now() >= until:
+                    return
+                next_at = until
+            now = self.clock.now()
+            if next_at is None or next_at > now:
+                await self.clock.sleep(
+                    None if next_at is None else next_at - now, self._wakeup
+                )
+                continue
+            slot = heapq.heappop(self._slot_heap)
+            for timer in self._slots.pop(slot):
+                self._fire(timer, slot)
+
+    def _fire(self, timer: Timer, slot: int):
+        # skip timers that were suspended or re-armed into another slot
+        if timer.suspended or self._slot(timer.due) != slot:
+            return
+        now = self.clock.now()
+        drift = now - timer.due
+        timer.last_drift = drift
+        timer.max_drift = max(timer.max_drift, drift)
+        timer.fired += 1
+        if drift > timer.interval and drift > self.DRIFT_WARNING_S:
+            logger.warning("Timer {} fired {:.0f} ms late", timer.name, drift * 1000)
+
+        if timer._running is None:
+            result = timer.callback()
+            if inspect.isawaitable(result):
+                # run async callbacks alongside the scheduler, so a slow one
+                # doesn't hold up every other timer
+                if inspect.iscoroutine(result):
+                    # start eagerly: a callback that doesn't need to wait
+                    # finishes right here, without a trip round the loop
+                    running = asyncio.Task(
+                        result, loop=asyncio.get_running_loop(), eager_start=True
+                    )
+                else:
+                    running = asyncio.ensure_future(result)
+                if running.done():
+                    self._callback_done(timer, running)
+                else:
+                    timer._running = running
+                    running.add_done_callback(
+                        functools.partial(self._callback_done, timer)
+                    )
+        else:
+            logger.debug("Timer {} skipped a beat, still busy", timer.name)
+
+        if timer.once:
+            self.cancel(timer)
+            return
+        if timer.suspended:
+            return
+        # skip any beats we've missed rather than firing them all at once
+        due = timer.due + timer.interval
+        now = self.clock.now()
+        if due <= now:
+            due += math.ceil((now - due) / timer.interval) * timer.interval
+        self._arm(timer, due)
+
+    def _callback_done(self, timer: Timer, future: asyncio.Future):
+        timer._running = None
+        if not future.cancelled() and future.exception() is not None:
+            logger.opt(exception=future.exception()).error(
+                "Error in timer {}", timer.name
+            )
+
+
+default_scheduler = Scheduler()
 
 
 class PeriodicComponent:
-    """Mix-in class for components that need to run periodic tasks."""
+    """Mix-in class for components that need to run periodic tasks.
+
+    Periodic callbacks are registered with `schedule`, which uses the shared
+    scheduler, and signal receivers with `connect`. Components can also list
+    other coroutines to run in `_tasks_to_start`. `stop_tasks` undoes all of
+    these.
+    """
+
+    scheduler: Scheduler = default_scheduler
 
     _tasks_to_start: list[typing.Coroutine]
     _tasks: list[asyncio.Task]
+    _timers: list[Timer]
+    _receivers: list[tuple[blinker.Signal, typing.Callable]]
+
+    def schedule(
+        self,
+        callback: typing.Callable,
+        interval_ms: float,
+        *,
+        initial_delay_ms: float | None = None,
+        suspended: bool = False,
+    ) -> Timer:
+        """Register a periodic callback for this component."""
+        if not hasattr(self, "_timers"):
+            self._timers = []
+        timer = self.scheduler.every(
+            interval_ms,
+            callback,
+            initial_delay_ms=initial_delay_ms,
+            suspended=suspended,
+        )
+        self._timers.append(timer)
+        return timer
+
+    def connect(self, signal_name: str, receiver: typing.Callable):
+        """Connect a receiver for this component, until its tasks are stopped."""
+        if not hasattr(self, "_receivers"):
+            self._receivers = []
+        signal = blinker.signal(signal_name)
+        signal.connect(receiver)
+        self._receivers.append((signal, receiver))
 
     def start_tasks(self, tg: asyncio.TaskGroup):
-        """Start any periodic tasks needed by this component."""
-        # the tasks will be added to _tasks by __init__
+        """Start any other tasks needed by this component."""
+        # the tasks will be added to _tasks_to_start by __init__
         # this needs to kick them off and add them to the provided TaskGroup
         started_tasks = []
-        for task in self._tasks_to_start:
+        for task in getattr(self, "_tasks_to_start", []):
             new_task = tg.create_task(task)
             started_tasks.append(new_task)
         self._tasks = started_tasks
 
     async def stop_tasks(self):
-        """Stop any periodic tasks needed by this component."""
+        """Stop this component's timers and tasks, and disconnect its receivers."""
+        for timer in getattr(self, "_timers", []):
+            self.scheduler.cancel(timer)
+        self._timers = []
+        for signal, receiver in getattr(self, "_receivers", []):
+            signal.disconnect(receiver)
+        self._receivers = []
         if not hasattr(self, "_tasks"):
+            # never started, so don't leave its coroutines waiting
+            for coroutine in getattr(self, "_tasks_to_start", []):
+                coroutine.close()
             return
         for task in self._tasks:
             task.cancel()
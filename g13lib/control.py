@@ -0,0 +1,307 @@
+"""
+A local control socket, so other programs can drive the G13 without importing
+g13lib.
+
+Clients connect to a Unix stream socket (`CONTROL_SOCKET`) and send frames: a
+4-byte big-endian length, then a JSON list of commands, each a list of a name
+and its arguments. A whole batch is run at once, so a shell hook or CI job can
+send hundreds of updates in one write:
+
+    [["print", "build started"], ["status", "building"], ["led_on", "M1"]]
+
+Commands:
+
+    print TEXT                  print on the LCD terminal
+    status TEXT                 set the terminal's status line
+    clear_status
+    led_on / led_off / led_toggle LED...     LEDs by name ("M1") or number
+    backlight COLOUR [FADE_MS]  "#rrggbb" or [r, g, b]
+    scroll ROWS                 scroll the terminal back (or forward, if negative)
+    subscribe / unsubscribe     start or stop receiving key and joystick events
+
+The server only writes back when something goes wrong with a batch,
+{"errors": [[index, message], ...]}, or to subscribers, {"event": "G1_PRESSED"}.
+Events are written without waiting for the client; a subscriber that falls
+more than `MAX_BACKLOG` bytes behind is disconnected rather than slowing down
+input. Batches are run between input events: the server yields to the loop
+every `COMMANDS_PER_YIELD` commands, so even a frame of thousands of commands
+doesn't hold up input.
+
+From the shell:
+
+    python -m g13lib.control print "build done"
+    python -m g13lib.control --batch < commands.jsonl    # a command per line
+    python -m g13lib.control subscribe
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import socket
+import struct
+import sys
+import typing
+
+import blinker
+from loguru import logger
+
+import g13lib.device.keycodes
+from g13lib.async_help import PeriodicComponent
+from g13lib.lighting import parse_colour
+from g13lib.watchdog import watched
+
+CONTROL_SOCKET = os.environ.get("G13_CONTROL_SOCKET", "/tmp/g13slop-control.sock")
+
+FRAME = struct.Struct(">I")
+MAX_FRAME = 1 << 20
+# commands sent per frame by the command line client
+BATCH_SIZE = 500
+
+
+def encode(message) -> bytes:
+    data = json.dumps(message, separators=(",", ":")).encode()
+    return FRAME.pack(len(data)) + data
+
+
+def led_number(led) -> int:
+    leds = g13lib.device.keycodes.leds
+    if led in leds:
+        return leds[led]
+    if type(led) is int and led in leds.values():
+        return led
+    raise ValueError(f"Unknown LED {led!r}")
+
+
+class ControlServer(PeriodicComponent):
+    """Runs batches of commands from local clients, and streams key events to
+    subscribers."""
+
+    # bytes waiting to be sent to a subscriber before it's dropped
+    MAX_BACKLOG = 1 << 16
+    # commands run before letting input through
+    COMMANDS_PER_YIELD = 50
+
+    path: str
+    subscribers: set[asyncio.StreamWriter]
+    # each is called with the client's writer and the command's arguments
+    commands: dict[str, typing.Callable]
+
+    def __init__(self, path: str = CONTROL_SOCKET):
+        self.path = path
+        self.subscribers = set()
+        self.commands = {
+            "print": self.print,
+            "status": self.status,
+            "clear_status": self.clear_status,
+            "led_on": self.led_on,
+            "led_off": self.led_off,
+            "led_toggle": self.led_toggle,
+            "backlight": self.backlight,
+            "scroll": self.scroll,
+            "subscribe": self.subscribe,
+            "unsubscribe": self.unsubscribe,
+        }
+        self._tasks_to_start = [self.serve()]
+        self.connect("g13_key", self.publish)
+        self.connect("g13_joy", self.publish)
+
+    # commands
+
+    def print(self, client, text):
+        blinker.signal("g13_print").send(str(text))
+
+    def status(self, client, text):
+        blinker.signal("g13_set_status").send(str(text))
+
+    def clear_status(self, client):
+        blinker.signal("g13_clear_status").send()
+
+    def led_on(self, client, *leds):
+        for led in leds:
+            blinker.signal("g13_led_on").send(led_number(led))
+
+    def led_off(self, client, *leds):
+        for led in leds:
+            blinker.signal("g13_led_off").send(led_number(led))
+
+    def led_toggle(self, client, *leds):
+        for led in leds:
+            blinker.signal("g13_led_toggle").send(led_number(led))
+
+    def backlight(self, client, colour, fade_ms=None):
+        kwargs = {} if fade_ms is None else {"fade_ms": float(fade_ms)}
+        blinker.signal("g13_backlight").send(parse_colour(colour), **kwargs)
+
+    def scroll(self, client, rows):
+        if type(rows) is not int:
+            raise ValueError(f"Invalid number of rows {rows!r}")
+        blinker.signal("g13_scroll").send(rows)
+
+    def subscribe(self, client):
+        self.subscribers.add(client)
+
+    def unsubscribe(self, client):
+        self.subscribers.discard(client)
+
+    # the server
+
+    async def run_batch(self, batch, client: asyncio.StreamWriter) -> list:
+        """Run a batch of commands, returning [index, message] for each that failed."""
+        if not isinstance(batch, list):
+            return [[None, "A batch must be a list of commands"]]
+        errors = []
+        for index, command in enumerate(batch):
+            if index and not index % self.COMMANDS_PER_YIELD:
+                await asyncio.sleep(0)
+            try:
+                if not isinstance(command, list) or not command:
+                    raise ValueError("A command must be a list")
+                name, *args = command
+                handler = self.commands.get(name)
+                if handler is None:
+                    raise ValueError(f"Unknown command {name!r}")
+                handler(client, *args)
+            except (TypeError, ValueError) as e:
+                errors.append([index, str(e)])
+        return errors
+
+    async def handle_client(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ):
+        try:
+            while True:
+                (length,) = FRAME.unpack(await reader.readexactly(FRAME.size))
+                if length > MAX_FRAME:
+                    writer.write(encode({"errors": [[None, "Frame too long"]]}))
+                    return
+                try:
+                    batch = json.loads(await reader.readexactly(length))
+                except ValueError as e:
+                    errors = [[None, f"Bad JSON: {e}"]]
+                else:
+                    errors = await self.run_batch(batch, writer)
+                if errors:
+                    writer.write(encode({"errors": errors}))
+                # let input through between batches
+                await asyncio.sleep(0)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            # the client's gone
+            pass
+        finally:
+            self.subscribers.discard(writer)
+            writer.close()
+
+    @watched("g13_key", "g13_joy")
+    async def publish(self, event: str):
+        """Send a key or joystick event to every subscriber."""
+        if not self.subscribers:
+            return
+        frame = encode({"event": event})
+        for writer in list(self.subscribers):
+            if writer.transport.get_write_buffer_size() > self.MAX_BACKLOG:
+                logger.warning("Dropping a control client that isn't keeping up")
+                self.subscribers.discard(writer)
+                writer.close()
+            else:
+                writer.write(frame)
+
+    async def serve(self):
+        # a socket left over from a previous run would stop us binding
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(self.path)
+        try:
+            server = await asyncio.start_unix_server(self.handle_client, self.path)
+        except OSError as e:
+            logger.warning("Can't listen for control clients: {}", e)
+            return
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(self.path)
+
+
+class ControlClient:
+    """A blocking client, for scripts."""
+
+    def __init__(self, path: str = CONTROL_SOCKET):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(path)
+
+    def send(self, *commands: list):
+        """Send commands as one batch."""
+        self.sock.sendall(encode(list(commands)))
+
+    def receive(self) -> dict | None:
+        """The next message from the server, or None once it's closed."""
+        header = self._read(FRAME.size)
+        if header is None:
+            return None
+        (length,) = FRAME.unpack(header)
+        data = self._read(length)
+        return None if data is None else json.loads(data)
+
+    def _read(self, size: int) -> bytes | None:
+        data = b""
+        while len(data) < size:
+            chunk = self.sock.recv(size - len(data))
+            if not chunk:
+                return None
+            data += chunk
+        return data
+
+    def close(self):
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--batch",
+        action="store_true",
+        help="read commands from stdin, one JSON list per line",
+    )
+    parser.add_argument("command", nargs="?", help="command name")
+    parser.add_argument("args", nargs="*", help="its arguments")
+    args = parser.parse_args(argv)
+    if not args.batch and not args.command:
+        parser.error("give a command, or --batch")
+
+    with ControlClient() as client:
+        if args.batch:
+            batch = []
+            for line in sys.stdin:
+                if line.strip():
+                    batch.append(json.loads(line))
+                if len(batch) >= BATCH_SIZE:
+                    client.send(*batch)
+                    batch = []
+            if batch:
+                client.send(*batch)
+        elif args.command == "subscribe":
+            client.send(["subscribe"])
+            while (message := client.receive()) is not None:
+                print(message.get("event") or message, flush=True)
+        else:
+            # numbers on the command line are numbers, not strings
+            client.send([args.command, *map(_argument, args.args)])
+
+
+def _argument(value: str):
+    try:
+        return int(value)
+    except ValueError:
+        return value
+
+
+if __name__ == "__main__":
+    main()
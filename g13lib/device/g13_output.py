@@ -1,9 +1,23 @@
-import blinker
+import asyncio
+import sys
+
 import PIL.Image
 
-from g13lib.async_help import PeriodicComponent, run_periodic
+import g13lib.metrics as metrics
+from g13lib.async_help import PeriodicComponent, Timer
 from g13lib.device.g13_usb_device import G13USBDevice
-from g13lib.render_fb import LCDCompositor
+from g13lib.lcd.hud import PerformanceHUD
+from g13lib.lighting import Colour, LightingEngine
+from g13lib.render_fb import Layer, LCDCompositor
+from g13lib.watchdog import watched
+
+FRAMES_RENDERED = metrics.counter("lcd.frames_rendered")
+FRAMES_SENT = metrics.counter("lcd.frames_sent")
+RENDER_TIME = metrics.histogram("lcd.render_time")
+
+# without the GIL, a frame can be drawn on a worker thread while the event loop
+# carries on handling input; with it, that would only add a thread hop
+PARALLEL_RENDER = not sys._is_gil_enabled()
 
 
 class G13DeviceOutputManager(PeriodicComponent):
@@ -11,65 +25,135 @@ class G13DeviceOutputManager(PeriodicComponent):
 
     Maintains a task to periodically refresh the LCD display and responds to signals
     for updating the compositor and LED states.
+
+    LED changes and the lighting engine's backlight colour are sent with the
+    frame, as at most one control transfer per frame (LEDs first), and only
+    when they've changed.
+
+    With `parallel_render`, frames are drawn and converted on a worker thread.
+    The scheduler never starts a tick while the last one is running, so only
+    one frame is drawn at a time; layers lock whatever state they share with
+    the event loop.
     """
 
     g13_usb_device: G13USBDevice
 
     led_status: list[int]
+    lighting: LightingEngine
+    # what's been queued for the device
+    _queued_leds: list[int] | None = None
+    _queued_backlight: Colour | None = None
 
     compositor: LCDCompositor
+    # layers drawn over whichever compositor is active
+    overlays: list[Layer]
+    hud: PerformanceHUD
     _lcd_framebuffer: PIL.Image.Image
+    _lcd_timer: Timer
 
     # this seems fine
     LCD_REFRESH_MS = 33  # refresh at ~30 Hz
 
+    parallel_render: bool = PARALLEL_RENDER
+
     def __init__(self, g13_usb_device: G13USBDevice):
 
         self.g13_usb_device = g13_usb_device
 
         self.led_status = [0, 0, 0, 0]
+        self.lighting = LightingEngine()
 
         self.compositor = LCDCompositor()
+        self.overlays = []
+        self.hud = PerformanceHUD()
         self._lcd_framebuffer = PIL.Image.new("RGB", (160, 43))
 
-        self._tasks_to_start = [
-            run_periodic(self.lcd_tick, self.LCD_REFRESH_MS, initial_delay_ms=100)
-        ]
+        self._lcd_timer = self.schedule(
+            self.lcd_tick, self.LCD_REFRESH_MS, initial_delay_ms=100
+        )
 
-        blinker.signal("set_compositor").connect(self.set_compositor)
-        blinker.signal("g13_led_toggle").connect(self.toggle_led)
-        blinker.signal("g13_led_on").connect(self.led_on)
-        blinker.signal("g13_led_off").connect(self.led_off)
+        self.connect("set_compositor", self.set_compositor)
+        self.connect("g13_led_toggle", self.toggle_led)
+        self.connect("g13_led_on", self.led_on)
+        self.connect("g13_led_off", self.led_off)
+        self.connect("g13_toggle_hud", self.toggle_hud)
+        self.connect("g13_add_overlay", self.add_overlay)
+        self.connect("g13_remove_overlay", self.remove_overlay)
 
+    @watched("set_compositor")
     def set_compositor(self, compositor: LCDCompositor):
         """Replace the current LCD compositor with a new one."""
-
+        # hide the old layers first, as the new compositor may share some
+        self.compositor.detach()
         self.compositor = compositor
+        compositor.attach()
+        # show it now, rather than up to a frame later
+        self._lcd_timer.fire_soon()
 
     async def lcd_tick(self, *msg):
         """Refresh the LCD with the current console framebuffer if it's changed."""
         # refresh at 30 Hz max
 
-        fb_image = self.compositor.render()
+        # whatever's on screen as the tick starts, in case it changes meanwhile
+        compositor, overlays = self.compositor, tuple(self.overlays)
+        if self.parallel_render:
+            await asyncio.to_thread(self.draw_frame, compositor, overlays)
+        else:
+            self.draw_frame(compositor, overlays)
+
+        self.flush_lighting(self.scheduler.clock.now())
+
+    def draw_frame(self, compositor: LCDCompositor, overlays: tuple[Layer, ...]):
+        """Render a frame and send it to the device if it's changed."""
+        with RENDER_TIME.time():
+            fb_image = compositor.render(overlays)
+        FRAMES_RENDERED.inc()
         if fb_image != self._lcd_framebuffer:
 
             self._lcd_framebuffer = fb_image
             self.g13_usb_device.setLCD(fb_image)
+            FRAMES_SENT.inc()
+
+    def flush_lighting(self, now: float):
+        """Send this frame's LED or backlight change, if there is one."""
+        # always step the engine, so effects keep to the frame clock
+        backlight = self.lighting.step(now)
+        if self.led_status != self._queued_leds:
+            self._queued_leds = list(self.led_status)
+            self.g13_usb_device.update_leds(self._queued_leds)
+        elif backlight is not None and backlight != self._queued_backlight:
+            self._queued_backlight = backlight
+            self.g13_usb_device.set_backlight(*backlight)
+
+    def toggle_hud(self, *msg):
+        """Show or hide the performance HUD over the LCD."""
+        if self.hud in self.overlays:
+            self.remove_overlay(self.hud)
+        else:
+            self.add_overlay(self.hud)
+
+    def add_overlay(self, layer: Layer):
+        """Draw a layer over whichever compositor is active."""
+        if layer not in self.overlays:
+            self.overlays.append(layer)
+            layer.show()
+
+    def remove_overlay(self, layer: Layer):
+        if layer in self.overlays:
+            self.overlays.remove(layer)
+            layer.hide()
 
     def toggle_led(self, *leds: int):
         """Toggle the state of the specified LED on the G13 device."""
         for led_no in leds:
             self.led_status[led_no] = 1 - self.led_status[led_no]
-        self.g13_usb_device.update_leds(self.led_status)
 
     def led_on(self, *leds: int):
         """Turn on the specified LED on the G13 device."""
         for led_no in leds:
             self.led_status[led_no] = 1
-        self.g13_usb_device.update_leds(self.led_status)
 
     def led_off(self, *leds: int):
         """Turn off the specified LED on the G13 device."""
         for led_no in leds:
             self.led_status[led_no] = 0
-        self.g13_usb_device.update_leds(self.led_status)
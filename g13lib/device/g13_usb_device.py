@@ -1,14 +1,24 @@
+import asyncio
 import errno
 import queue
 import threading
+import time
 
 import usb.core
 import usb.util
 from loguru import logger
 from PIL import Image
 
+import g13lib.metrics as metrics
 from g13lib.render_fb import ImageToLPBM
 from g13lib.security import drop_root_privs
+from g13lib.trace import TraceRecorder
+
+LPBM_TIME = metrics.histogram("lcd.lpbm_time")
+LCD_WRITE_TIME = metrics.histogram("usb.lcd_write_time")
+USB_ERRORS = metrics.counter("usb.errors")
+CONTROL_TRANSFERS = metrics.counter("usb.control_transfers")
+CONTROL_SKIPPED = metrics.counter("usb.control_skipped")
 
 
 class G13USBError(Exception):
@@ -23,6 +33,15 @@ class G13USBDevice:
     """
     Interface for communicating with the Logitech G13 USB device.
     Manages USB I/O in a separate thread to avoid blocking the main application.
+
+    The device is "ready" once it's configured and has answered a probe read.
+    Reading too soon after opening it gives spurious I/O and permission errors,
+    so the USB thread retries the probe a bounded number of times, and
+    `wait_ready` lets the main thread wait exactly as long as that takes.
+    After a reset, the device is probed again before it's used.
+
+    LED and backlight writes are skipped if they match what the device last
+    accepted, so repeating a state costs no control transfer.
     """
 
     product_id = 0xC21C
@@ -34,34 +53,65 @@ class G13USBDevice:
     write_queue: queue.Queue
 
     _thread: threading.Thread
-    running: bool = False
+    # set while the USB thread is running; an Event, as other threads read it
+    _running: threading.Event
+
+    _ready: threading.Event
+    _ready_error: FatalG13USBError | None = None
+
+    # when the last input returned by read_data was read from the device
+    last_read_at: float = 0.0
+
+    # the LED mask and backlight colour the device last accepted, if known
+    _acked_leds: int | None = None
+    _acked_backlight: tuple[int, int, int] | None = None
+
+    # if set, every input report is recorded to it
+    trace: TraceRecorder | None = None
 
     # setting this number too low
     # seems to cause lots of USB errors
     # at least on my system with my device
     READ_TIMEOUT_MS = 10
 
-    def __init__(self):
+    # probe retries, backing off from READY_RETRY_MS up to READY_RETRY_MAX_MS
+    READY_ATTEMPTS = 10
+    READY_RETRY_MS = 25
+    READY_RETRY_MAX_MS = 200
+
+    def __init__(self, trace: TraceRecorder | None = None, start_thread: bool = True):
+        """Start the USB thread, unless `start_thread` is False, in which case
+        the caller drives the device (see `g13lib.device.usb_process`)."""
+        self.trace = trace
         self.read_queue = queue.Queue()
         self.write_queue = queue.Queue()
+        self._ready = threading.Event()
+        self._running = threading.Event()
+        metrics.gauge("usb.read_queue", self.read_queue.qsize)
+        metrics.gauge("usb.write_queue", self.write_queue.qsize)
 
         self._thread = threading.Thread(target=self._usb_thread_main)
-        self.running = True
-        self._thread.start()
+        if start_thread:
+            self._running.set()
+            self._thread.start()
 
     def _usb_thread_main(self):
         try:
             self.start_usb_device()
+            self._wait_until_ready()
         except Exception as e:
             # Initialization or unexpected loop error; notify main thread.
+            self._ready_error = FatalG13USBError(str(e))
             try:
-                self.read_queue.put(("error", FatalG13USBError(str(e))))
+                self.read_queue.put(("error", self._ready_error))
             except Exception:
                 # If we cannot report the error, just let the thread exit.
                 pass
             finally:
-                self.running = False
-        while self.running:
+                self._running.clear()
+                # wake anyone waiting for the device
+                self._ready.set()
+        while self._running.is_set():
             # outgoing commands
             try:
                 cmd = self.write_queue.get_nowait()
@@ -74,7 +124,7 @@ class G13USBDevice:
                     self._update_leds(cmd["led_status"])
                 elif cmd["type"] == "stop":
                     self._close()
-                    self.running = False
+                    self._running.clear()
                     continue
             except queue.Empty:
                 # no pending commands
@@ -84,12 +134,24 @@ class G13USBDevice:
             try:
                 data = self._read_data()
                 if data is not None:
-                    self.read_queue.put(("input", data))
+                    self._queue_input(data)
+            except FatalG13USBError as e:
+                USB_ERRORS.inc()
+                self.read_queue.put(("error", e))
+                self._running.clear()
             except Exception as e:
+                USB_ERRORS.inc()
                 self.read_queue.put(("error", G13USBError(str(e))))
 
-    def start_usb_device(self):
-        """Initialize the USB device. Drops root privileges after initialization.
+    def _queue_input(self, data):
+        read_at = time.perf_counter()
+        if self.trace is not None:
+            self.trace.record(data, read_at)
+        self.read_queue.put(("input", data, read_at))
+
+    def start_usb_device(self, drop_privileges: bool = True):
+        """Initialize the USB device. Drops root privileges after initialization,
+        unless `drop_privileges` is False.
 
         Runs within the USB thread."""
         # USB device for control transfers (LCD, LEDs, backlight)
@@ -106,7 +168,8 @@ class G13USBDevice:
 
         # at this point, we're initialized to the point
         # where we should drop root privileges
-        drop_root_privs()
+        if drop_privileges:
+            drop_root_privs()
 
         # honestly not sure what this does or whether it's necessary
         # but it seems to be a good practice
@@ -114,12 +177,58 @@ class G13USBDevice:
         self.usb_device.set_configuration(cfg)
         logger.success("G13 USB device initialized")
 
+    def _wait_until_ready(self):
+        """Probe the device until a read succeeds or times out cleanly.
+
+        Raises FatalG13USBError if it's still failing after READY_ATTEMPTS.
+
+        Runs within the USB thread."""
+        self._ready.clear()
+        delay = self.READY_RETRY_MS / 1000.0
+        for attempt in range(1, self.READY_ATTEMPTS + 1):
+            try:
+                data = self.usb_device.read(0x81, 8, self.READ_TIMEOUT_MS)
+            except usb.core.USBError as e:
+                if e.errno != errno.ETIMEDOUT:
+                    logger.debug("G13 not ready (attempt {}): {}", attempt, e)
+                    time.sleep(delay)
+                    delay = min(delay * 2, self.READY_RETRY_MAX_MS / 1000.0)
+                    continue
+                # a timeout just means no keys are held
+            else:
+                self._queue_input(data)
+            logger.debug("G13 ready after {} probe(s)", attempt)
+            self._ready.set()
+            return
+        raise FatalG13USBError(
+            f"G13 not ready after {self.READY_ATTEMPTS} attempts"
+        )
+
+    @property
+    def running(self) -> bool:
+        return self._running.is_set()
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set() and self._ready_error is None
+
+    async def wait_ready(self, timeout: float | None = None):
+        """Wait until the device is ready for I/O.
+
+        Raises FatalG13USBError if it couldn't be initialized, or isn't ready
+        within `timeout` seconds."""
+        if not await asyncio.to_thread(self._ready.wait, timeout):
+            raise FatalG13USBError("Timed out waiting for the G13")
+        if self._ready_error is not None:
+            raise self._ready_error
+
     def read_data(self) -> list[int] | None | G13USBError:
         """Read data from the USB input queue if available. Non-blocking."""
 
         try:
-            msg_type, data = self.read_queue.get_nowait()
+            msg_type, data, *read_at = self.read_queue.get_nowait()
             if msg_type == "input":
+                self.last_read_at = read_at[0]
                 return data
             elif msg_type == "error":
                 return data
@@ -138,8 +247,12 @@ class G13USBDevice:
             if e.errno == errno.ETIMEDOUT:  # Timeout error
                 pass
             elif e.errno in (errno.EPIPE, errno.EIO):  # pipe error?
+                USB_ERRORS.inc()
                 logger.error("USB Error: {}, resetting", e)
                 self.usb_device.reset()
+                # the device may not have kept its LEDs and backlight
+                self._acked_leds = self._acked_backlight = None
+                self._wait_until_ready()
 
                 return G13USBError(str(e))
             else:
@@ -150,7 +263,8 @@ class G13USBDevice:
         return d
 
     def update_leds(self, led_status: list[int]):
-        self.write_queue.put({"type": "set_leds", "led_status": led_status})
+        # a copy, as the caller may change its list before it's sent
+        self.write_queue.put({"type": "set_leds", "led_status": list(led_status)})
 
     def _update_leds(self, led_status: list[int]):
         """Update the LED status on the G13 device.
@@ -161,6 +275,9 @@ class G13USBDevice:
         for i, status in enumerate(led_status):
             if status:
                 mask |= 1 << i
+        if mask == self._acked_leds:
+            CONTROL_SKIPPED.inc()
+            return
 
         data = [5, mask, 0, 0, 0]
 
@@ -171,6 +288,8 @@ class G13USBDevice:
             wIndex=0,
             data_or_wLength=data,
         )
+        CONTROL_TRANSFERS.inc()
+        self._acked_leds = mask
 
     def set_backlight(self, r: int, g: int, b: int):
         self.write_queue.put({"type": "set_backlight", "r": r, "g": g, "b": b})
@@ -179,7 +298,11 @@ class G13USBDevice:
         """Set the backlight color on the G13 device.
 
         Runs within the USB thread."""
-        data = [7, int(r), int(g), int(b), 0]
+        colour = (int(r), int(g), int(b))
+        if colour == self._acked_backlight:
+            CONTROL_SKIPPED.inc()
+            return
+        data = [7, *colour, 0]
         self.usb_device.ctrl_transfer(
             usb.util.CTRL_TYPE_CLASS | usb.util.CTRL_RECIPIENT_INTERFACE,
             bRequest=9,
@@ -187,6 +310,8 @@ class G13USBDevice:
             wIndex=0,
             data_or_wLength=data,
         )
+        CONTROL_TRANSFERS.inc()
+        self._acked_backlight = colour
 
     def setLCD(self, fb_image: Image.Image):
         """Convert the framebuffer image and queue it for sending to the G13 device."""
@@ -194,7 +319,8 @@ class G13USBDevice:
         # rather than convert the image inside the USB thread,
         # do it here and just send the converted data to the USB thread
         # we don't want to do any "heavy" processing inside the USB thread
-        converted_image = ImageToLPBM(fb_image)
+        with LPBM_TIME.time():
+            converted_image = ImageToLPBM(fb_image)
         self.write_queue.put({"type": "set_lcd", "fb_image": converted_image})
 
     def _setLCD(self, lpbm_image: list[int]):
@@ -204,10 +330,11 @@ class G13USBDevice:
         header = [0] * 32
         header[0] = 0x03
 
-        self.usb_device.write(
-            usb.util.CTRL_OUT | 2,  # Endpoint 2 for LCD
-            bytes(header) + bytes(lpbm_image),
-        )
+        with LCD_WRITE_TIME.time():
+            self.usb_device.write(
+                usb.util.CTRL_OUT | 2,  # Endpoint 2 for LCD
+                bytes(header) + bytes(lpbm_image),
+            )
 
     def close(self):
         """Close the USB device and stop the USB thread."""
@@ -215,6 +342,8 @@ class G13USBDevice:
         self._thread.join()
         if self._thread.is_alive():
             logger.warning("Timed out waiting for USB device to shut down.")
+        if self.trace is not None:
+            self.trace.close()
 
     def _close(self):
         """Close the USB device and cleanup resources.
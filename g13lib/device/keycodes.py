@@ -35,3 +35,20 @@ keycodes = {
     "THUMB_RIGHT": (7, 2),
     "THUMB_STICK": (7, 3),
 }
+
+# dense key ids, in the same order as the bits in the input report
+key_ids = {key: key_id for key_id, key in enumerate(keycodes)}
+
+# slots in a dispatch table: each key has a press slot and a release slot
+event_slots = {}
+for _key, _key_id in key_ids.items():
+    event_slots[f"{_key}_PRESSED"] = 2 * _key_id
+    event_slots[f"{_key}_RELEASED"] = 2 * _key_id + 1
+
+# LED numbers, as used by the g13_led_* signals
+leds = {
+    "M1": 0,
+    "M2": 1,
+    "M3": 2,
+    "MR": 3,
+}
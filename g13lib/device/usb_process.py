@@ -0,0 +1,364 @@
+"""
+G13 USB I/O in a child process.
+
+`G13USBProcess` has the same interface as `G13USBDevice`, but runs the USB
+loop in a separate process, so rendering, pynput and the asyncio handlers
+can't hold it up by holding the GIL. The two processes share one block of
+memory:
+
+    control   state, restart and drop counts, stop flag, LEDs and backlight
+    reports   a ring of (read time, 8-byte report) from the child
+    frames    two LCD frame buffers, written alternately by the main process
+
+Every field has exactly one writer, so no locks are needed: the ring's head
+is only moved by the child and its tail by the main process, and a frame is
+published by bumping its number after it's written. Nothing is pickled or
+allocated per message.
+
+The child supervises the device: if it fails, it's reopened with backoff, and
+only after `MAX_RESTARTS` failures in a row does the main process see a
+`FatalG13USBError`.
+
+Enable it by setting G13_USB_PROCESS=1 when starting the daemon.
+"""
+
+import asyncio
+import contextlib
+import multiprocessing
+import struct
+import time
+from multiprocessing import shared_memory
+
+import usb.util
+from loguru import logger
+from PIL import Image
+
+import g13lib.metrics as metrics
+from g13lib.device.g13_usb_device import (
+    LPBM_TIME,
+    FatalG13USBError,
+    G13USBDevice,
+    G13USBError,
+)
+from g13lib.render_fb import LCD_HEIGHT, LCD_WIDTH, ImageToLPBM
+from g13lib.security import drop_root_privs
+from g13lib.trace import TraceRecorder
+
+# the whole LCD, 8 rows of pixels to a byte
+FRAME_BYTES = LCD_WIDTH * LCD_HEIGHT // 8
+
+# control fields, as u32s
+CONTROL = struct.Struct("<8I")
+(STATE, RESTARTS, DROPPED, STOP, LEDS, BACKLIGHT, _, _) = range(8)
+SPAWNED, STARTING, READY, RESTARTING, FAILED, STOPPED = range(6)
+# set in LEDS and BACKLIGHT once they have a value
+VALID = 1 << 24
+
+RING_HEADER = struct.Struct("<QQ")  # head, tail
+REPORT = struct.Struct("<d8s")  # read at (perf_counter), report
+FRAME_HEADER = struct.Struct("<II")  # published frame, frame being written
+
+
+class ReportRing:
+    """A single-producer, single-consumer ring of input reports."""
+
+    def __init__(self, buffer: memoryview, capacity: int):
+        self.buffer = buffer
+        self.capacity = capacity
+        self._slots = RING_HEADER.size
+
+    @staticmethod
+    def size(capacity: int) -> int:
+        return RING_HEADER.size + capacity * REPORT.size
+
+    def __len__(self) -> int:
+        head, tail = RING_HEADER.unpack_from(self.buffer)
+        return head - tail
+
+    def push(self, report, read_at: float) -> bool:
+        """Add a report, or return False if the ring's full. Producer only."""
+        head, tail = RING_HEADER.unpack_from(self.buffer)
+        if head - tail >= self.capacity:
+            return False
+        offset = self._slots + (head % self.capacity) * REPORT.size
+        REPORT.pack_into(self.buffer, offset, read_at, bytes(report))
+        # publish the slot only once it's written
+        struct.pack_into("<Q", self.buffer, 0, head + 1)
+        return True
+
+    def pop(self) -> tuple[float, bytes] | None:
+        """Take the oldest report, if there is one. Consumer only."""
+        head, tail = RING_HEADER.unpack_from(self.buffer)
+        if head == tail:
+            return None
+        offset = self._slots + (tail % self.capacity) * REPORT.size
+        read_at, report = REPORT.unpack_from(self.buffer, offset)
+        struct.pack_into("<Q", self.buffer, 8, tail + 1)
+        return read_at, report
+
+
+class FrameExchange:
+    """Double-buffered LCD frames, from the main process to the child.
+
+    Frame n is written to buffer n % 2, so the writer never waits for the
+    reader. The reader checks the writer hasn't started reusing the buffer
+    it copied (with frame n + 2) before it trusts the copy.
+    """
+
+    def __init__(self, buffer: memoryview):
+        self.buffer = buffer
+        self._seen = 0
+
+    @staticmethod
+    def size() -> int:
+        return FRAME_HEADER.size + 2 * FRAME_BYTES
+
+    def _offset(self, frame: int) -> int:
+        return FRAME_HEADER.size + (frame % 2) * FRAME_BYTES
+
+    def publish(self, lpbm: bytes):
+        """Write the next frame. Writer only."""
+        published, _ = FRAME_HEADER.unpack_from(self.buffer)
+        frame = published + 1
+        struct.pack_into("<I", self.buffer, 4, frame)
+        offset = self._offset(frame)
+        self.buffer[offset : offset + len(lpbm)] = lpbm
+        struct.pack_into("<I", self.buffer, 0, frame)
+
+    def take(self) -> bytes | None:
+        """The latest frame, if it's new since the last call. Reader only."""
+        while True:
+            published, _ = FRAME_HEADER.unpack_from(self.buffer)
+            if published == self._seen:
+                return None
+            offset = self._offset(published)
+            lpbm = bytes(self.buffer[offset : offset + FRAME_BYTES])
+            _, writing = FRAME_HEADER.unpack_from(self.buffer)
+            if writing < published + 2:
+                self._seen = published
+                return lpbm
+            # overwritten while we copied it: take the newer one instead
+
+
+class SharedState:
+    """The memory shared by the main process and the USB process."""
+
+    RING_CAPACITY = 256
+
+    def __init__(self, memory: shared_memory.SharedMemory):
+        self.memory = memory
+        buffer = memory.buf
+        ring_end = CONTROL.size + ReportRing.size(self.RING_CAPACITY)
+        self.reports = ReportRing(buffer[CONTROL.size : ring_end], self.RING_CAPACITY)
+        self.frames = FrameExchange(buffer[ring_end : ring_end + FrameExchange.size()])
+
+    @classmethod
+    def size(cls) -> int:
+        return CONTROL.size + ReportRing.size(cls.RING_CAPACITY) + FrameExchange.size()
+
+    @classmethod
+    def create(cls) -> "SharedState":
+        return cls(shared_memory.SharedMemory(create=True, size=cls.size()))
+
+    @classmethod
+    def attach(cls, name: str) -> "SharedState":
+        # the creator owns it, so don't let our resource tracker unlink it
+        return cls(shared_memory.SharedMemory(name=name, track=False))
+
+    def get(self, field: int) -> int:
+        return struct.unpack_from("<I", self.memory.buf, field * 4)[0]
+
+    def set(self, field: int, value: int):
+        struct.pack_into("<I", self.memory.buf, field * 4, value)
+
+    def close(self):
+        # release our views, or the memory can't be closed
+        self.reports.buffer.release()
+        self.frames.buffer.release()
+        self.memory.close()
+
+
+def serve(device: G13USBDevice, shared: SharedState):
+    """Move frames, LEDs, backlight and input between the device and memory.
+
+    Returns when the main process asks us to stop. Runs in the USB process."""
+    leds = backlight = 0
+    while not shared.get(STOP):
+        frame = shared.frames.take()
+        if frame is not None:
+            device._setLCD(frame)
+        if (value := shared.get(LEDS)) != leds:
+            device._update_leds([value >> i & 1 for i in range(4)])
+            leds = value
+        if (value := shared.get(BACKLIGHT)) != backlight:
+            device._set_backlight(value >> 16 & 0xFF, value >> 8 & 0xFF, value & 0xFF)
+            backlight = value
+
+        data = device._read_data()
+        if isinstance(data, G13USBError):
+            # it's reset the device; resend our state once it's back
+            leds = backlight = 0
+        elif data is not None:
+            if not shared.reports.push(data, time.perf_counter()):
+                shared.set(DROPPED, shared.get(DROPPED) + 1)
+
+
+def _discard_device(device: G13USBDevice):
+    """Let go of a device that's failed, so it can be opened again."""
+    usb_device = getattr(device, "usb_device", None)
+    if usb_device is None:
+        return
+    with contextlib.suppress(Exception):
+        device._close()
+    # if the reset failed, dispose of it anyway
+    with contextlib.suppress(Exception):
+        usb.util.dispose_resources(usb_device)
+    device.usb_device = None
+
+
+def _usb_process_main(name: str, max_restarts: int, restart_ms: float):
+    """Open the device and serve it, reopening it whenever it fails.
+
+    The child keeps root, as reopening the device means detaching the kernel's
+    HID driver again; the parent drops it once the device is ready."""
+    shared = SharedState.attach(name)
+    shared.set(STATE, STARTING)
+    device = G13USBDevice(start_thread=False)
+    failures = 0
+    delay = restart_ms / 1000.0
+    try:
+        while not shared.get(STOP):
+            try:
+                device.start_usb_device(drop_privileges=False)
+                device._wait_until_ready()
+                shared.set(STATE, READY)
+                failures = 0
+                delay = restart_ms / 1000.0
+                serve(device, shared)
+                device._close()
+            except Exception as e:
+                failures += 1
+                logger.error("G13 failed ({} in a row): {}", failures, e)
+                _discard_device(device)
+                if failures > max_restarts:
+                    shared.set(STATE, FAILED)
+                    return
+                shared.set(STATE, RESTARTING)
+                shared.set(RESTARTS, shared.get(RESTARTS) + 1)
+                device._acked_leds = device._acked_backlight = None
+                time.sleep(delay)
+                delay = min(delay * 2, 1.0)
+        shared.set(STATE, STOPPED)
+    finally:
+        shared.close()
+
+
+class G13USBProcess:
+    """A G13USBDevice that does its USB I/O in a child process."""
+
+    MAX_RESTARTS = 5
+    RESTART_MS = 100
+    STOP_TIMEOUT_S = 2.0
+
+    shared: SharedState
+    process: multiprocessing.Process
+    trace: TraceRecorder | None = None
+
+    # when the last input returned by read_data was read from the device
+    last_read_at: float = 0.0
+    _stopping: bool = False
+    _unlinked: bool = False
+
+    def __init__(self, trace: TraceRecorder | None = None):
+        self.trace = trace
+        self.shared = SharedState.create()
+        metrics.gauge("usb.read_queue", lambda: len(self.shared.reports))
+        metrics.gauge("usb.restarts", lambda: self.shared.get(RESTARTS))
+        metrics.gauge("usb.dropped", lambda: self.shared.get(DROPPED))
+
+        # spawn, not fork: we may already have threads and an event loop
+        context = multiprocessing.get_context("spawn")
+        self.process = context.Process(
+            target=_usb_process_main,
+            args=(self.shared.memory.name, self.MAX_RESTARTS, self.RESTART_MS),
+            name="g13-usb",
+            daemon=True,
+        )
+        self.process.start()
+
+    @property
+    def state(self) -> int:
+        return self.shared.get(STATE)
+
+    @property
+    def ready(self) -> bool:
+        return self.state == READY
+
+    @property
+    def restarts(self) -> int:
+        return self.shared.get(RESTARTS)
+
+    async def wait_ready(self, timeout: float | None = None):
+        """Wait until the child has the device ready for I/O.
+
+        Raises FatalG13USBError if it couldn't be opened, or isn't ready
+        within `timeout` seconds."""
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        while (state := self.state) != READY:
+            if state == FAILED or not self.process.is_alive():
+                raise FatalG13USBError("The G13 USB process failed to start")
+            if deadline is not None and loop.time() > deadline:
+                raise FatalG13USBError("Timed out waiting for the G13")
+            await asyncio.sleep(0.01)
+        self._release_name()
+        # the child has the device, so we don't need root any more
+        drop_root_privs()
+
+    def _release_name(self):
+        # both processes have it mapped now, so it no longer needs a name
+        # (which we mightn't be allowed to remove once we've dropped root)
+        if not self._unlinked:
+            self.shared.memory.unlink()
+            self._unlinked = True
+
+    def read_data(self) -> list[int] | None | G13USBError:
+        """Take the next input report, if there is one. Non-blocking."""
+        entry = self.shared.reports.pop()
+        if entry is not None:
+            read_at, report = entry
+            if self.trace is not None:
+                self.trace.record(report, read_at)
+            self.last_read_at = read_at
+            return list(report)
+        if not self._stopping and (
+            self.state == FAILED or not self.process.is_alive()
+        ):
+            return FatalG13USBError("The G13 USB process has stopped")
+        return None
+
+    def update_leds(self, led_status: list[int]):
+        mask = sum(1 << i for i, status in enumerate(led_status) if status)
+        self.shared.set(LEDS, VALID | mask)
+
+    def set_backlight(self, r: int, g: int, b: int):
+        self.shared.set(BACKLIGHT, VALID | int(r) << 16 | int(g) << 8 | int(b))
+
+    def setLCD(self, fb_image: Image.Image):
+        """Convert the framebuffer image and hand it to the USB process."""
+        with LPBM_TIME.time():
+            converted_image = bytes(ImageToLPBM(fb_image))
+        self.shared.frames.publish(converted_image)
+
+    def close(self):
+        """Stop the USB process, which closes the device."""
+        self._stopping = True
+        self.shared.set(STOP, 1)
+        self.process.join(self.STOP_TIMEOUT_S)
+        if self.process.is_alive():
+            logger.warning("Timed out waiting for the USB process to shut down.")
+            self.process.terminate()
+        self._release_name()
+        self.shared.close()
+        if self.trace is not None:
+            self.trace.close()
@@ -1,12 +1,17 @@
 import bisect
+import time
 from typing import Sequence
 
 import blinker
 from loguru import logger
 
 import g13lib.device.keycodes
+import g13lib.metrics as metrics
 from g13lib.device.g13_usb_device import G13USBDevice
 
+EVENTS_DISPATCHED = metrics.counter("input.events")
+INPUT_LATENCY = metrics.histogram("input.latency")
+
 
 class G13Manager:
 
@@ -32,12 +37,14 @@ class G13Manager:
         joy_x, joy_y = bytes[1], bytes[2]
 
         for code in self.joy_position_to_codes(joy_x, joy_y):
-            if code == "JOY_X_ZERO_0" and not self._joy_x_zero:
-                self._joy_x_zero = True
-                yield code
-            elif code == "JOY_Y_ZERO_0" and not self._joy_y_zero:
-                self._joy_y_zero = True
-                yield code
+            if code == "JOY_X_ZERO_0":
+                if not self._joy_x_zero:
+                    self._joy_x_zero = True
+                    yield code
+            elif code == "JOY_Y_ZERO_0":
+                if not self._joy_y_zero:
+                    self._joy_y_zero = True
+                    yield code
             elif code.startswith("JOY_X"):
                 self._joy_x_zero = False
                 yield code
@@ -80,15 +87,15 @@ class G13Manager:
 
     def key_events(self, bytes: Sequence[int]):
         """Given a bitmask of held keys, yield the corresponding pressed and released events."""
-        seen_keys = set()
-        for key in self.determine_held_keycodes(bytes):
-            seen_keys.add(key)
+        seen_keys = set(self.determine_held_keycodes(bytes))
 
+        # in key order, so the same reports always give the same events
+        key_ids = g13lib.device.keycodes.key_ids
         # release held but now unseen keys
-        for released_key in self.held_keys.difference(seen_keys):
+        for released_key in sorted(self.held_keys - seen_keys, key=key_ids.get):
             yield f"{released_key}_RELEASED"
         # press unheld but now seen keys
-        for key in seen_keys.difference(self.held_keys):
+        for key in sorted(seen_keys - self.held_keys, key=key_ids.get):
             yield f"{key}_PRESSED"
         self.held_keys = seen_keys
 
@@ -98,13 +105,20 @@ class G13Manager:
         read_result = self.g13_usb_device.read_data()
 
         if isinstance(read_result, Sequence):
-            for i, event in enumerate(self.key_events(read_result)):
+            await self.process_report(read_result)
+            # from the USB read to the last handler finishing
+            INPUT_LATENCY.observe(time.perf_counter() - self.g13_usb_device.last_read_at)
+        return read_result
 
-                await blinker.signal("g13_key").send_async(event)
+    async def process_report(self, report: Sequence[int]):
+        """Decode one 8-byte input report and send its key and joystick events."""
+        for event in self.key_events(report):
+            EVENTS_DISPATCHED.inc()
+            await blinker.signal("g13_key").send_async(event)
 
-            for event in self.joystick_position(read_result):
-                await blinker.signal("g13_joy").send_async(event)
-        return read_result
+        for event in self.joystick_position(report):
+            EVENTS_DISPATCHED.inc()
+            await blinker.signal("g13_joy").send_async(event)
 
     def close(self):
         self.g13_usb_device.close()
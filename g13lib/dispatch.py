@@ -0,0 +1,135 @@
+"""
+Compiles a profile's key mapping into a dispatch table.
+
+A mapping (like `InputManager.direct_mapping`) is checked and resolved once,
+when the profile is built, into a flat list of zero-argument handlers with a
+press slot and a release slot for every key (see `keycodes.event_slots`). Each
+key event then costs one lookup and one call, and a bad mapping is reported
+when the profile is built rather than the first time the key is pressed.
+
+Keys that aren't in the mapping print their event code on the G13 terminal.
+
+Gestures ("G1+G2", "G5:hold", ...; see `g13lib.gestures`) are compiled the
+same way, into the table's `gestures`, keyed by their canonical code.
+"""
+
+import functools
+import typing
+
+import blinker
+import pynput
+
+import g13lib.device.keycodes
+from g13lib.gestures import parse_gesture
+from g13lib.output_executor import Step, compile_macro
+
+Handler = typing.Callable[[], typing.Any]
+
+
+class DispatchTable(list[Handler]):
+    """Handlers by event slot, and (press, release) handlers by gesture code."""
+
+    gestures: dict[str, tuple[Handler, Handler]]
+
+    def __init__(self, handlers: typing.Iterable[Handler] = ()):
+        super().__init__(handlers)
+        self.gestures = {}
+
+
+class MappingError(ValueError):
+    pass
+
+
+def no_op():
+    pass
+
+
+def print_code(code: str):
+    blinker.signal("g13_print").send(code)
+
+
+def check_key(key, where: str):
+    """Raise MappingError unless key is something the keyboard can press."""
+    if isinstance(key, (pynput.keyboard.Key, pynput.keyboard.KeyCode)):
+        return
+    if type(key) is str and len(key) == 1:
+        return
+    raise MappingError(f"{where}: {key!r} is not a key")
+
+
+def check_macro(output, where: str):
+    """Raise MappingError if a macro contains anything that can't be played."""
+    if type(output) is list:
+        for item in output:
+            check_macro(item, where)
+    elif type(output) is tuple:
+        if not output:
+            raise MappingError(f"{where}: empty chord")
+        for key in output:
+            check_key(key, where)
+    elif type(output) is int:
+        if output < 0:
+            raise MappingError(f"{where}: negative delay {output}")
+    elif not callable(output):
+        check_key(output, where)
+
+
+def macro_handlers(manager, steps: list[Step]) -> tuple[Handler, Handler]:
+    """Handlers that play compiled macro steps when a key is pressed."""
+    return functools.partial(manager.executor.submit, steps), no_op
+
+
+def compile_binding(manager, key_code: str, output) -> tuple[Handler, Handler]:
+    """Resolve one mapping entry into (press handler, release handler)."""
+    where = f"{type(manager).__name__} {key_code}"
+    if type(output) is list:
+        check_macro(output, where)
+        steps = compile_macro(
+            output, lambda item: manager.send_output(item, "PRESSED")
+        )
+        return macro_handlers(manager, steps)
+    elif type(output) is tuple:
+        check_macro(output, where)
+        # chords are only sent on press
+        return functools.partial(manager.executor.chord, output), no_op
+    elif callable(output):
+        # handlers defined in the class body are plain functions
+        return (
+            functools.partial(output, manager, "PRESSED", key_code),
+            functools.partial(output, manager, "RELEASED", key_code),
+        )
+    else:
+        check_key(output, where)
+        return (
+            functools.partial(manager.executor.press, output),
+            functools.partial(manager.executor.release, output),
+        )
+
+
+def compile_mapping(manager, mapping: dict) -> DispatchTable:
+    """Compile a whole mapping into a dispatch table for `manager`."""
+    event_slots = g13lib.device.keycodes.event_slots
+    table = DispatchTable([no_op] * len(event_slots))
+    for code, slot in event_slots.items():
+        table[slot] = functools.partial(print_code, code)
+
+    for key_code, output in mapping.items():
+        if key_code in g13lib.device.keycodes.key_ids:
+            set_binding(table, key_code, compile_binding(manager, key_code, output))
+            continue
+        try:
+            gesture = parse_gesture(key_code)
+        except ValueError as e:
+            raise MappingError(f"{type(manager).__name__}: {e}")
+        if gesture is None:
+            raise MappingError(f"{type(manager).__name__}: unknown key {key_code!r}")
+        table.gestures[gesture] = compile_binding(manager, gesture, output)
+    return table
+
+
+def set_binding(table: DispatchTable, key_code: str, handlers: tuple[Handler, Handler]):
+    """Install a key's press and release handlers in a dispatch table."""
+    key_id = g13lib.device.keycodes.key_ids.get(key_code)
+    if key_id is None:
+        raise MappingError(f"Unknown key {key_code!r}")
+    table[2 * key_id], table[2 * key_id + 1] = handlers
@@ -0,0 +1,289 @@
+"""
+Chords, and tap, hold and double-tap, detected between decoding and dispatch.
+
+Gestures are bound in a mapping alongside plain keys (see `g13lib.dispatch`):
+
+    "G1+G2"         a chord: the keys pressed together
+    "G5:tap"        G5 pressed and released within `HOLD_MS`
+    "G5:hold"       G5 held for `HOLD_MS`; its release handler runs on release
+    "G5:double_tap" G5 tapped twice within `DOUBLE_TAP_MS`
+
+`GestureDetector` only looks at keys that are part of a bound gesture; every
+other key goes straight to its dispatch table slot, with no added latency.
+
+A press of a key in a chord is held back for up to `CHORD_MS`. The held keys
+are kept as a bitmask (bit n is key id n), so matching a chord is comparing
+the mask against each chord's. Once a chord matches and no larger chord could
+still match, its press handler runs and the keys' own events are swallowed;
+its release handler runs when the first of them is released. If the window
+closes without a chord, or a key is released first, the held-back presses go
+through as normal.
+
+A key with a tap, hold or double-tap binding isn't pressed until it's clear
+which it is. A variant that isn't bound falls back to the key's own binding,
+so binding "G5:hold" alone leaves a tap of G5 doing what G5 always did.
+Windows are timed with one-shot scheduler timers, not polling.
+"""
+
+import typing
+
+import g13lib.device.keycodes
+from g13lib.async_help import Scheduler, Timer, default_scheduler
+
+CHORD_MS = 50
+HOLD_MS = 300
+DOUBLE_TAP_MS = 250
+
+VARIANTS = ("tap", "hold", "double_tap")
+
+
+def key_mask(keys: typing.Iterable[str]) -> int:
+    key_ids = g13lib.device.keycodes.key_ids
+    mask = 0
+    for key in keys:
+        mask |= 1 << key_ids[key]
+    return mask
+
+
+def parse_gesture(code: str) -> str | None:
+    """The canonical form of a gesture code, or None if it isn't one.
+
+    Raises ValueError for a gesture with unknown keys or variants."""
+    key_ids = g13lib.device.keycodes.key_ids
+    if "+" in code:
+        keys = code.split("+")
+        if len(set(keys)) < 2:
+            raise ValueError(f"A chord needs two different keys: {code!r}")
+        for key in keys:
+            if key not in key_ids:
+                raise ValueError(f"Unknown key {key!r} in chord {code!r}")
+        # the same chord however it's written
+        return "+".join(sorted(set(keys), key=key_ids.get))
+    if ":" in code:
+        key, _, variant = code.partition(":")
+        if key not in key_ids:
+            raise ValueError(f"Unknown key {key!r} in {code!r}")
+        if variant not in VARIANTS:
+            raise ValueError(f"Unknown gesture {variant!r} in {code!r}")
+        return code
+    return None
+
+
+class GestureDetector:
+    """Turns key presses and releases into gesture events.
+
+    Events are passed to `emit` as codes: "G1_PRESSED" for a key's own
+    binding, or "G1+G2_PRESSED", "G5:hold_RELEASED", ... for a gesture's.
+    """
+
+    # keys that are part of any gesture, as a mask
+    watched: int = 0
+
+    chords: dict[int, str]
+    chord_keys: int
+    # bound variants of each key with a timed gesture
+    timed: dict[str, set[str]]
+
+    # keys pressed in a chord's window, not yet sent, in order, and as a mask
+    _pending: list[str]
+    pending_mask: int = 0
+    _chord_timer: Timer | None = None
+    # the chord that's down, and its keys that haven't been released yet
+    _chord: str | None = None
+    _swallowed: int = 0
+    # keys that were down when the detector was reset: their releases belong
+    # to whatever they started, so they're dropped
+    _dropped: int = 0
+
+    # the state of each timed key: "pressed", "holding", "waiting" (for a
+    # second tap), or "double_tap"; idle keys aren't in it
+    _phase: dict[str, str]
+    _timers: dict[str, Timer]
+
+    def __init__(
+        self,
+        emit: typing.Callable[[str], typing.Any],
+        scheduler: Scheduler = default_scheduler,
+    ):
+        self.emit = emit
+        self.scheduler = scheduler
+        self.chords = {}
+        self.chord_keys = 0
+        self.timed = {}
+        self._pending = []
+        self._phase = {}
+        self._timers = {}
+
+    def configure(self, gestures: typing.Iterable[str]):
+        """Watch for these (canonical) gesture codes instead of any before."""
+        self.reset()
+        self.chords = {}
+        self.timed = {}
+        for code in gestures:
+            if "+" in code:
+                self.chords[key_mask(code.split("+"))] = code
+            else:
+                key, _, variant = code.partition(":")
+                self.timed.setdefault(key, set()).add(variant)
+        self.chord_keys = 0
+        for mask in self.chords:
+            self.chord_keys |= mask
+        self._update_watched()
+
+    def _update_watched(self):
+        self.watched = self.chord_keys | key_mask(self.timed) | self._dropped
+
+    def reset(self):
+        """Forget anything in progress, without sending it. The releases of
+        keys that are down are dropped when they come."""
+        down = [key for key, phase in self._phase.items() if phase != "waiting"]
+        self._dropped |= self._swallowed | self.pending_mask | key_mask(down)
+        self._update_watched()
+        for timer in [self._chord_timer, *self._timers.values()]:
+            if timer is not None:
+                self.scheduler.cancel(timer)
+        self._chord_timer = None
+        self._timers = {}
+        self._pending = []
+        self.pending_mask = 0
+        self._chord = None
+        self._swallowed = 0
+        self._phase = {}
+
+    def key_event(self, key: str, key_id: int, pressed: bool):
+        """Take a press or release of a watched key."""
+        bit = 1 << key_id
+        if bit & self._dropped:
+            self._dropped &= ~bit
+            self._update_watched()
+            if not pressed:
+                return
+            # (pressed again, so its release went missing)
+        if pressed:
+            if self.pending_mask and not self._could_match(self.pending_mask | bit):
+                # keep presses in order: whatever's held back goes first
+                self.resolve_pending()
+            if bit & self.chord_keys and self._chord is None:
+                self._chord_press(key, bit)
+            else:
+                self._timed_press(key)
+        elif bit & self._swallowed:
+            self._swallowed &= ~bit
+            if self._chord is not None:
+                self.emit(f"{self._chord}_RELEASED")
+                self._chord = None
+        else:
+            if bit & self.pending_mask:
+                self._flush()
+            self._timed_release(key)
+
+    # chords
+
+    def _could_match(self, mask: int) -> bool:
+        """Whether some chord has all the keys in `mask`."""
+        return any(chord & mask == mask for chord in self.chords)
+
+    def _could_grow(self, mask: int) -> bool:
+        """Whether a chord with more keys than `mask` could still match."""
+        return any(chord & mask == mask and chord != mask for chord in self.chords)
+
+    def _chord_press(self, key: str, bit: int):
+        self._pending.append(key)
+        self.pending_mask |= bit
+        mask = self.pending_mask
+        if not self._could_grow(mask):
+            if mask in self.chords:
+                self._fire_chord()
+            else:
+                self._flush()
+        elif self._chord_timer is None:
+            self._chord_timer = self.scheduler.after(CHORD_MS, self._chord_window_closed)
+
+    def _chord_window_closed(self):
+        self._chord_timer = None
+        self.resolve_pending()
+
+    def resolve_pending(self):
+        """Stop waiting for a chord: send it if its keys are down, or else the
+        held-back presses. Called before any other key's press is sent."""
+        if self.pending_mask in self.chords:
+            self._fire_chord()
+        else:
+            self._flush()
+
+    def _fire_chord(self):
+        self._cancel_chord_timer()
+        self._chord = self.chords[self.pending_mask]
+        self._swallowed = self.pending_mask
+        self._pending = []
+        self.pending_mask = 0
+        self.emit(f"{self._chord}_PRESSED")
+
+    def _flush(self):
+        """Send held-back presses as ordinary ones."""
+        self._cancel_chord_timer()
+        pending, self._pending, self.pending_mask = self._pending, [], 0
+        for key in pending:
+            self._timed_press(key)
+
+    def _cancel_chord_timer(self):
+        if self._chord_timer is not None:
+            self.scheduler.cancel(self._chord_timer)
+            self._chord_timer = None
+
+    # tap, hold and double-tap
+
+    def _code(self, key: str, variant: str) -> str:
+        return f"{key}:{variant}" if variant in self.timed[key] else key
+
+    def _start_timer(self, key: str, delay_ms: float, callback):
+        self._cancel_timer(key)
+        self._timers[key] = self.scheduler.after(
+            delay_ms, lambda: callback(key), name=f"gesture {key}"
+        )
+
+    def _cancel_timer(self, key: str):
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            self.scheduler.cancel(timer)
+
+    def _timed_press(self, key: str):
+        if key not in self.timed:
+            self.emit(f"{key}_PRESSED")
+        elif self._phase.get(key) == "waiting":
+            self._cancel_timer(key)
+            self._phase[key] = "double_tap"
+            self.emit(f"{key}:double_tap_PRESSED")
+        else:
+            self._phase[key] = "pressed"
+            self._start_timer(key, HOLD_MS, self._held)
+
+    def _timed_release(self, key: str):
+        phase = self._phase.get(key)
+        if key not in self.timed or phase is None:
+            self.emit(f"{key}_RELEASED")
+        elif phase == "holding":
+            del self._phase[key]
+            self.emit(f"{self._code(key, 'hold')}_RELEASED")
+        elif phase == "double_tap":
+            del self._phase[key]
+            self.emit(f"{key}:double_tap_RELEASED")
+        elif phase == "pressed":
+            self._cancel_timer(key)
+            if "double_tap" in self.timed[key]:
+                self._phase[key] = "waiting"
+                self._start_timer(key, DOUBLE_TAP_MS, self._tapped)
+            else:
+                self._tapped(key)
+
+    def _held(self, key: str):
+        self._timers.pop(key, None)
+        self._phase[key] = "holding"
+        self.emit(f"{self._code(key, 'hold')}_PRESSED")
+
+    def _tapped(self, key: str):
+        self._timers.pop(key, None)
+        self._phase.pop(key, None)
+        code = self._code(key, "tap")
+        self.emit(f"{code}_PRESSED")
+        self.emit(f"{code}_RELEASED")
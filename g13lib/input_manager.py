@@ -1,11 +1,27 @@
-import time
+import functools
 import typing
 
 import blinker
 import pynput
 from loguru import logger
 
-from g13lib.async_help import PeriodicComponent, run_periodic
+import g13lib.device.keycodes
+from g13lib.async_help import PeriodicComponent, Timer
+from g13lib.dispatch import (
+    DispatchTable,
+    Handler,
+    MappingError,
+    compile_mapping,
+    macro_handlers,
+    no_op,
+    print_code,
+    set_binding,
+)
+from g13lib.gestures import GestureDetector
+from g13lib.lighting import Colour
+from g13lib.macros import MacroRecorder, MacroStore, default_store
+from g13lib.output_executor import OutputExecutor, Step, compile_macro
+from g13lib.watchdog import watched
 
 
 def split_joystick_code(code: str) -> tuple[str, str, str]:
@@ -18,7 +34,20 @@ class EndProgram(Exception):
 
 
 class InputManager(PeriodicComponent):
-    """Receives codes from the device and outputs keyboard and mouse events."""
+    """Receives codes from the device and outputs keyboard and mouse events.
+
+    A profile's `base_mapping` and `direct_mapping` are compiled into a
+    dispatch table when the profile is built (see `g13lib.dispatch`).
+
+    The M1-M3 keys select between three mapping banks. Each bank is
+    `direct_mapping` with that bank's entry in `mapping_banks` laid over it, and
+    all three are compiled up front, so switching banks is just a matter of
+    pointing at a different table.
+
+    Mappings can also bind chords and tap, hold and double-tap (see
+    `g13lib.gestures`). Only keys that are part of one go through the
+    `GestureDetector`; the rest are dispatched as soon as they arrive.
+    """
 
     direct_mapping: dict[
         str,
@@ -38,8 +67,36 @@ class InputManager(PeriodicComponent):
         "G12": pynput.keyboard.Key.right,
         "G15": pynput.keyboard.Key.shift,
     }
+    # extra bindings for each bank, laid over direct_mapping
+    mapping_banks: dict[str, dict] = {}
+    BANKS = ("M1", "M2", "M3")
+
     keyboard: pynput.keyboard.Controller
     mouse: pynput.mouse.Controller
+    executor: OutputExecutor
+
+    # macros recorded with the MR key, keyed by the G key they're bound to
+    recorded_macros: dict[str, list[Step]]
+    macro_recorder: MacroRecorder
+    macro_store: MacroStore = default_store
+
+    # the backlight colour while this profile is active, if it has one
+    backlight: Colour | None = None
+
+    # the compiled banks, the active bank's table, and the table key events
+    # are currently sent to (which differs while binding a recorded macro)
+    _bank_tables: list[DispatchTable]
+    _bank: int = 0
+    _mapping_table: DispatchTable
+    _dispatch: DispatchTable
+    # the gestures the detector's watching for
+    _gesture_codes: set[str] = set()
+    # release handlers for held keys, from the table that handled the press
+    _held_releases: list[Handler | None]
+    # the same for gestures that are down
+    _held_gestures: dict[str, Handler]
+
+    gestures: GestureDetector
 
     active: bool = True
 
@@ -50,33 +107,136 @@ class InputManager(PeriodicComponent):
     JOY_REPEAT_INTERVAL = 100
 
     joystick_repeat_ticks: int = 0
+    _joystick_timer: Timer
 
     def __init__(self):
         self.keyboard = pynput.keyboard.Controller()
         self.mouse = pynput.mouse.Controller()
+        self.executor = OutputExecutor(self.keyboard)
+        self.macro_recorder = MacroRecorder()
+        self.executor.observer = self.macro_recorder
+        self.recorded_macros = self.macro_store.load(self.profile_name)
+        self._held_releases = [None] * len(g13lib.device.keycodes.key_ids)
+        self._held_gestures = {}
+        self.gestures = GestureDetector(self.dispatch_event, self.scheduler)
+        self.set_dispatch(self.compile_dispatch())
         self._previous_joystick_positions = ["JOY_X_ZERO_0", "JOY_Y_ZERO_0"]
 
-        # Connect synchronous signals
-        blinker.signal("app_changed").connect(self.app_changed)
-
         # connect asynchronous signal handlers
-        blinker.signal("g13_key").connect(self.handle_keystroke)
-        blinker.signal("g13_joy").connect(self.handle_joystick)
-
-        # set up task for joystick repeat handling
-        self._tasks_to_start = [
-            run_periodic(
-                self.joystick_repeat, self.JOY_REPEAT_INTERVAL, initial_delay_ms=1000
-            )
-        ]
+        self.connect("g13_key", self.handle_keystroke)
+        self.connect("g13_joy", self.handle_joystick)
+
+        # joystick repeat only runs while the joystick is held off center
+        self._joystick_timer = self.schedule(
+            self.joystick_repeat, self.JOY_REPEAT_INTERVAL, suspended=True
+        )
+
+    @property
+    def profile_name(self) -> str:
+        """The name recorded macros are saved under."""
+        return type(self).__name__
+
+    def compile_dispatch(
+        self, direct_mapping: dict | None = None, mapping_banks: dict | None = None
+    ) -> list[DispatchTable]:
+        """Compile this profile's mappings and recorded macros into a table per bank.
+
+        Compiles `direct_mapping` and `mapping_banks` in place of the profile's
+        own, if given. The tables aren't installed; see `set_dispatch`. Raises
+        MappingError if the mapping has bad entries.
+        """
+        if direct_mapping is None:
+            direct_mapping = self.direct_mapping
+        if mapping_banks is None:
+            mapping_banks = self.mapping_banks
+        for bank in mapping_banks:
+            if bank not in self.BANKS:
+                raise MappingError(f"{type(self).__name__}: unknown bank {bank!r}")
+
+        # banks with nothing extra share one table
+        compiled: dict[str | None, DispatchTable] = {}
+        tables = []
+        for bank in self.BANKS:
+            overlay = mapping_banks.get(bank) or {}
+            key = bank if overlay else None
+            if key not in compiled:
+                compiled[key] = self._compile_table(
+                    {**self.base_mapping, **direct_mapping, **overlay}
+                )
+            tables.append(compiled[key])
+        return tables
+
+    def _compile_table(self, mapping: dict) -> DispatchTable:
+        table = compile_mapping(self, mapping)
+        self.bind_recorded_macros(table)
+        return table
+
+    def bind_recorded_macros(self, table: DispatchTable):
+        """Bind every recorded macro in a table, over whatever its keys did."""
+        for key_code, steps in tuple(self.recorded_macros.items()):
+            if key_code not in g13lib.device.keycodes.key_ids:
+                logger.warning("Ignoring macro recorded for unknown key {}", key_code)
+                continue
+            set_binding(table, key_code, macro_handlers(self, steps))
+
+    def set_dispatch(self, tables: list[DispatchTable]):
+        """Start sending key events to newly compiled dispatch tables."""
+        self._bank_tables = tables
+        self._select_table()
+
+    def _select_table(self):
+        self._mapping_table = self._bank_tables[self._bank]
+        if self.macro_recorder.mode == "binding":
+            self._use_table(self._binding_table())
+        else:
+            self._use_table(self._mapping_table)
+
+    def _use_table(self, table: DispatchTable):
+        """Send key events to `table`, watching for its gestures."""
+        self._dispatch = table
+        if table.gestures.keys() != self._gesture_codes:
+            self.release_gestures()
+            self._gesture_codes = set(table.gestures)
+            self.gestures.configure(self._gesture_codes)
+
+    def release_gestures(self):
+        """Release any gestures that are down, and forget those in progress.
+        Their keys' releases are dropped, as their presses went elsewhere."""
+        held, self._held_gestures = self._held_gestures, {}
+        for release in held.values():
+            release()
+        self.gestures.reset()
+
+    def select_bank(self, bank: int):
+        """Switch to mapping bank 0-2 (M1-M3)."""
+        self._bank = bank
+        self._select_table()
+        self.show_bank()
+
+    def show_bank(self):
+        """Light the LED for the active bank."""
+        leds = g13lib.device.keycodes.leds
+        for bank_no, bank in enumerate(self.BANKS):
+            if bank_no == self._bank:
+                blinker.signal("g13_led_on").send(leds[bank])
+            else:
+                blinker.signal("g13_led_off").send(leds[bank])
+
+    def show_lighting(self):
+        """Fade the backlight to this profile's colour, if it has one."""
+        if self.backlight is not None:
+            blinker.signal("g13_backlight").send(self.backlight)
 
     def activate(self, msg):
         """Make this manager active and responsive to events and input."""
         self.active = True
+        self.show_bank()
+        self.show_lighting()
 
     def deactivate(self, msg):
         """Make this manager inactive and unresponsive to events and input."""
         self.active = False
+        self.release_gestures()
 
     def joystick_held(self):
         """returns true when the joystick is outside of the center position."""
@@ -86,6 +246,7 @@ class InputManager(PeriodicComponent):
         """Called every JOY_REPEAT_INTERVAL to handle joystick repeat events."""
 
         if not self.active:
+            self._joystick_timer.suspend()
             return
 
         if self.joystick_held():
@@ -99,31 +260,97 @@ class InputManager(PeriodicComponent):
         else:
             self.joystick_repeat_ticks = 0
 
+    @watched("g13_key")
     async def handle_keystroke(self, code: str):
         """Take in a G13 keystroke code and handle it accordingly."""
 
         if not self.active:
             return
 
-        action = code.split("_")[-1]
-        key_code = "_".join(code.split("_")[:-1])
-        output_key = self.direct_mapping.get(key_code)
-        if isinstance(output_key, typing.Callable):
-            output_key(self, action, key_code)
-
-        elif output_key:
-            self.send_output(output_key, action)
-        elif key_code == "BD":
-
-            raise EndProgram()
-
-        elif key_code == "M1":
-            blinker.signal("g13_set_status").send("Well now")
-        elif key_code == "M2":
-            blinker.signal("g13_clear_status").send()
+        slot = g13lib.device.keycodes.event_slots.get(code)
+        if slot is None:
+            # not a key we know; show it, as an unmapped key would be
+            print_code(code)
+            return
+        key_id = slot >> 1
+        if self.gestures.watched >> key_id & 1:
+            key, _, action = code.rpartition("_")
+            self.gestures.key_event(key, key_id, action == "PRESSED")
         else:
-            # as a debugging aid for now, show unhandled codes on the g13 console
-            blinker.signal("g13_print").send(code)
+            if self.gestures.pending_mask and not slot & 1:
+                # a chord's keys pressed before this one go first
+                self.gestures.resolve_pending()
+            self._dispatch_slot(slot)
+
+    def dispatch_event(self, code: str):
+        """Run the handler for a key's event, or a gesture's ("G1+G2_PRESSED")."""
+        slot = g13lib.device.keycodes.event_slots.get(code)
+        if slot is not None:
+            self._dispatch_slot(slot)
+            return
+        gesture, _, action = code.rpartition("_")
+        if action == "PRESSED":
+            press, self._held_gestures[gesture] = self._dispatch.gestures.get(
+                gesture, (no_op, no_op)
+            )
+            press()
+        else:
+            self._held_gestures.pop(gesture, no_op)()
+
+    def _dispatch_slot(self, slot: int):
+        key_id = slot >> 1
+        if slot & 1:
+            # release with the table that handled the press, in case the bank
+            # or the mapping changed while the key was held
+            release = self._held_releases[key_id] or self._dispatch[slot]
+            self._held_releases[key_id] = None
+            release()
+        else:
+            self._held_releases[key_id] = self._dispatch[slot + 1]
+            self._dispatch[slot]()
+
+    def toggle_macro_recording(self):
+        """Handle the MR key: start recording, stop recording, or give up binding."""
+        recorder = self.macro_recorder
+        mr_led = g13lib.device.keycodes.leds["MR"]
+        if recorder.mode == "idle":
+            recorder.start()
+            blinker.signal("g13_led_on").send(mr_led)
+            blinker.signal("g13_print").send("Recording macro...")
+        elif recorder.mode == "recording":
+            if recorder.stop():
+                self._use_table(self._binding_table())
+                blinker.signal("g13_print").send("Press a G key to bind")
+            else:
+                blinker.signal("g13_led_off").send(mr_led)
+                blinker.signal("g13_print").send("Nothing recorded")
+        else:
+            recorder.discard()
+            self._use_table(self._mapping_table)
+            blinker.signal("g13_led_off").send(mr_led)
+            blinker.signal("g13_print").send("Macro discarded")
+
+    def bind_recorded_macro(self, key_code: str):
+        """Bind the macro that's just been recorded to a G key, and save it."""
+        steps = self.macro_recorder.take()
+        self.recorded_macros[key_code] = steps
+        self.macro_store.save(self.profile_name, self.recorded_macros)
+        # recorded macros apply to every bank
+        for table in self._bank_tables:
+            set_binding(table, key_code, macro_handlers(self, steps))
+        self._use_table(self._mapping_table)
+        blinker.signal("g13_led_off").send(g13lib.device.keycodes.leds["MR"])
+        blinker.signal("g13_print").send(f"Macro bound to {key_code}")
+
+    def _binding_table(self) -> DispatchTable:
+        """A copy of the dispatch table where pressing a G key binds the recorded macro."""
+        # without the gestures, so every G key press gets through
+        table = DispatchTable(self._mapping_table)
+        for key_code in g13lib.device.keycodes.keycodes:
+            if key_code.startswith("G"):
+                bind = functools.partial(self.bind_recorded_macro, key_code)
+                set_binding(table, key_code, (bind, no_op))
+        return table
 
     def send_output(
         self,
@@ -132,10 +359,14 @@ class InputManager(PeriodicComponent):
     ):
         """Send output to the keyboard based on the action and key code.
 
+        Output goes through this manager's OutputExecutor, so macros with
+        delays play in the background and never block the event loop.
+
         output_key: the key or keys to send. Supports:
             - str or Key: single key
             - tuple: chord (hold all, release in reverse) - only on PRESSED
-            - list: sequence of keys/chords/delays to execute in order
+            - list: sequence of keys/chords/delays to execute in order - only on
+              PRESSED. Starting a list cancels any list that's still playing.
             - int: delay in milliseconds (only processed in lists)
             - Callable: a function to be called and passed (self, action), and its return value
               processed as output_key recursively.
@@ -149,28 +380,20 @@ class InputManager(PeriodicComponent):
         """
         if type(output_key) is list:
             if action == "PRESSED":
-                # Process list as a sequence of actions
-                for item in output_key:
-                    if isinstance(item, int):
-                        # Integer = delay in milliseconds
-                        time.sleep(item / 1000.0)
-                    else:
-                        # Recursively process each item (handles nested tuples/keys)
-                        self.send_output(item, "PRESSED")
+                self.executor.submit(
+                    compile_macro(
+                        output_key, lambda item: self.send_output(item, "PRESSED")
+                    )
+                )
         elif type(output_key) is tuple:
             if action == "PRESSED":
                 # multi-code events are only executed on press
-                # hold each in turn
-                for key in output_key:
-                    self.keyboard.press(key)
-                # release each in reverse order
-                for key in reversed(output_key):
-                    self.keyboard.release(key)
+                self.executor.chord(output_key)
         elif type(output_key) is str or isinstance(output_key, pynput.keyboard.Key):
             if action == "PRESSED":
-                self.keyboard.press(output_key)
+                self.executor.press(output_key)
             elif action == "RELEASED":
-                self.keyboard.release(output_key)
+                self.executor.release(output_key)
         elif callable(output_key):
             result = output_key(self, action)
             if result is not None:
@@ -201,6 +424,7 @@ class InputManager(PeriodicComponent):
 
         return False
 
+    @watched("g13_joy")
     async def handle_joystick(self, code: str):
         """Take in a joystick code and handle it accordingly.
 
@@ -221,6 +445,12 @@ class InputManager(PeriodicComponent):
         else:
             self._previous_joystick_positions[1] = code
 
+        if self.joystick_held():
+            self._joystick_timer.resume()
+        else:
+            self._joystick_timer.suspend()
+            self.joystick_repeat_ticks = 0
+
     def emit_scroll(self, j_axis: str, j_direction: str):
         """Emit a scroll event for the given axis and direction."""
         if j_axis == "X":
@@ -255,7 +485,28 @@ class InputManager(PeriodicComponent):
                 self.emit_scroll(j_axis, j_direction)
         return
 
-    def app_changed(self, app_name: str):
-        # in the future this will change profiles
-        # for now just print the name of the app
-        blinker.signal("g13_print").send(app_name)
+    def end_program(self, action, key_code):
+        if action == "PRESSED":
+            raise EndProgram()
+
+    def macro_record_key(self, action, key_code):
+        if action == "PRESSED":
+            self.toggle_macro_recording()
+
+    def bank_key(self, action, key_code):
+        if action == "PRESSED":
+            self.select_bank(self.BANKS.index(key_code))
+
+    def toggle_hud(self, action, key_code):
+        """Not bound by default; use e.g. `L4 = { call = "toggle_hud" }` in a profile."""
+        if action == "PRESSED":
+            blinker.signal("g13_toggle_hud").send()
+
+    # bindings every profile gets, unless its direct_mapping overrides them
+    base_mapping = {
+        "BD": end_program,
+        "MR": macro_record_key,
+        "M1": bank_key,
+        "M2": bank_key,
+        "M3": bank_key,
+    }
@@ -0,0 +1,256 @@
+"""
+Bitmap fonts compiled for the G13's LCD.
+
+BDF fonts are compiled once into a binary glyph table and cached on disk, keyed
+by a hash of the source file. The cached table is memory-mapped, so loading a
+font is just a hash check and an `mmap`, and every layer using the same font
+shares one copy.
+
+Glyphs are stored in the LCD's own column layout (see `ImageToLPBM`): each
+column of a glyph is `bands` bytes, one per 8-pixel band from the top, with the
+least significant bit at the top. A line of text is just its glyphs' columns
+concatenated. (Pixels beyond a glyph's advance width are clipped.)
+
+Cache file layout, all integers native-endian u32:
+
+    header      magic, version, height, ascent, bands, count, default, 0
+    codepoints  count, sorted
+    offsets     count + 1, into the column data (in columns)
+    advances    count
+    columns     bands bytes per column
+"""
+
+import array
+import bisect
+import functools
+import hashlib
+import mmap
+import os
+import tempfile
+from pathlib import Path
+
+from loguru import logger
+from PIL import Image
+
+FONT_DIR = Path(__file__).resolve().parents[2] / "font"
+CACHE_DIR = Path("~/.cache/g13slop/fonts").expanduser()
+
+# "G13F"; reads differently on a machine of the other endianness
+MAGIC = 0x46333147
+VERSION = 1
+HEADER_WORDS = 8
+
+
+class FontError(ValueError):
+    pass
+
+
+def parse_bdf(source: bytes) -> tuple[int, int, int, dict[int, tuple[int, list[int]]]]:
+    """Parse a BDF font into (height, ascent, default char, glyphs).
+
+    Each glyph is (advance, rows), where each row is a bitmask of the glyph's
+    pixels on that row of the character cell, bit 0 leftmost.
+    """
+    ascent = descent = None
+    box = None
+    default = 0x20
+    glyphs: dict[int, tuple[int, list[int]]] = {}
+
+    lines = iter(source.decode("latin-1").splitlines())
+    for line in lines:
+        keyword, _, rest = line.partition(" ")
+        if keyword == "FONTBOUNDINGBOX":
+            box = [int(v) for v in rest.split()]
+        elif keyword == "FONT_ASCENT":
+            ascent = int(rest)
+        elif keyword == "FONT_DESCENT":
+            descent = int(rest)
+        elif keyword == "DEFAULT_CHAR":
+            default = int(rest)
+        elif keyword == "STARTCHAR":
+            if box is None:
+                raise FontError("STARTCHAR before FONTBOUNDINGBOX")
+            if ascent is None:
+                ascent = box[1] + box[3]
+            if descent is None:
+                descent = -box[3]
+            codepoint, glyph = _parse_char(lines, ascent, ascent + descent)
+            if codepoint >= 0:
+                glyphs[codepoint] = glyph
+
+    if not glyphs or ascent is None or descent is None:
+        raise FontError("No glyphs found")
+    return ascent + descent, ascent, default, glyphs
+
+
+def _parse_char(lines, ascent: int, height: int) -> tuple[int, tuple[int, list[int]]]:
+    codepoint = -1
+    advance = 0
+    width = rows = x_off = y_off = 0
+    for line in lines:
+        keyword, _, rest = line.partition(" ")
+        if keyword == "ENCODING":
+            codepoint = int(rest.split()[0])
+        elif keyword == "DWIDTH":
+            advance = int(rest.split()[0])
+        elif keyword == "BBX":
+            width, rows, x_off, y_off = (int(v) for v in rest.split())
+        elif keyword == "BITMAP":
+            break
+        elif keyword == "ENDCHAR":
+            raise FontError(f"Glyph {codepoint} has no BITMAP")
+
+    cell = [0] * height
+    top = ascent - (y_off + rows)
+    row_bytes = (width + 7) // 8
+    for row in range(rows):
+        bits = int(next(lines).strip()[: row_bytes * 2] or "0", 16)
+        y = top + row
+        if not 0 <= y < height:
+            continue
+        for x in range(width):
+            if bits & (1 << (row_bytes * 8 - 1 - x)) and x + x_off >= 0:
+                cell[y] |= 1 << (x + x_off)
+    for line in lines:
+        if line.startswith("ENDCHAR"):
+            break
+    return codepoint, (max(advance, 0), cell)
+
+
+def compile_bdf(source: bytes) -> bytes:
+    """Compile a BDF font into the binary glyph table."""
+    height, ascent, default, glyphs = parse_bdf(source)
+    bands = (height + 7) // 8
+
+    codepoints = array.array("I", sorted(glyphs))
+    offsets = array.array("I", [0])
+    advances = array.array("I")
+    columns = bytearray()
+    for codepoint in codepoints:
+        advance, cell = glyphs[codepoint]
+        for x in range(advance):
+            for band in range(bands):
+                byte = 0
+                for bit, row in enumerate(cell[band * 8 : band * 8 + 8]):
+                    if row >> x & 1:
+                        byte |= 1 << bit
+                columns.append(byte)
+        offsets.append(offsets[-1] + advance)
+        advances.append(advance)
+
+    default_index = bisect.bisect_left(codepoints, default)
+    if default_index == len(codepoints) or codepoints[default_index] != default:
+        default_index = 0
+    header = array.array(
+        "I",
+        [MAGIC, VERSION, height, ascent, bands, len(codepoints), default_index, 0],
+    )
+    return b"".join(
+        (
+            header.tobytes(),
+            codepoints.tobytes(),
+            offsets.tobytes(),
+            advances.tobytes(),
+            bytes(columns),
+        )
+    )
+
+
+class Font:
+    """A compiled bitmap font, backed by a (usually memory-mapped) glyph table."""
+
+    height: int
+    ascent: int
+    bands: int
+
+    def __init__(self, data: bytes | mmap.mmap, name: str = "font"):
+        self.name = name
+        self._data = data
+        # a truncated file (say, from a crash while caching) isn't a font
+        if len(data) < HEADER_WORDS * 4:
+            raise FontError(f"{name} is truncated")
+        words = memoryview(data)[: HEADER_WORDS * 4].cast("I")
+        magic, version, self.height, self.ascent, self.bands, count, default = words[:7]
+        if magic != MAGIC or version != VERSION:
+            raise FontError(f"{name} is not a compiled font")
+        table = memoryview(data)[HEADER_WORDS * 4 :]
+        if len(table) < (3 * count + 1) * 4:
+            raise FontError(f"{name} is truncated")
+        self._codepoints = table[: count * 4].cast("I")
+        self._offsets = table[count * 4 : (2 * count + 1) * 4].cast("I")
+        self._advances = table[(2 * count + 1) * 4 : (3 * count + 1) * 4].cast("I")
+        self._columns = table[(3 * count + 1) * 4 :]
+        if len(self._columns) < self._offsets[-1] * self.bands:
+            raise FontError(f"{name} is truncated")
+        self._default = default
+
+    def _index(self, char: str) -> int:
+        codepoint = ord(char)
+        index = bisect.bisect_left(self._codepoints, codepoint)
+        if index < len(self._codepoints) and self._codepoints[index] == codepoint:
+            return index
+        return self._default
+
+    def glyph(self, char: str) -> memoryview:
+        """A character's columns."""
+        index = self._index(char)
+        start, end = self._offsets[index], self._offsets[index + 1]
+        return self._columns[start * self.bands : end * self.bands]
+
+    def text_width(self, text: str) -> int:
+        return sum(self._advances[self._index(char)] for char in text)
+
+    def columns(self, text: str) -> bytes:
+        """A line of text in LCD column layout."""
+        return b"".join(self.glyph(char) for char in text)
+
+    def render(self, text: str) -> Image.Image | None:
+        """Render a line of text as a 1-bit mask, set where there's ink."""
+        data = self.columns(text)
+        width = len(data) // self.bands
+        if not width:
+            return None
+        image = Image.new("1", (width, self.bands * 8))
+        for band in range(self.bands):
+            # each column byte becomes one row of an 8-pixel-wide image,
+            # which is then turned on its side
+            strip = Image.frombytes(
+                "1", (8, width), data[band :: self.bands], "raw", "1;R"
+            )
+            image.paste(strip.transpose(Image.Transpose.TRANSPOSE), (0, band * 8))
+        if image.height != self.height:
+            image = image.crop((0, 0, width, self.height))
+        return image
+
+
+def cache_path(source_path: Path, source: bytes, cache_dir: Path) -> Path:
+    digest = hashlib.sha256(source).hexdigest()[:16]
+    return cache_dir / f"{source_path.stem}-{digest}.g13f"
+
+
+def load_font_file(source_path: Path, cache_dir: Path = CACHE_DIR) -> Font:
+    """Load a BDF font, compiling it if it isn't already in the cache."""
+    source = source_path.read_bytes()
+    path = cache_path(source_path, source, cache_dir)
+    try:
+        with open(path, "rb") as f:
+            return Font(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ), path.name)
+    except (OSError, ValueError, FontError):
+        pass
+
+    logger.debug("Compiling font {}", source_path)
+    data = compile_bdf(source)
+    try:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=cache_dir, delete=False) as f:
+            f.write(data)
+        os.replace(f.name, path)
+    except OSError as e:
+        logger.warning("Couldn't cache font {}: {}", path, e)
+    return Font(data, path.name)
+
+
+@functools.cache
+def load_font(name: str) -> Font:
+    """A font from the font directory by name, e.g. "spleen-5x8"."""
+    return load_font_file(FONT_DIR / f"{name}.bdf")
@@ -0,0 +1,71 @@
+"""
+A performance HUD drawn over the top of the LCD.
+
+Shows the LCD frame rate, the mean input latency (from the USB read to the
+last key handler finishing) and the depth of the USB read/write queues, all
+from the metrics registry. Toggled with the `g13_toggle_hud` signal.
+
+The figures are only worked out once a second, so the HUD itself only changes
+the frame (and costs a USB write) once a second.
+"""
+
+import time
+
+from PIL import Image, ImageDraw
+
+import g13lib.metrics as metrics
+from g13lib.lcd.fonts import load_font
+from g13lib.render_fb import Layer
+
+
+class PerformanceHUD(Layer):
+    UPDATE_INTERVAL_S = 1.0
+
+    font_name: str = "spleen-5x8"
+
+    _image: Image.Image | None = None
+    _updated_at: float = 0.0
+    _frames: int = 0
+    _latency: tuple[int, float] = (0, 0.0)
+
+    def __init__(self, registry: metrics.Registry = metrics.default_registry):
+        self.frames_sent = registry.counter("lcd.frames_sent")
+        self.latency = registry.histogram("input.latency")
+        self.read_queue = registry.gauge("usb.read_queue")
+        self.write_queue = registry.gauge("usb.write_queue")
+
+    def on_show(self):
+        # start counting afresh
+        self._updated_at = time.monotonic()
+        self._frames = self.frames_sent.value
+        self._latency = (self.latency.count, self.latency.total)
+        self._image = self.draw("FPS -- LAT -- Q --")
+
+    def text(self, elapsed: float) -> str:
+        fps = (self.frames_sent.value - self._frames) / elapsed
+        count, total = self.latency.count, self.latency.total
+        if count > self._latency[0]:
+            mean = (total - self._latency[1]) / (count - self._latency[0])
+            latency = f"{mean * 1000:.1f}ms"
+        else:
+            latency = "--"
+        queues = f"{self.read_queue.snapshot():.0f}/{self.write_queue.snapshot():.0f}"
+        return f"FPS {fps:.0f} LAT {latency} Q {queues}"
+
+    def draw(self, text: str) -> Image.Image:
+        """The text, dark on a lit bar."""
+        font = load_font(self.font_name)
+        glyphs = font.render(text)
+        image = Image.new("1", (glyphs.width + 2, font.height + 1), 1)
+        ImageDraw.Draw(image).bitmap((1, 0), glyphs, fill=0)
+        return image
+
+    def render(self) -> tuple[Image.Image | None, tuple[int, int]]:
+        now = time.monotonic()
+        elapsed = now - self._updated_at
+        if elapsed >= self.UPDATE_INTERVAL_S:
+            self._image = self.draw(self.text(elapsed))
+            self._updated_at = now
+            self._frames = self.frames_sent.value
+            self._latency = (self.latency.count, self.latency.total)
+        return self._image, (0, 0)
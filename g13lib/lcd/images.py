@@ -1,23 +1,40 @@
 from PIL import Image
 
-from g13lib.render_fb import Layer
+from g13lib.render_fb import Layer, Sprite
 
 
 class SimpleImageLayer(Layer):
+    """An image, converted for the LCD once, when the layer is made."""
+
+    static = True
+
     image: Image.Image
     position: tuple[int, int]
+    sprite: Sprite
 
     def __init__(self, image: Image.Image, position: tuple[int, int] = (0, 0)):
         self.image = image
         self.position = position
+        self.sprite = Sprite(image)
+
+    def set_image(self, image: Image.Image):
+        self.image = image
+        self.sprite = Sprite(image)
+        self.changed()
 
     def render(self) -> tuple[Image.Image | None, tuple[int, int]]:
         return self.image, self.position
 
+    def composite(self, framebuffer: Image.Image):
+        self.sprite.draw(framebuffer, self.position)
+
 
 class DecayingImage(SimpleImageLayer):
     """An image that decays after a set number of renderings (10ms apart)"""
 
+    # it changes every frame until it's gone
+    static = False
+
     decay_ticks: int = 30
     current_ticks: int = 0
 
@@ -26,6 +43,15 @@ class DecayingImage(SimpleImageLayer):
         self.image = image.convert("RGBA")
         self.position = position
 
+    def set_image(self, image: Image.Image):
+        """Show a new image, and start fading it out again."""
+        self.image = image.convert("RGBA")
+        self.current_ticks = 0
+
+    def on_show(self):
+        # fade in again each time its compositor is put back on the LCD
+        self.current_ticks = 0
+
     def faded_image(self) -> Image.Image | None:
         """Return the faded image based on current ticks."""
         if self.current_ticks < self.decay_ticks:
@@ -43,3 +69,12 @@ class DecayingImage(SimpleImageLayer):
         self.current_ticks += 1
         faded_image = self.faded_image()
         return faded_image, self.position
+
+    def composite(self, framebuffer: Image.Image):
+        if self.current_ticks >= self.decay_ticks:
+            # faded away: nothing to work out or draw
+            return
+        faded_image, position = self.render()
+        if faded_image:
+            # already 1-bit and opaque
+            framebuffer.paste(faded_image, position)
@@ -0,0 +1,330 @@
+"""
+Layers drawn by other processes, through shared memory.
+
+A script that wants to draw on the LCD creates a named layer with
+`SharedLayerWriter`, which keeps a small 1-bit bitmap and mask in shared
+memory and tells the daemon about it with a datagram on `LAYER_SOCKET`. The
+daemon maps the same memory and composites the layer over whatever's on
+screen, every frame, until the writer closes it:
+
+    with SharedLayerWriter("cpu", (40, 8), position=(120, 0)) as layer:
+        while True:
+            layer.write(draw_cpu_graph())
+            time.sleep(0.5)
+
+Writing copies the image into the mapping and sends the layer's name to mark
+it damaged. The daemon only decodes a layer again once it's damaged, so an
+unchanged layer costs one paste a frame, and nothing is serialized or spawned
+per update.
+
+The shared memory holds:
+
+    header   b"G13L", generation (u32), x, y (i16), width, height (u16)
+    pixels   a PIL "1" image's raw bytes: rows of ceil(width / 8) bytes,
+             most significant bit first
+    mask     the same, 1 where the layer is opaque
+
+The generation is odd while the writer is writing, so the daemon can tell a
+torn read and try again on the next frame. Messages are ASCII datagrams:
+
+    attach NAME     a writer has created the layer, replacing any before it
+    damage NAME     the layer has changed (the first one attaches it)
+    close NAME      the layer's gone
+"""
+
+import asyncio
+import contextlib
+import os
+import re
+import socket
+import struct
+import threading
+from multiprocessing import shared_memory
+
+import blinker
+from loguru import logger
+from PIL import Image
+
+from g13lib.async_help import PeriodicComponent
+from g13lib.render_fb import LCD_HEIGHT, LCD_WIDTH, Layer, Sprite
+
+LAYER_SOCKET = os.environ.get("G13_LAYER_SOCKET", "/tmp/g13slop-layers.sock")
+
+MAGIC = b"G13L"
+HEADER = struct.Struct("<4sIhhHH")
+# macOS allows 31 characters in a shared memory name, prefix included
+NAME_PATTERN = re.compile(r"[A-Za-z0-9_-]{1,16}")
+SHM_PREFIX = "g13slop-layer-"
+
+
+class SharedLayerError(ValueError):
+    pass
+
+
+def shm_name(name: str) -> str:
+    if not NAME_PATTERN.fullmatch(name):
+        raise SharedLayerError(f"Invalid layer name {name!r}")
+    return SHM_PREFIX + name
+
+
+def plane_size(width: int, height: int) -> int:
+    return (width + 7) // 8 * height
+
+
+class SharedLayerWriter:
+    """Creates a shared layer and draws on it. For use in other processes."""
+
+    generation: int = 0
+
+    def __init__(
+        self,
+        name: str,
+        size: tuple[int, int] = (LCD_WIDTH, LCD_HEIGHT),
+        position: tuple[int, int] = (0, 0),
+        path: str = LAYER_SOCKET,
+    ):
+        self.name = name
+        self.size = width, height = size
+        self.position = position
+        self.path = path
+        if not (0 < width <= LCD_WIDTH and 0 < height <= LCD_HEIGHT):
+            raise SharedLayerError(f"Invalid layer size {size}")
+        self._plane = plane_size(width, height)
+        memory_name = shm_name(name)
+        try:
+            self.memory = shared_memory.SharedMemory(
+                memory_name, create=True, size=HEADER.size + 2 * self._plane
+            )
+        except FileExistsError:
+            # left behind by a writer that didn't close it
+            stale = shared_memory.SharedMemory(memory_name)
+            stale.close()
+            stale.unlink()
+            self.memory = shared_memory.SharedMemory(
+                memory_name, create=True, size=HEADER.size + 2 * self._plane
+            )
+        self._write_header()
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        # the daemon may still have a crashed writer's layer by this name
+        self._send("attach")
+
+    def _write_header(self):
+        HEADER.pack_into(
+            self.memory.buf, 0, MAGIC, self.generation, *self.position, *self.size
+        )
+
+    def _send(self, command: str):
+        try:
+            self.sock.sendto(f"{command} {self.name}".encode(), self.path)
+        except (FileNotFoundError, ConnectionRefusedError):
+            # the daemon isn't running; it'll see the layer on the next write
+            pass
+
+    def write_raw(self, pixels: bytes, mask: bytes | None = None):
+        """Replace the layer's pixels (and mask, or make it all opaque)."""
+        if len(pixels) != self._plane or (mask is not None and len(mask) != self._plane):
+            raise SharedLayerError(f"Planes must be {self._plane} bytes")
+        buffer = self.memory.buf
+        # odd while writing, so a reader knows not to trust what it sees
+        self.generation += 1
+        self._write_header()
+        buffer[HEADER.size : HEADER.size + self._plane] = pixels
+        mask_start = HEADER.size + self._plane
+        buffer[mask_start : mask_start + self._plane] = mask or b"\xff" * self._plane
+        self.generation += 1
+        self._write_header()
+        self._send("damage")
+
+    def write(self, image: Image.Image, mask: Image.Image | None = None):
+        """Replace the layer's pixels with an image the size of the layer."""
+        if image.size != self.size:
+            raise SharedLayerError(f"Image must be {self.size}, not {image.size}")
+        self.write_raw(
+            image.convert("1").tobytes(),
+            None if mask is None else mask.convert("1").tobytes(),
+        )
+
+    def move(self, x: int, y: int):
+        self.position = (x, y)
+        # a move is a write of the header alone
+        self.generation += 2
+        self._write_header()
+        self._send("damage")
+
+    def close(self):
+        self._send("close")
+        self.sock.close()
+        self.memory.close()
+        with contextlib.suppress(FileNotFoundError):
+            self.memory.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class SharedLayer(Layer):
+    """A layer drawn by another process. Decoded again only when damaged."""
+
+    damaged: bool = True
+    position: tuple[int, int] = (0, 0)
+
+    _image: Image.Image | None = None
+    # the same, ready to paste
+    _sprite: Sprite | None = None
+    _memory: shared_memory.SharedMemory | None
+
+    def __init__(self, name: str):
+        self.name = name
+        # the writer owns it, so don't let our resource tracker unlink it
+        self._memory = shared_memory.SharedMemory(shm_name(name), track=False)
+        magic, _, _, _, width, height = HEADER.unpack_from(self._memory.buf)
+        self.size = (width, height)
+        self._plane = plane_size(width, height)
+        if magic != MAGIC or self._memory.size < HEADER.size + 2 * self._plane:
+            self._memory.close()
+            raise SharedLayerError(f"{name} isn't a G13 layer")
+        # held while decoding, which may be on the render thread
+        self._lock = threading.Lock()
+
+    def _decode(self) -> bool:
+        buffer = self._memory.buf
+        generation, x, y = HEADER.unpack_from(buffer)[1:4]
+        if generation % 2:
+            return False
+        pixels_end = HEADER.size + self._plane
+        pixels = Image.frombytes("1", self.size, bytes(buffer[HEADER.size : pixels_end]))
+        mask = Image.frombytes(
+            "1", self.size, bytes(buffer[pixels_end : pixels_end + self._plane])
+        )
+        if HEADER.unpack_from(buffer)[1] != generation:
+            return False
+        self._image = Image.merge("LA", (pixels.convert("L"), mask.convert("L")))
+        self._sprite = Sprite(pixels, mask)
+        self.position = (x, y)
+        return True
+
+    def mark_damaged(self):
+        with self._lock:
+            self.damaged = True
+
+    def render(self) -> tuple[Image.Image | None, tuple[int, int]]:
+        with self._lock:
+            if self.damaged and self._memory is not None:
+                # a torn read stays damaged, and is tried again next frame
+                self.damaged = not self._decode()
+            return self._image, self.position
+
+    def composite(self, framebuffer: Image.Image):
+        with self._lock:
+            if self.damaged and self._memory is not None:
+                self.damaged = not self._decode()
+            sprite, position = self._sprite, self.position
+        if sprite is not None:
+            sprite.draw(framebuffer, position)
+
+    def close(self):
+        with self._lock:
+            if self._memory is not None:
+                self._memory.close()
+                self._memory = None
+            self._image = self._sprite = None
+
+
+class SharedLayerServer(PeriodicComponent):
+    """Attaches shared layers as their writers announce them, and shows them
+    over the LCD."""
+
+    # how often to check for layers whose writer went away without closing them
+    PRUNE_MS = 1000
+
+    path: str
+    layers: dict[str, SharedLayer]
+    # bound once the tasks start, after root privileges have been dropped
+    sock: socket.socket | None = None
+
+    def __init__(self, path: str = LAYER_SOCKET):
+        self.path = path
+        self.layers = {}
+        self.schedule(self.prune, self.PRUNE_MS)
+
+    def start_tasks(self, tg: asyncio.TaskGroup):
+        super().start_tasks(tg)
+        # a socket left over from a previous run would stop us binding
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(self.path)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        try:
+            sock.bind(self.path)
+        except OSError as e:
+            sock.close()
+            logger.warning("Can't listen for shared layers: {}", e)
+            return
+        sock.setblocking(False)
+        self.sock = sock
+        asyncio.get_running_loop().add_reader(sock.fileno(), self.receive)
+
+    def receive(self):
+        while True:
+            try:
+                data = self.sock.recv(64)
+            except BlockingIOError:
+                return
+            command, _, name = data.decode("ascii", "replace").partition(" ")
+            if command == "attach":
+                self.attach(name)
+            elif command == "damage":
+                self.damage(name)
+            elif command == "close":
+                self.remove(name)
+            else:
+                logger.warning("Bad shared layer message: {!r}", data)
+
+    def attach(self, name: str):
+        """Attach a newly created layer, letting go of any old one by its name."""
+        self.remove(name)
+        self.damage(name)
+
+    def damage(self, name: str):
+        layer = self.layers.get(name)
+        if layer is not None:
+            layer.mark_damaged()
+            return
+        try:
+            layer = SharedLayer(name)
+        except (OSError, ValueError) as e:
+            logger.warning("Can't attach shared layer {}: {}", name, e)
+            return
+        self.layers[name] = layer
+        blinker.signal("g13_add_overlay").send(layer)
+        logger.info("Attached shared layer {}", name)
+
+    def remove(self, name: str):
+        layer = self.layers.pop(name, None)
+        if layer is None:
+            return
+        blinker.signal("g13_remove_overlay").send(layer)
+        layer.close()
+        logger.info("Removed shared layer {}", name)
+
+    def prune(self):
+        for name in list(self.layers):
+            try:
+                shared_memory.SharedMemory(shm_name(name), track=False).close()
+            except FileNotFoundError:
+                self.remove(name)
+
+    async def stop_tasks(self):
+        await super().stop_tasks()
+        for name in list(self.layers):
+            self.remove(name)
+        if self.sock is None:
+            return
+        with contextlib.suppress(RuntimeError):
+            asyncio.get_running_loop().remove_reader(self.sock.fileno())
+        self.sock.close()
+        self.sock = None
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(self.path)
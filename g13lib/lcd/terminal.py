@@ -11,22 +11,39 @@ Monitors a signal for new text to print, and updates the image accordingly. In t
 text using the `g13_print` signal will print to all active instances of this class, and the LCD screen
 will be updated if the active compisitor includes this layer.
 
+Printing only appends to a fixed-size scrollback buffer and marks the layer dirty; the image is
+rendered at most once per LCD frame, when the compositor asks for it. So a burst of prints costs the
+same to draw as a single one, and memory stays bounded however many lines arrive. The view can be
+scrolled back through the scrollback with the `g13_scroll` signal (positive numbers of rows scroll
+back in time, negative forwards).
+
+While the terminal isn't on screen, prints are just queued, and are wrapped into rows when it's shown
+again.
+
+The terminal can be rendered on another thread while prints arrive on the event loop (see
+`G13DeviceOutputManager`): its state is only touched with its lock held, and the image is drawn from a
+copy of the rows in view, outside the lock.
+
 Also supports a bottom status line that can appear at the bottom of the screen. (Ideal for labeling
 the L1-L4 keys, for example.) (Set and cleared using the `g13_set_status` and `g13_clear_status` signals.)
 
 """
 
+import collections
 import itertools
+import threading
 
 import blinker
-from PIL import Image, ImageChops, ImageDraw, ImageFont
+from PIL import Image, ImageChops, ImageDraw
 
+from g13lib.lcd.fonts import Font, load_font
 from g13lib.render_fb import Layer
 
-spleen_font = ImageFont.load("font/spleen-5x8.pil")
-
 
 class LogEmulator(Layer):
+    # it only changes when it's invalidated, so it can be part of a cached background
+    static = True
+
     # G13 LCD is 160x48 pixels
     lcd_dims = (160, 48)
     # G13 LCD dimensions in character cells using 5x8 font
@@ -34,33 +51,56 @@ class LogEmulator(Layer):
     term_rows: int = 5
 
     row_height: int = 9  # pixels per text row
+    font_name: str = "spleen-5x8"
 
     # NOTE: 8 pixel font + 1 pixel spacing
     # total rows = 48 / 9 = 5.33, so we can fit 5 full rows
     # we're wasting 3 rows of pixels?
     # or maybe the display is not exactly 48 pixels high?
 
-    buffer: list[str]
+    # rows of history kept for scrolling back
+    scrollback: int = 200
+
+    buffer: collections.deque[str]
     autowrap: bool = True
     status: str = ""
 
+    # rows scrolled back from the newest line
+    scroll_offset: int = 0
+
+    # prints received while hidden, not yet wrapped into the buffer
+    _pending: collections.deque[str]
+
     dirty: bool = True
     _image_cache: Image.Image | None = None
+    # bumped whenever the view changes, so a render of an older view isn't cached
+    _generation: int = 0
+    _lock: threading.Lock
 
     def __init__(self):
         # initialize the buffer with empty lines
-        self.buffer = [" " * self.row_chars for _ in range(self.term_rows)]
+        self.buffer = collections.deque(
+            [" " * self.row_chars] * self.term_rows,
+            maxlen=max(self.scrollback, self.term_rows),
+        )
         self.status = ""
+        self.scroll_offset = 0
+        # each print adds at least one row, so this is enough to refill the buffer
+        self._pending = collections.deque(maxlen=self.buffer.maxlen)
+        self._lock = threading.Lock()
 
         # connect the signals
 
         blinker.signal("g13_print").connect(self.output)
         blinker.signal("g13_set_status").connect(self.set_status)
         blinker.signal("g13_clear_status").connect(self.clear_status)
+        blinker.signal("g13_scroll").connect(self.scroll)
 
     def _invalidate(self, msg=None):
         self.dirty = True
         self._image_cache = None
+        self._generation += 1
+        self.changed()
 
     def split_input(self, raw_line: str):
         lines = []
@@ -75,56 +115,108 @@ class LogEmulator(Layer):
         return lines
 
     def output(self, raw_line: str):
-        for line in self.split_input(raw_line):
-            self.buffer.append(line)
-        self.buffer = self.buffer[-self.term_rows :]
+        with self._lock:
+            if not self.visible:
+                self._pending.append(raw_line)
+                return
+            self._add_lines(self.split_input(raw_line))
+
+    def _flush_pending(self):
+        if self._pending:
+            lines = []
+            for raw_line in self._pending:
+                lines.extend(self.split_input(raw_line))
+            self._pending.clear()
+            self._add_lines(lines)
+
+    def on_show(self):
+        with self._lock:
+            self._flush_pending()
+
+    def _add_lines(self, lines: list[str]):
+        self.buffer.extend(lines)
+        if self.scroll_offset:
+            # keep showing the same lines while scrolled back
+            self.scroll_offset = min(
+                self.scroll_offset + len(lines), len(self.buffer) - self.term_rows
+            )
         self._invalidate()
-        blinker.signal("g13_framebuffer").send(self.framebuffer())
+
+    def scroll(self, rows: int):
+        """Scroll back (positive) or forward (negative) through the history."""
+        with self._lock:
+            self._flush_pending()
+            offset = max(
+                0, min(self.scroll_offset + rows, len(self.buffer) - self.term_rows)
+            )
+            if offset != self.scroll_offset:
+                self.scroll_offset = offset
+                self._invalidate()
 
     def set_status(self, status: str):
-        self.status = status
-        self._invalidate()
-        blinker.signal("g13_framebuffer").send(self.framebuffer())
+        with self._lock:
+            self.status = status
+            self._invalidate()
 
     def clear_status(self, *msg):
-        self.status = ""
-        self._invalidate()
-        blinker.signal("g13_framebuffer").send(self.framebuffer())
+        with self._lock:
+            self.status = ""
+            self._invalidate()
+
+    @property
+    def font(self) -> Font:
+        """The terminal font, loaded the first time anything is drawn."""
+        return load_font(self.font_name)
 
     def content(self) -> list[str]:
-        return ["".join(row) for row in self.buffer]
+        """The rows currently in view."""
+        with self._lock:
+            return self._content()
+
+    def _content(self) -> list[str]:
+        self._flush_pending()
+        end = len(self.buffer) - self.scroll_offset
+        return [self.buffer[i] for i in range(end - self.term_rows, end)]
 
     def framebuffer(self, msg=None) -> Image.Image:
         """Returns the current framebuffer image.
 
         Although this image is very small, we cache it to avoid re-rendering on every request.
         """
-        if not self.dirty and self._image_cache:
-            return self._image_cache
-
-        self._image_cache = self._render_buffer_to_image()
-        self.dirty = False
-        return self._image_cache
-
-    def _render_buffer_to_image(self):
-        """The actual rendering logic. Converts the text buffer to a 1-bit PIL Image."""
+        with self._lock:
+            if not self.dirty and self._image_cache:
+                return self._image_cache
+            generation = self._generation
+            content, status = self._content(), self.status
+
+        image = self._render_buffer_to_image(content, status)
+        with self._lock:
+            if generation == self._generation:
+                self._image_cache = image
+                self.dirty = False
+        return image
+
+    def _render_buffer_to_image(self, content: list[str], status: str):
+        """The actual rendering logic. Converts the rows in view to a 1-bit PIL Image."""
         # FIXME: this is white-on-black; black-on-white could/should be an option too?
         image = Image.new(
             "1", self.lcd_dims, 1
         )  # Mode "1" for 1-bit pixels, white background
         draw = ImageDraw.Draw(image)
+        font = self.font
 
         # if the status line is set, skip the first row of the buffer
-        content = self.content()
-        if self.status:
+        if status:
             content = content[1:]
 
         for i, row_content in enumerate(content):
-            draw.text((0, i * self.row_height), row_content, font=spleen_font, fill=0)
+            glyphs = font.render(row_content)
+            if glyphs:
+                draw.bitmap((0, i * self.row_height), glyphs, fill=0)
 
         # if there's a status line, draw a black box on the final row
         # and then the status line on top in white
-        if self.status:
+        if status:
             draw.rectangle(
                 (
                     0,
@@ -134,12 +226,9 @@ class LogEmulator(Layer):
                 ),
                 fill=0,
             )
-            draw.text(
-                (0, (self.term_rows - 1) * self.row_height),
-                self.status,
-                font=spleen_font,
-                fill=1,
-            )
+            glyphs = font.render(status)
+            if glyphs:
+                draw.bitmap((0, (self.term_rows - 1) * self.row_height), glyphs, fill=1)
         image = image.convert("L")
         final = ImageChops.invert(image).convert("1")  # white on black
         return final
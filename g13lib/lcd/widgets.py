@@ -0,0 +1,255 @@
+"""
+Small graph and readout widgets for the LCD.
+
+Each widget is a layer with its own 1-bit image, lit pixels on an opaque
+dark background, and is only drawn again when its value changes:
+
+    Sparkline   a scrolling graph, one column per sample
+    BarMeter    a horizontal bar, value / maximum
+    ProgressBar a bar meter with a frame round it
+    BigNumber   a value in the terminal font, scaled up
+
+Samples are kept in a fixed-size `RingBuffer` of doubles. A sparkline with a
+fixed scale scrolls its image along by one column and draws just the new one;
+with `autoscale`, it's redrawn only when the scale changes. A meter fills or
+clears only the span between its old and new lengths.
+
+Widgets are static layers (see `Layer.static`), so an unchanged widget is
+part of the compositor's cached background and costs nothing per frame.
+Give a widget a `stat` name to feed it from `g13lib.monitors.system_stats`.
+"""
+
+import array
+import threading
+
+import blinker
+from PIL import Image, ImageDraw
+
+from g13lib.lcd.fonts import load_font
+from g13lib.render_fb import Layer
+
+# pixel values in a widget's image
+INK = 1
+BACKGROUND = 0
+
+
+class RingBuffer:
+    """The last `capacity` numbers, oldest first."""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._values = array.array("d", bytes(8 * capacity))
+        self._count = 0
+
+    def __len__(self) -> int:
+        return min(self._count, self.capacity)
+
+    def append(self, value: float):
+        self._values[self._count % self.capacity] = value
+        self._count += 1
+
+    @property
+    def latest(self) -> float | None:
+        return self._values[(self._count - 1) % self.capacity] if self._count else None
+
+    def values(self) -> list[float]:
+        if self._count <= self.capacity:
+            return self._values[: self._count].tolist()
+        start = self._count % self.capacity
+        return (self._values[start:] + self._values[:start]).tolist()
+
+    def max(self) -> float:
+        if self._count < self.capacity:
+            return max(self._values[: self._count], default=0.0)
+        return max(self._values)
+
+
+class Widget(Layer):
+    """A widget's image, position and lock. Subclasses draw on `image`."""
+
+    static = True
+
+    position: tuple[int, int]
+    size: tuple[int, int]
+    image: Image.Image
+    draw: ImageDraw.ImageDraw
+
+    def __init__(
+        self,
+        size: tuple[int, int],
+        position: tuple[int, int] = (0, 0),
+        stat: str | None = None,
+    ):
+        self.size = size
+        self.position = position
+        self.image = Image.new("1", size, BACKGROUND)
+        self.draw = ImageDraw.Draw(self.image)
+        self.stat = stat
+        # values arrive on the event loop, and frames may be drawn on a worker
+        self._lock = threading.Lock()
+        if stat is not None:
+            blinker.signal("g13_stats").connect(self.on_stats)
+
+    def on_stats(self, stats: dict[str, float]):
+        value = stats.get(self.stat)
+        if value is not None:
+            self.push(value)
+
+    def push(self, value: float):
+        with self._lock:
+            if self.update(value):
+                self.changed()
+
+    def update(self, value: float) -> bool:
+        """Take a new value, drawing whatever it changes. Returns whether it did."""
+        raise NotImplementedError
+
+    def render(self) -> tuple[Image.Image | None, tuple[int, int]]:
+        with self._lock:
+            return self.image.copy(), self.position
+
+    def composite(self, framebuffer: Image.Image):
+        with self._lock:
+            framebuffer.paste(self.image, self.position)
+
+
+class Sparkline(Widget):
+    """A graph of the last `width` samples, scrolling left as they arrive.
+
+    Values are plotted from `minimum` to `maximum`, or from `minimum` to the
+    largest value in view if `autoscale` is set."""
+
+    def __init__(
+        self,
+        size: tuple[int, int],
+        position: tuple[int, int] = (0, 0),
+        minimum: float = 0.0,
+        maximum: float = 1.0,
+        autoscale: bool = False,
+        stat: str | None = None,
+    ):
+        super().__init__(size, position, stat)
+        self.samples = RingBuffer(size[0])
+        self.minimum = minimum
+        self.maximum = maximum
+        self.autoscale = autoscale
+
+    def _bar_height(self, value: float, maximum: float) -> int:
+        span = maximum - self.minimum
+        if span <= 0:
+            return 0
+        fraction = min(max((value - self.minimum) / span, 0.0), 1.0)
+        return round(fraction * self.size[1])
+
+    def _draw_column(self, x: int, value: float, maximum: float):
+        height = self.size[1]
+        self.draw.line((x, 0, x, height - 1), fill=BACKGROUND)
+        bar = self._bar_height(value, maximum)
+        if bar:
+            self.draw.line((x, height - bar, x, height - 1), fill=INK)
+
+    def update(self, value: float) -> bool:
+        self.samples.append(value)
+        width = self.size[0]
+        maximum = self.maximum
+        if self.autoscale:
+            maximum = max(self.samples.max(), self.minimum)
+            if maximum != self.maximum:
+                # the scale's changed, so every column has to be drawn again
+                self.maximum = maximum
+                self.draw.rectangle((0, 0, *self.size), fill=BACKGROUND)
+                values = self.samples.values()
+                for x, sample in enumerate(values, start=width - len(values)):
+                    self._draw_column(x, sample, maximum)
+                return True
+        # scroll everything left a column, and draw the new one
+        self.image.paste(self.image.crop((1, 0, width, self.size[1])), (0, 0))
+        self._draw_column(width - 1, value, maximum)
+        return True
+
+
+class BarMeter(Widget):
+    """A horizontal bar, full at `maximum`."""
+
+    _length: int = 0
+
+    def __init__(
+        self,
+        size: tuple[int, int],
+        position: tuple[int, int] = (0, 0),
+        maximum: float = 1.0,
+        stat: str | None = None,
+    ):
+        super().__init__(size, position, stat)
+        self.maximum = maximum
+
+    # the area the bar fills, as (left, top, right, bottom)
+    def _track(self) -> tuple[int, int, int, int]:
+        return (0, 0, self.size[0], self.size[1])
+
+    def update(self, value: float) -> bool:
+        left, top, right, bottom = self._track()
+        fraction = min(max(value / self.maximum, 0.0), 1.0) if self.maximum else 0.0
+        length = round(fraction * (right - left))
+        if length == self._length:
+            return False
+        # only fill or clear the difference
+        start, end = sorted((self._length, length))
+        self.draw.rectangle(
+            (left + start, top, left + end - 1, bottom - 1),
+            fill=INK if length > self._length else BACKGROUND,
+        )
+        self._length = length
+        return True
+
+
+class ProgressBar(BarMeter):
+    """A bar meter from 0 to 1, with a frame round it."""
+
+    def __init__(
+        self,
+        size: tuple[int, int],
+        position: tuple[int, int] = (0, 0),
+        stat: str | None = None,
+    ):
+        super().__init__(size, position, 1.0, stat)
+        self.draw.rectangle((0, 0, size[0] - 1, size[1] - 1), outline=INK)
+
+    def _track(self) -> tuple[int, int, int, int]:
+        # inside the frame, with a pixel's gap
+        return (2, 2, self.size[0] - 2, self.size[1] - 2)
+
+
+class BigNumber(Widget):
+    """A value shown in the terminal font, scaled up `scale` times."""
+
+    font_name: str = "spleen-5x8"
+
+    _text: str | None = None
+
+    def __init__(
+        self,
+        size: tuple[int, int],
+        position: tuple[int, int] = (0, 0),
+        format: str = "{:.0f}",
+        scale: int = 3,
+        stat: str | None = None,
+    ):
+        super().__init__(size, position, stat)
+        self.format = format
+        self.scale = scale
+
+    def update(self, value: float) -> bool:
+        text = self.format.format(value)
+        if text == self._text:
+            return False
+        self._text = text
+        self.draw.rectangle((0, 0, *self.size), fill=BACKGROUND)
+        glyphs = load_font(self.font_name).render(text)
+        if glyphs:
+            glyphs = glyphs.resize(
+                (glyphs.width * self.scale, glyphs.height * self.scale),
+                Image.Resampling.NEAREST,
+            )
+            self.draw.bitmap((0, 0), glyphs, fill=INK)
+        return True
@@ -0,0 +1,161 @@
+"""
+Backlight effects, stepped once per LCD frame.
+
+The engine has a base colour (each profile can set its own, see
+`InputManager.backlight`; until one does, the backlight is left alone), which
+it fades to whenever it changes, and a stack
+of effects played over it: the newest unfinished effect wins. The output
+manager asks for the colour once per frame and only sends it to the device if
+it's changed, so an effect costs at most one control transfer per frame.
+
+Signals:
+
+    g13_backlight       (r, g, b), fade_ms=...    set the base colour
+    g13_lighting_effect effect                    play an effect over it
+"""
+
+import math
+import typing
+
+import blinker
+
+Colour = tuple[int, int, int]
+
+
+def mix(start: Colour, end: Colour, amount: float) -> Colour:
+    """Blend from `start` (0.0) to `end` (1.0)."""
+    amount = min(max(amount, 0.0), 1.0)
+    return typing.cast(
+        Colour, tuple(round(a + (b - a) * amount) for a, b in zip(start, end))
+    )
+
+
+def parse_colour(value) -> Colour:
+    """A colour from "#rrggbb" or [r, g, b]."""
+    if isinstance(value, str) and len(value) == 7 and value.startswith("#"):
+        try:
+            return typing.cast(
+                Colour, tuple(int(value[i : i + 2], 16) for i in (1, 3, 5))
+            )
+        except ValueError:
+            pass
+    elif (
+        isinstance(value, (list, tuple))
+        and len(value) == 3
+        and all(type(c) is int and 0 <= c <= 255 for c in value)
+    ):
+        return typing.cast(Colour, tuple(value))
+    raise ValueError(f"Invalid colour {value!r}")
+
+
+class Effect:
+    """Something played over the base colour, starting at `start`."""
+
+    start: float = 0.0
+
+    def colour(self, now: float, base: Colour) -> Colour:
+        raise NotImplementedError
+
+    def done(self, now: float) -> bool:
+        return False
+
+
+class Fade(Effect):
+    """Fade from one colour to another, then stay there until replaced."""
+
+    def __init__(self, start: Colour, end: Colour, duration_s: float):
+        self.from_colour = start
+        self.to_colour = end
+        self.duration = duration_s
+
+    def colour(self, now: float, base: Colour) -> Colour:
+        if self.duration <= 0:
+            return self.to_colour
+        return mix(self.from_colour, self.to_colour, (now - self.start) / self.duration)
+
+    def done(self, now: float) -> bool:
+        return now - self.start >= self.duration
+
+
+class Pulse(Effect):
+    """Pulse between the base colour and `colour`, `count` times (or forever)."""
+
+    def __init__(self, colour: Colour, period_s: float = 1.0, count: int | None = 1):
+        self.pulse_colour = colour
+        self.period = period_s
+        self.count = count
+
+    def colour(self, now: float, base: Colour) -> Colour:
+        phase = (now - self.start) / self.period
+        return mix(base, self.pulse_colour, (1 - math.cos(2 * math.pi * phase)) / 2)
+
+    def done(self, now: float) -> bool:
+        return self.count is not None and now - self.start >= self.period * self.count
+
+
+class Flash(Effect):
+    """Show a colour for a while."""
+
+    def __init__(self, colour: Colour, duration_s: float = 0.2):
+        self.flash_colour = colour
+        self.duration = duration_s
+
+    def colour(self, now: float, base: Colour) -> Colour:
+        return self.flash_colour
+
+    def done(self, now: float) -> bool:
+        return now - self.start >= self.duration
+
+
+class LightingEngine:
+    DEFAULT_FADE_MS = 300
+    # what effects are mixed with when there's no base colour
+    DEFAULT_COLOUR: Colour = (255, 255, 255)
+
+    base: Colour | None
+    effects: list[Effect]
+
+    _fade: Fade | None = None
+    _now: float = 0.0
+
+    def __init__(self, base: Colour | None = None):
+        self.base = base
+        self.effects = []
+        blinker.signal("g13_backlight").connect(self.set_base)
+        blinker.signal("g13_lighting_effect").connect(self.play)
+
+    def set_base(self, colour: Colour, fade_ms: float = DEFAULT_FADE_MS):
+        if colour == self.base and self._fade is None:
+            return
+        # fade from wherever the base colour is right now
+        current = self._base_colour(self._now)
+        self.base = typing.cast(Colour, tuple(colour))
+        if current is None:
+            return
+        self._fade = Fade(current, self.base, fade_ms / 1000.0)
+        self._fade.start = self._now
+
+    def play(self, effect: Effect):
+        effect.start = self._now
+        self.effects.append(effect)
+
+    def stop_effects(self):
+        self.effects.clear()
+
+    def _base_colour(self, now: float) -> Colour | None:
+        if self._fade is None:
+            return self.base
+        if self._fade.done(now):
+            self._fade = None
+            return self.base
+        return self._fade.colour(now, self.base)
+
+    def step(self, now: float) -> Colour | None:
+        """The backlight colour for the frame at `now`, if there is one."""
+        self._now = now
+        if self.effects:
+            self.effects = [effect for effect in self.effects if not effect.done(now)]
+        base = self._base_colour(now)
+        if self.effects:
+            return self.effects[-1].colour(now, base or self.DEFAULT_COLOUR)
+        return base
@@ -0,0 +1,169 @@
+"""
+Macro recording for the MR key.
+
+Pressing MR starts recording: every key the active profile sends to the OS is
+captured, along with the time between events. Pressing MR again stops the
+recording, and the next G key pressed has the macro bound to it. (Pressing MR
+instead of a G key throws the recording away.)
+
+A recorded macro is just a list of OutputExecutor steps, so playback goes
+through the same non-blocking, deadline-scheduled executor as any other macro.
+Macros are saved per profile in a small JSON file so they survive restarts.
+"""
+
+import json
+import time
+import typing
+from pathlib import Path
+
+import pynput
+from loguru import logger
+
+from g13lib.output_executor import DELAY, PRESS, RELEASE, Step
+
+# gaps shorter than this aren't worth a delay step
+MIN_DELAY_S = 0.0005
+
+
+class MacroRecorder:
+    """Captures output events and their timing, and tracks the MR key's mode.
+
+    The mode is one of "idle", "recording" or "binding" (recording finished,
+    waiting for a G key to bind it to).
+    """
+
+    mode: str = "idle"
+    steps: list[Step]
+
+    _last_event_at: float | None = None
+    _held: list
+
+    def __init__(self, clock: typing.Callable[[], float] = time.perf_counter):
+        self.clock = clock
+        self.steps = []
+        self._held = []
+
+    def start(self):
+        self.mode = "recording"
+        self.steps = []
+        self._held = []
+        self._last_event_at = None
+
+    def stop(self) -> list[Step]:
+        """Stop recording and wait for the macro to be bound."""
+        # don't leave anything held down when the macro plays back
+        for key in reversed(self._held):
+            self.steps.append((RELEASE, key))
+        self._held = []
+        self.mode = "binding" if self.steps else "idle"
+        return self.steps
+
+    def take(self) -> list[Step]:
+        """Return the finished recording and go back to idle."""
+        steps, self.steps = self.steps, []
+        self.mode = "idle"
+        return steps
+
+    def discard(self):
+        self.steps = []
+        self._held = []
+        self.mode = "idle"
+
+    def record(self, op: int, key):
+        """Record an output event. Called by the OutputExecutor."""
+        if self.mode != "recording":
+            return
+        now = self.clock()
+        if self._last_event_at is not None:
+            gap = now - self._last_event_at
+            if gap >= MIN_DELAY_S:
+                self.steps.append((DELAY, gap))
+        self._last_event_at = now
+        self.steps.append((op, key))
+        if op == PRESS:
+            self._held.append(key)
+        elif op == RELEASE and key in self._held:
+            self._held.remove(key)
+
+
+def encode_key(key) -> str:
+    if isinstance(key, pynput.keyboard.Key):
+        return f"Key.{key.name}"
+    return str(key)
+
+
+def decode_key(value: str):
+    if value.startswith("Key."):
+        return pynput.keyboard.Key[value.removeprefix("Key.")]
+    return value
+
+
+def encode_steps(steps: list[Step]) -> list:
+    """Convert steps into a compact JSON-able form. Delays are in ms."""
+    encoded = []
+    for op, arg in steps:
+        if op == DELAY:
+            encoded.append(round(arg * 1000.0, 3))
+        elif op == PRESS:
+            encoded.append("+" + encode_key(arg))
+        elif op == RELEASE:
+            encoded.append("-" + encode_key(arg))
+    return encoded
+
+
+def decode_steps(encoded: list) -> list[Step]:
+    steps: list[Step] = []
+    for item in encoded:
+        if isinstance(item, (int, float)):
+            steps.append((DELAY, item / 1000.0))
+        elif item.startswith("+"):
+            steps.append((PRESS, decode_key(item[1:])))
+        elif item.startswith("-"):
+            steps.append((RELEASE, decode_key(item[1:])))
+        else:
+            raise ValueError(f"Invalid macro step: {item!r}")
+    return steps
+
+
+class MacroStore:
+    """Recorded macros for every profile, saved as JSON."""
+
+    path: Path
+
+    def __init__(self, path: Path):
+        self.path = path
+
+    def _read(self) -> dict:
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.error("Couldn't read macros from {}: {}", self.path, e)
+            return {}
+
+    def load(self, profile: str) -> dict[str, list[Step]]:
+        """Load the macros bound for a profile, keyed by G key."""
+        macros = {}
+        for key_code, encoded in self._read().get(profile, {}).items():
+            try:
+                macros[key_code] = decode_steps(encoded)
+            except (KeyError, ValueError) as e:
+                logger.error("Skipping bad macro {} for {}: {}", key_code, profile, e)
+        return macros
+
+    def save(self, profile: str, macros: dict[str, list[Step]]):
+        data = self._read()
+        data[profile] = {
+            key_code: encode_steps(steps) for key_code, steps in macros.items()
+        }
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "w") as f:
+                json.dump(data, f, indent=1)
+        except OSError as e:
+            logger.error("Couldn't save macros to {}: {}", self.path, e)
+
+
+default_store = MacroStore(Path.home() / ".config" / "g13slop" / "macros.json")
@@ -0,0 +1,198 @@
+"""
+Runtime metrics: counters, gauges and timing histograms.
+
+Hot paths get their metrics from the default registry once, at import time:
+
+    FRAMES_SENT = metrics.counter("lcd.frames_sent")
+    ...
+    FRAMES_SENT.inc()
+
+so recording is just a locked attribute update (the USB thread records some
+metrics too, and without the GIL an unlocked `+=` can lose counts).
+`snapshot()` collects everything
+into a plain dict, which `MetricsExporter` can write out periodically and the
+performance HUD (`g13lib.lcd.hud`) shows on the LCD.
+"""
+
+import array
+import contextlib
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+import typing
+from pathlib import Path
+
+from loguru import logger
+
+from g13lib.async_help import PeriodicComponent
+
+
+class Counter:
+    """A count that only goes up."""
+
+    value: int = 0
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+
+    def inc(self, amount: int = 1):
+        with self._lock:
+            self.value += amount
+
+    def snapshot(self) -> int:
+        return self.value
+
+
+class Gauge:
+    """A value that's set, or read from a function when it's needed."""
+
+    value: float = 0
+
+    def __init__(self, name: str, source: typing.Callable[[], float] | None = None):
+        self.name = name
+        self.source = source
+
+    def set(self, value: float):
+        self.value = value
+
+    def snapshot(self) -> float:
+        if self.source is not None:
+            return self.source()
+        return self.value
+
+
+class Histogram:
+    """Timings, in seconds: totals, and the most recent samples for percentiles."""
+
+    SAMPLES = 256
+
+    count: int = 0
+    total: float = 0.0
+    max: float = 0.0
+
+    def __init__(self, name: str):
+        self.name = name
+        self._samples = array.array("d", bytes(8 * self.SAMPLES))
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        with self._lock:
+            self._samples[self.count % self.SAMPLES] = value
+            self.count += 1
+            self.total += value
+            if value > self.max:
+                self.max = value
+
+    @contextlib.contextmanager
+    def time(self):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started)
+
+    def percentile(self, fraction: float) -> float:
+        with self._lock:
+            samples = self._samples[: min(self.count, self.SAMPLES)]
+        samples = sorted(samples)
+        if not samples:
+            return 0.0
+        return samples[min(int(fraction * len(samples)), len(samples) - 1)]
+
+    def snapshot(self) -> dict[str, float]:
+        return {
+            "count": self.count,
+            "mean_ms": self.total / self.count * 1000 if self.count else 0.0,
+            "p50_ms": self.percentile(0.5) * 1000,
+            "p99_ms": self.percentile(0.99) * 1000,
+            "max_ms": self.max * 1000,
+        }
+
+
+class Registry:
+    metrics: dict[str, Counter | Gauge | Histogram]
+
+    def __init__(self):
+        self.metrics = {}
+
+    def _get(self, kind: type, name: str, *args):
+        metric = self.metrics.get(name)
+        if metric is None:
+            metric = self.metrics[name] = kind(name, *args)
+        elif type(metric) is not kind:
+            raise TypeError(f"Metric {name} is a {type(metric).__name__}")
+        return metric
+
+    def counter(self, name: str) -> Counter:
+        return self._get(Counter, name)
+
+    def gauge(
+        self, name: str, source: typing.Callable[[], float] | None = None
+    ) -> Gauge:
+        gauge = self._get(Gauge, name)
+        if source is not None:
+            gauge.source = source
+        return gauge
+
+    def histogram(self, name: str) -> Histogram:
+        return self._get(Histogram, name)
+
+    def snapshot(self) -> dict:
+        values = {}
+        for name, metric in self.metrics.items():
+            try:
+                values[name] = metric.snapshot()
+            except Exception as e:
+                logger.debug("Couldn't read metric {}: {}", name, e)
+        return values
+
+
+default_registry = Registry()
+
+counter = default_registry.counter
+gauge = default_registry.gauge
+histogram = default_registry.histogram
+snapshot = default_registry.snapshot
+
+
+class MetricsExporter(PeriodicComponent):
+    """Writes a snapshot of the metrics every so often.
+
+    `target` is a file path (replaced atomically with each snapshot), or
+    "unix:/path" to send each snapshot as a datagram to a Unix socket.
+    """
+
+    INTERVAL_MS = 1000
+
+    def __init__(
+        self,
+        target: str,
+        registry: Registry = default_registry,
+        interval_ms: float = INTERVAL_MS,
+    ):
+        self.target = target
+        self.registry = registry
+        self.sock = None
+        if target.startswith("unix:"):
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            self.sock.setblocking(False)
+        self.schedule(self.export, interval_ms)
+
+    def export(self):
+        data = json.dumps({"time": time.time(), "metrics": self.registry.snapshot()})
+        try:
+            if self.sock is not None:
+                self.sock.sendto(data.encode(), self.target.removeprefix("unix:"))
+            else:
+                path = Path(self.target)
+                with tempfile.NamedTemporaryFile(
+                    "w", dir=path.parent, delete=False
+                ) as f:
+                    f.write(data)
+                os.replace(f.name, path)
+        except OSError as e:
+            logger.debug("Couldn't export metrics to {}: {}", self.target, e)
@@ -6,7 +6,7 @@ from AppKit import NSWorkspace
 from loguru import logger
 from PIL import Image
 
-from g13lib.async_help import PeriodicComponent, run_periodic
+from g13lib.async_help import PeriodicComponent
 
 
 def trim_image(image: Image.Image) -> Image.Image:
@@ -28,7 +28,7 @@ class AppMonitor(PeriodicComponent):
 
     def __init__(self):
         self.current_app = self.detect_current_application()
-        self._tasks_to_start = [run_periodic(self.notify, 100, initial_delay_ms=100)]
+        self.schedule(self.notify, 100, initial_delay_ms=100)
 
     def detect_current_application(self) -> str:
         active_app = NSWorkspace.sharedWorkspace().activeApplication()
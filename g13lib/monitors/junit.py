@@ -0,0 +1,232 @@
+"""
+Watches junit XML result files and reports their test summaries.
+
+On Linux the watcher uses inotify, so a result file is read within
+milliseconds of the test runner closing it. Elsewhere (or if inotify isn't
+available) it falls back to polling the files' size and mtime.
+
+Result files can be huge, so only as much of a file is parsed as it takes to
+find the summary on the `<testsuite>` tag, which comes before any test cases.
+A file that's caught half-written is tried again on its next change (or poll).
+"""
+
+import asyncio
+import ctypes
+import ctypes.util
+import os
+import struct
+import sys
+import typing
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+from loguru import logger
+
+from g13lib.async_help import PeriodicComponent, Timer
+
+
+class ResultSummary(typing.NamedTuple):
+    tests: int
+    failures: int
+    errors: int
+    skipped: int
+
+
+def read_summary(path: Path) -> ResultSummary | None:
+    """The summary from a junit file, or None if it can't be found (yet)."""
+    suite = None
+    try:
+        with open(path, "rb") as f:
+            for _, element in ET.iterparse(f, events=("start",)):
+                if element.tag == "testsuite":
+                    if suite is None or element.attrib.get("name") == "pytest":
+                        suite = dict(element.attrib)
+                    if suite.get("name") == "pytest":
+                        break
+                elif element.tag == "testcase":
+                    # the summary comes before the test cases
+                    break
+    except (OSError, ET.ParseError):
+        # missing, or still being written
+        return None
+    if suite is None:
+        return None
+    try:
+        return ResultSummary(
+            *(int(suite.get(field, "0")) for field in ResultSummary._fields)
+        )
+    except ValueError:
+        return None
+
+
+# from <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+
+_EVENT = struct.Struct("iIII")
+
+
+class Inotify:
+    """Just enough of inotify to watch directories for finished files."""
+
+    fd: int
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = (ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32)
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+    def add_watch(self, directory: Path) -> int:
+        wd = self._add_watch(
+            self.fd, os.fsencode(directory), IN_CLOSE_WRITE | IN_MOVED_TO
+        )
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno), str(directory))
+        return wd
+
+    def read_events(self) -> list[tuple[int, int, str]]:
+        """(watch descriptor, mask, file name) for each waiting event."""
+        events = []
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return events
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = _EVENT.unpack_from(data, offset)
+                offset += _EVENT.size
+                name = data[offset : offset + length].rstrip(b"\0")
+                offset += length
+                events.append((wd, mask, os.fsdecode(name)))
+
+    def close(self):
+        os.close(self.fd)
+
+
+class JunitWatcher(PeriodicComponent):
+    """Calls `callback(path, summary)` whenever a watched result file changes.
+
+    `paths` can be result files, or directories of `*.xml` result files. The
+    watcher only runs between `resume` and `suspend`; on resume it checks
+    every file, in case anything changed while it wasn't looking.
+    """
+
+    POLL_INTERVAL_MS = 250
+
+    paths: list[Path]
+    callback: typing.Callable[[Path, ResultSummary], typing.Any]
+    use_inotify: bool
+    active: bool = False
+
+    # (mtime, size) of each file when it was last reported
+    _seen: dict[Path, tuple[int, int]]
+    _inotify: Inotify | None = None
+    _watch_dirs: dict[int, Path]
+    _timer: Timer
+
+    def __init__(
+        self,
+        paths: list[Path],
+        callback: typing.Callable[[Path, ResultSummary], typing.Any],
+        use_inotify: bool | None = None,
+    ):
+        self.paths = paths
+        self.callback = callback
+        self.use_inotify = (
+            sys.platform.startswith("linux") if use_inotify is None else use_inotify
+        )
+        self._seen = {}
+        self._watch_dirs = {}
+        self._timer = self.schedule(self.poll, self.POLL_INTERVAL_MS, suspended=True)
+
+    def resume(self):
+        if self.active:
+            return
+        self.active = True
+        if not (self.use_inotify and self._start_inotify()):
+            self._timer.resume()
+        self.poll()
+
+    def suspend(self):
+        self.active = False
+        self._timer.suspend()
+        self._stop_inotify()
+
+    def _start_inotify(self) -> bool:
+        try:
+            inotify = Inotify()
+        except (OSError, AttributeError) as e:
+            logger.warning("inotify unavailable, polling for test results: {}", e)
+            return False
+        try:
+            for directory in {self._directory(path) for path in self.paths}:
+                self._watch_dirs[inotify.add_watch(directory)] = directory
+        except OSError as e:
+            logger.warning("Can't watch {}, polling for test results", e.filename)
+            inotify.close()
+            self._watch_dirs = {}
+            return False
+        asyncio.get_running_loop().add_reader(inotify.fd, self._inotify_ready)
+        self._inotify = inotify
+        return True
+
+    def _stop_inotify(self):
+        if self._inotify is None:
+            return
+        asyncio.get_running_loop().remove_reader(self._inotify.fd)
+        self._inotify.close()
+        self._inotify = None
+        self._watch_dirs = {}
+
+    @staticmethod
+    def _directory(path: Path) -> Path:
+        return path if path.is_dir() else path.parent
+
+    def _watches(self, path: Path) -> bool:
+        return path in self.paths or (
+            path.suffix == ".xml" and path.parent in self.paths
+        )
+
+    def _inotify_ready(self):
+        for wd, mask, name in self._inotify.read_events():
+            if mask & IN_Q_OVERFLOW:
+                self.poll()
+                continue
+            directory = self._watch_dirs.get(wd)
+            if directory is not None and self._watches(directory / name):
+                self.check(directory / name)
+
+    def result_files(self) -> typing.Iterator[Path]:
+        for path in self.paths:
+            if path.is_dir():
+                yield from path.glob("*.xml")
+            else:
+                yield path
+
+    def poll(self):
+        for path in self.result_files():
+            self.check(path)
+
+    def check(self, path: Path):
+        """Report the file's summary if it's changed since it was last reported."""
+        try:
+            stat = path.stat()
+        except OSError:
+            return
+        version = (stat.st_mtime_ns, stat.st_size)
+        if self._seen.get(path) == version:
+            return
+        summary = read_summary(path)
+        if summary is None:
+            # probably half-written; look again when it next changes
+            return
+        self._seen[path] = version
+        self.callback(path, summary)
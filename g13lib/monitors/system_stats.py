@@ -0,0 +1,124 @@
+"""
+CPU, memory and network use, read from Linux's /proc for the LCD widgets.
+
+The /proc files are opened once and read again from the start with `pread`,
+so a sample is three system calls and a little parsing, cheap enough to
+sample at the LCD's frame rate. Each sample is sent as `g13_stats`:
+
+    cpu       fraction of CPU time busy since the last sample, 0 to 1
+    memory    fraction of memory in use, 0 to 1
+    net_rx    bytes received per second, all interfaces but loopback
+    net_tx    bytes sent per second
+
+Where there's no /proc (macOS), nothing is sampled.
+"""
+
+import os
+import time
+
+import blinker
+from loguru import logger
+
+from g13lib.async_help import PeriodicComponent
+
+PROC_STAT = "/proc/stat"
+PROC_MEMINFO = "/proc/meminfo"
+PROC_NET_DEV = "/proc/net/dev"
+
+# more than any of the files above is likely to be, short of hundreds of CPUs
+READ_SIZE = 1 << 14
+
+
+def parse_cpu(data: bytes) -> tuple[int, int]:
+    """Total and idle jiffies, from /proc/stat."""
+    fields = [int(field) for field in data[: data.index(b"\n")].split()[1:]]
+    # idle and iowait
+    return sum(fields), fields[3] + fields[4]
+
+
+def parse_memory(data: bytes) -> float:
+    """Fraction of memory in use, from /proc/meminfo."""
+    values = {}
+    for line in data.splitlines():
+        name, _, rest = line.partition(b":")
+        if name in (b"MemTotal", b"MemAvailable"):
+            values[name] = int(rest.split()[0])
+    total = values.get(b"MemTotal")
+    if not total:
+        return 0.0
+    return 1 - values.get(b"MemAvailable", total) / total
+
+
+def parse_network(data: bytes) -> tuple[int, int]:
+    """Bytes received and sent over every interface but loopback, from /proc/net/dev."""
+    received = sent = 0
+    # two lines of headings
+    for line in data.splitlines()[2:]:
+        interface, _, counters = line.partition(b":")
+        if interface.strip() == b"lo":
+            continue
+        fields = counters.split()
+        received += int(fields[0])
+        sent += int(fields[8])
+    return received, sent
+
+
+class SystemStats(PeriodicComponent):
+    """Samples /proc every `interval_ms` and sends `g13_stats`."""
+
+    _cpu: tuple[int, int] | None = None
+    _network: tuple[int, int] | None = None
+    _sampled_at: float | None = None
+
+    def __init__(self, interval_ms: float = 500):
+        self.files = {}
+        for path in (PROC_STAT, PROC_MEMINFO, PROC_NET_DEV):
+            try:
+                self.files[path] = os.open(path, os.O_RDONLY)
+            except OSError:
+                self.close()
+                logger.debug("No {}, so no system stats", path)
+                return
+        self.schedule(self.sample, interval_ms)
+
+    def _read(self, path: str) -> bytes:
+        return os.pread(self.files[path], READ_SIZE, 0)
+
+    def read(self) -> dict[str, float]:
+        """Take a sample. Rates are zero for the first one."""
+        now = time.monotonic()
+        cpu = parse_cpu(self._read(PROC_STAT))
+        network = parse_network(self._read(PROC_NET_DEV))
+        stats = {
+            "cpu": 0.0,
+            "memory": parse_memory(self._read(PROC_MEMINFO)),
+            "net_rx": 0.0,
+            "net_tx": 0.0,
+        }
+        if self._cpu is not None:
+            total = cpu[0] - self._cpu[0]
+            idle = cpu[1] - self._cpu[1]
+            stats["cpu"] = 1 - idle / total if total > 0 else 0.0
+        if self._network is not None and now > self._sampled_at:
+            elapsed = now - self._sampled_at
+            # counters go backwards when an interface goes away
+            stats["net_rx"] = max(network[0] - self._network[0], 0) / elapsed
+            stats["net_tx"] = max(network[1] - self._network[1], 0) / elapsed
+        self._cpu, self._network, self._sampled_at = cpu, network, now
+        return stats
+
+    def sample(self):
+        signal = blinker.signal("g13_stats")
+        # nobody's showing them, so don't bother
+        if not signal.receivers:
+            return
+        signal.send(self.read())
+
+    def close(self):
+        for fd in self.files.values():
+            os.close(fd)
+        self.files = {}
+
+    async def stop_tasks(self):
+        await super().stop_tasks()
+        self.close()
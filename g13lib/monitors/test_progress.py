@@ -0,0 +1,157 @@
+"""
+Shows live progress from a running pytest session on the G13.
+
+Receives the updates sent by the `g13lib.pytest_progress` plugin and shows a
+running pass/fail count on the terminal's status line, printing the name of
+each failing test as soon as it's known. Updates are only kept as they arrive;
+the terminal is redrawn at most every `REFRESH_MS`, however fast the tests are.
+Messages that aren't shaped like an update are logged and dropped.
+"""
+
+import asyncio
+import contextlib
+import json
+import os
+import socket
+
+import blinker
+from loguru import logger
+
+from g13lib.async_help import PeriodicComponent, Timer
+from g13lib.pytest_progress import SOCKET_PATH
+
+# the type of each field of an update
+PROGRESS_FIELDS = {
+    "run": str,
+    "total": int,
+    "finished": int,
+    "passed": int,
+    "failed": int,
+    "skipped": int,
+    "first_failure": (str, type(None)),
+    "results": list,
+    "done": bool,
+}
+
+
+def parse_progress(data: bytes) -> dict | None:
+    """The update in a message, or None if it isn't one."""
+    try:
+        progress = json.loads(data)
+    except ValueError:
+        return None
+    if not isinstance(progress, dict):
+        return None
+    for field, kind in PROGRESS_FIELDS.items():
+        if not isinstance(progress.get(field), kind):
+            return None
+    for result in progress["results"]:
+        if not (
+            isinstance(result, list)
+            and len(result) == 2
+            and all(isinstance(part, str) for part in result)
+        ):
+            return None
+    return progress
+
+
+def status_text(progress: dict) -> str:
+    counts = f"{progress['passed']} ok {progress['failed']} fail"
+    if progress["done"]:
+        return f"Done: {counts}"
+    return f"{counts} {progress['finished']}/{progress['total']}"
+
+
+def short_test_name(nodeid: str) -> str:
+    return nodeid.rpartition("::")[2] or nodeid
+
+
+class ProgressServer(PeriodicComponent):
+    """Listens for progress updates, and shows them while resumed."""
+
+    REFRESH_MS = 100
+
+    path: str
+    progress: dict | None = None
+    active: bool = False
+
+    _shown: dict | None = None
+    # failures not yet printed, and those that have been, in this run
+    _failures: list[str]
+    _reported: set[str]
+    _timer: Timer
+
+    def __init__(self, path: str = SOCKET_PATH):
+        self.path = path
+        self._failures = []
+        self._reported = set()
+        # a socket left over from a previous run would stop us binding
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(path)
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.sock.bind(path)
+        self.sock.setblocking(False)
+        self._timer = self.schedule(self.refresh, self.REFRESH_MS, suspended=True)
+
+    def resume(self):
+        if self.active:
+            return
+        self.active = True
+        asyncio.get_running_loop().add_reader(self.sock.fileno(), self.receive)
+        self.receive()
+        self._shown = None
+        self._timer.resume()
+
+    def suspend(self):
+        if not self.active:
+            return
+        self.active = False
+        asyncio.get_running_loop().remove_reader(self.sock.fileno())
+        self._timer.suspend()
+
+    def receive(self):
+        """Take in every waiting update, keeping only the latest counts, and
+        every failure."""
+        while True:
+            try:
+                data = self.sock.recv(65536)
+            except BlockingIOError:
+                return
+            progress = parse_progress(data)
+            if progress is None:
+                logger.warning("Bad test progress message: {!r}", data[:100])
+                continue
+            if self.progress is None or progress["run"] != self.progress["run"]:
+                self._failures = []
+                self._reported = set()
+            self._failures.extend(
+                nodeid for nodeid, outcome in progress["results"] if outcome == "failed"
+            )
+            self.progress = progress
+
+    def refresh(self):
+        progress = self.progress
+        if progress is None or progress == self._shown:
+            return
+        self._shown = progress
+        # the first failure is in every update, in case its result was dropped
+        failures = self._failures
+        if progress["first_failure"]:
+            failures.insert(0, progress["first_failure"])
+        self._failures = []
+        for failure in failures:
+            if failure not in self._reported:
+                self._reported.add(failure)
+                blinker.signal("g13_print").send(f"FAIL {short_test_name(failure)}")
+        blinker.signal("g13_set_status").send(status_text(progress))
+
+    def close(self):
+        if self.active:
+            self.suspend()
+        self.sock.close()
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(self.path)
+
+    async def stop_tasks(self):
+        await super().stop_tasks()
+        self.close()
@@ -0,0 +1,198 @@
+"""
+Keyboard output executor.
+
+Macros (sequences of keys, chords and delays) are played back as cancellable
+asyncio tasks rather than with blocking sleeps inside a signal handler, so the
+event loop keeps refreshing the LCD and handling other keys while a macro is
+waiting between steps.
+
+Each InputManager owns one executor, which gives per-profile ordering: output
+submitted while a macro is playing is queued behind it. Starting a new macro
+cancels the one that's playing (and any macros still waiting), releasing any
+keys the cancelled macro was holding down.
+
+Delays are scheduled against absolute deadlines from the loop's monotonic
+clock, so the timing error of one step doesn't accumulate into the next: a
+step that lands late shortens the sleep before the one after it.
+"""
+
+import asyncio
+import collections
+import typing
+
+from loguru import logger
+
+# step opcodes
+PRESS = 0
+RELEASE = 1
+DELAY = 2
+CALL = 3
+
+Step = tuple[int, typing.Any]
+
+
+class KeyboardLike(typing.Protocol):
+    def press(self, key) -> None: ...
+
+    def release(self, key) -> None: ...
+
+
+class OutputObserver(typing.Protocol):
+    def record(self, op: int, key) -> None: ...
+
+
+def compile_macro(output, call: typing.Callable | None = None) -> list[Step]:
+    """Flatten a macro description into a list of executor steps.
+
+    output: the macro to compile. Supports:
+        - str or Key: tap the key (press then release)
+        - tuple: chord (hold all, release in reverse)
+        - list: sequence of any of these, played in order
+        - int: delay in milliseconds
+        - Callable: called (via `call`, if given) when the step is reached
+    """
+    steps: list[Step] = []
+    if type(output) is list:
+        for item in output:
+            steps.extend(compile_macro(item, call))
+    elif type(output) is tuple:
+        steps.extend((PRESS, key) for key in output)
+        steps.extend((RELEASE, key) for key in reversed(output))
+    elif type(output) is int:
+        steps.append((DELAY, output / 1000.0))
+    elif callable(output):
+        if call is not None:
+            steps.append((CALL, lambda: call(output)))
+        else:
+            steps.append((CALL, output))
+    else:
+        steps.append((PRESS, output))
+        steps.append((RELEASE, output))
+    return steps
+
+
+class OutputExecutor:
+    """Plays keyboard output in order without ever blocking the event loop."""
+
+    keyboard: KeyboardLike
+    # sees every key press and release as it's sent, e.g. a MacroRecorder
+    observer: OutputObserver | None = None
+
+    _pending: collections.deque[tuple[list[Step], bool]]
+    _current: asyncio.Task | None = None
+    _current_cancellable: bool = False
+    _worker: asyncio.Task | None = None
+
+    def __init__(self, keyboard: KeyboardLike):
+        self.keyboard = keyboard
+        self._pending = collections.deque()
+
+    @property
+    def busy(self) -> bool:
+        """True while output is playing or waiting to be played."""
+        return self._worker is not None and not self._worker.done()
+
+    def press(self, key):
+        """Press a key now, or after any output already queued."""
+        if self.busy:
+            self._enqueue([(PRESS, key)], cancellable=False)
+        else:
+            self._press(key)
+
+    def release(self, key):
+        """Release a key now, or after any output already queued."""
+        if self.busy:
+            self._enqueue([(RELEASE, key)], cancellable=False)
+        else:
+            self._release(key)
+
+    def chord(self, keys: tuple):
+        """Hold each key in turn, then release them in reverse order."""
+        if self.busy:
+            self._enqueue(compile_macro(keys), cancellable=False)
+        else:
+            for key in keys:
+                self._press(key)
+            for key in reversed(keys):
+                self._release(key)
+
+    def submit(self, steps: list[Step]):
+        """Start playing a compiled macro, cancelling any macro already playing."""
+        self.cancel()
+        self._enqueue(steps, cancellable=True)
+
+    def cancel(self):
+        """Cancel the playing macro and any queued macros.
+
+        Queued single key presses and releases are kept, so keys held on the
+        G13 still get released on the OS side.
+        """
+        self._pending = collections.deque(
+            item for item in self._pending if not item[1]
+        )
+        if self._current is not None and self._current_cancellable:
+            self._current.cancel()
+
+    async def join(self):
+        """Wait until all queued output has been played."""
+        while self.busy:
+            assert self._worker is not None
+            await asyncio.wait((self._worker,))
+
+    def _press(self, key):
+        self.keyboard.press(key)
+        if self.observer is not None:
+            self.observer.record(PRESS, key)
+
+    def _release(self, key):
+        self.keyboard.release(key)
+        if self.observer is not None:
+            self.observer.record(RELEASE, key)
+
+    def _enqueue(self, steps: list[Step], cancellable: bool):
+        self._pending.append((steps, cancellable))
+        if not self.busy:
+            self._worker = asyncio.get_running_loop().create_task(self._drain())
+
+    async def _drain(self):
+        """Play queued output one item at a time, in submission order."""
+        while self._pending:
+            steps, self._current_cancellable = self._pending.popleft()
+            current = asyncio.create_task(self._play(steps))
+            self._current = current
+            try:
+                # asyncio.wait doesn't raise if the macro itself was cancelled
+                await asyncio.wait((current,))
+            except asyncio.CancelledError:
+                current.cancel()
+                raise
+            finally:
+                self._current = None
+            if not current.cancelled() and current.exception():
+                logger.error("Error playing output: {}", current.exception())
+
+    async def _play(self, steps: list[Step]):
+        loop = asyncio.get_running_loop()
+        held = []
+        due = loop.time()
+        try:
+            for op, arg in steps:
+                if op == PRESS:
+                    self._press(arg)
+                    held.append(arg)
+                elif op == RELEASE:
+                    self._release(arg)
+                    if arg in held:
+                        held.remove(arg)
+                elif op == DELAY:
+                    # deadlines are absolute, so sleep overshoot doesn't accumulate
+                    due += arg
+                    delay = due - loop.time()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                elif op == CALL:
+                    arg()
+        except asyncio.CancelledError:
+            for key in reversed(held):
+                self._release(key)
+            raise
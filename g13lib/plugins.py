@@ -0,0 +1,116 @@
+"""
+App managers as lazily loaded plugins.
+
+App managers are listed by app name as "module:Class" specs, either in
+`DEFAULT_APPS` or from packages that register them under the `g13slop.apps`
+entry point group:
+
+    [project.entry-points."g13slop.apps"]
+    "Final Cut Pro" = "mypackage.fcp:FinalCutInputManager"
+
+Nothing is imported until the app is first focused, so the daemon doesn't pay
+for every app's imports and assets at startup.
+"""
+
+import importlib
+import importlib.metadata
+import time
+
+import blinker
+from loguru import logger
+
+from g13lib.single_app_manager import SingleAppManager
+from g13lib.watchdog import watched
+
+ENTRY_POINT_GROUP = "g13slop.apps"
+
+DEFAULT_APPS = {
+    "DaVinci Resolve": "g13lib.apps.davinci_resolve:DavinciInputManager",
+    "Code": "g13lib.apps.vscode:VSCodeInputManager",
+}
+
+
+def discover_plugins(config: dict[str, str] | None = None) -> dict[str, str]:
+    """Collect plugin specs by app name, from the config and entry points."""
+    specs = dict(DEFAULT_APPS if config is None else config)
+    for entry_point in importlib.metadata.entry_points(group=ENTRY_POINT_GROUP):
+        specs.setdefault(entry_point.name, entry_point.value)
+    return specs
+
+
+def load_class(spec: str) -> type:
+    module_name, _, class_name = spec.partition(":")
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+class PluginRegistry:
+    """Keeps track of app managers, loading each when its app is first focused.
+
+    This is the only receiver of `app_changed`: switching apps is a lookup by
+    name, deactivating the previous manager and activating the new one. Each
+    manager keeps its compositor and state between activations.
+    """
+
+    specs: dict[str, str]
+    managers: dict[str, SingleAppManager]
+    # the focused app, and its manager if it has one
+    current_app: str | None = None
+    active: SingleAppManager | None = None
+
+    def __init__(self, specs: dict[str, str]):
+        self.specs = specs
+        self.managers = {}
+        blinker.signal("app_changed").connect(self.app_changed)
+
+    def get(self, app_name: str) -> SingleAppManager | None:
+        """The manager for an app, loading it if needed."""
+        manager = self.managers.get(app_name)
+        if manager is None and app_name in self.specs:
+            manager = self.load(app_name)
+        return manager
+
+    def load(self, app_name: str) -> SingleAppManager:
+        started = time.perf_counter()
+        manager = load_class(self.specs[app_name])()
+        self.managers[app_name] = manager
+        logger.info(
+            "Loaded plugin for {} in {:.1f} ms",
+            app_name,
+            (time.perf_counter() - started) * 1000,
+        )
+        return manager
+
+    def add(self, manager: SingleAppManager):
+        self.managers[manager.app_name] = manager
+        # it's for the app that's already focused
+        if manager.app_name == self.current_app:
+            self.switch_to(manager)
+
+    def remove(self, app_name: str):
+        manager = self.managers.pop(app_name, None)
+        if manager is not None and manager is self.active:
+            self.switch_to(None)
+
+    def switch_to(self, manager: SingleAppManager | None):
+        """Hand the G13 to another manager, or back to the general one if None."""
+        previous, self.active = self.active, manager
+        if previous is manager:
+            return
+        if previous is not None and previous.active:
+            # going straight to another app doesn't need the general manager
+            previous.deactivate(release_focus=manager is None)
+        if manager is not None:
+            manager.activate()
+
+    @watched("app_changed")
+    def app_changed(self, app_name: str):
+        self.current_app = app_name
+        manager = self.managers.get(app_name)
+        if manager is None and app_name in self.specs:
+            try:
+                manager = self.load(app_name)
+            except Exception as e:
+                logger.error("Couldn't load plugin for {}: {}", app_name, e)
+                # don't try again
+                del self.specs[app_name]
+        self.switch_to(manager)
@@ -0,0 +1,270 @@
+"""
+Profiles loaded from TOML files, reloaded whenever the files change.
+
+Each `*.toml` file in the profiles directory describes the key mapping for one
+application:
+
+    app = "Preview"
+    backlight = "#ff8000"               # optional backlight colour for the app
+
+    [keys]
+    G1 = "cmd+z"                        # a chord
+    G10 = "left"                        # a single key (pynput Key name or character)
+    G4 = ["cmd+a", 50, "cmd+c"]         # a macro: keys, chords and delays in ms
+    L1 = { call = "run_all_tests" }     # a method on the app's Python profile
+    L2 = { call = "mymodule:handler" }  # or any function(manager, action, key_code)
+    "G1+G2" = "cmd+s"                   # G1 and G2 pressed together
+    "G5:hold" = "cmd+w"                 # G5 held down (also :tap and :double_tap)
+
+    [banks.M2]                          # bindings that change when M2 is selected
+    G1 = "cmd+shift+z"
+
+If a Python profile already exists for the app (e.g. "Code"), the file's keys
+are laid over its `direct_mapping`. Otherwise a new profile is created for the
+app. Files are parsed and compiled off the event loop, and the new dispatch
+table is swapped in between key events, so a reload never drops input. A file
+that fails to load leaves the previous mapping in place.
+"""
+
+import asyncio
+import importlib
+import tomllib
+from pathlib import Path
+
+import blinker
+import pynput
+from loguru import logger
+
+from g13lib.async_help import PeriodicComponent
+from g13lib.dispatch import MappingError
+from g13lib.input_manager import InputManager
+from g13lib.lighting import Colour, parse_colour
+from g13lib.plugins import PluginRegistry
+from g13lib.single_app_manager import SingleAppManager
+
+PROFILES_DIR = Path("profiles")
+
+
+class ProfileError(ValueError):
+    pass
+
+
+def parse_key(name: str):
+    """Turn a key name from a profile into something the keyboard can press."""
+    if len(name) == 1:
+        return name
+    if name == "plus":
+        return "+"
+    try:
+        return pynput.keyboard.Key[name.removeprefix("Key.")]
+    except KeyError:
+        raise ProfileError(f"Unknown key name {name!r}")
+
+
+def parse_keys(value: str):
+    """Parse "a", "space" or a chord like "cmd+shift+z"."""
+    if len(value) > 1 and "+" in value:
+        return tuple(parse_key(part) for part in value.split("+"))
+    return parse_key(value)
+
+
+def resolve_callback(spec: str, manager_class: type):
+    """Find a callback by method name on the profile class, or as module:function."""
+    if ":" in spec:
+        module_name, _, attr = spec.partition(":")
+        try:
+            callback = getattr(importlib.import_module(module_name), attr)
+        except (ImportError, AttributeError) as e:
+            raise ProfileError(f"Can't load callback {spec!r}: {e}")
+    else:
+        callback = getattr(manager_class, spec, None)
+    if not callable(callback):
+        raise ProfileError(f"Callback {spec!r} not found on {manager_class.__name__}")
+    return callback
+
+
+def parse_binding(value, manager_class: type):
+    if isinstance(value, str):
+        return parse_keys(value)
+    elif isinstance(value, list):
+        macro = []
+        for item in value:
+            if isinstance(item, int) and not isinstance(item, bool):
+                macro.append(item)
+            elif isinstance(item, str):
+                macro.append(parse_keys(item))
+            else:
+                raise ProfileError(f"Invalid macro step {item!r}")
+        return macro
+    elif isinstance(value, dict) and set(value) == {"call"}:
+        return resolve_callback(value["call"], manager_class)
+    raise ProfileError(f"Invalid binding {value!r}")
+
+
+def read_profile(path: Path) -> tuple[str, dict, dict, Colour | None]:
+    """Read a profile file, returning the app name, its raw key bindings, banks
+    and backlight colour."""
+    with open(path, "rb") as f:
+        try:
+            data = tomllib.load(f)
+        except tomllib.TOMLDecodeError as e:
+            raise ProfileError(str(e))
+    app = data.get("app")
+    if not isinstance(app, str):
+        raise ProfileError("Profile needs an 'app' name")
+    keys = data.get("keys", {})
+    if not isinstance(keys, dict):
+        raise ProfileError("[keys] must be a table")
+    banks = data.get("banks", {})
+    if not isinstance(banks, dict) or not all(
+        isinstance(bank, dict) for bank in banks.values()
+    ):
+        raise ProfileError("[banks] must be tables of keys")
+    backlight = data.get("backlight")
+    if backlight is not None:
+        try:
+            backlight = parse_colour(backlight)
+        except ValueError as e:
+            raise ProfileError(str(e))
+    return app, keys, banks, backlight
+
+
+def parse_bindings(keys: dict, manager_class: type) -> dict:
+    mapping = {}
+    for key_code, value in keys.items():
+        try:
+            mapping[key_code] = parse_binding(value, manager_class)
+        except ProfileError as e:
+            raise ProfileError(f"{key_code}: {e}")
+    return mapping
+
+
+def build_mapping(keys: dict, manager: InputManager) -> dict:
+    """Lay a profile's bindings over the manager's Python mapping."""
+    return {
+        **type(manager).direct_mapping,
+        **parse_bindings(keys, type(manager)),
+    }
+
+
+def build_banks(banks: dict, manager: InputManager) -> dict:
+    """Lay a profile's bank bindings over the manager's Python banks."""
+    mapping_banks = {
+        bank: dict(mapping) for bank, mapping in type(manager).mapping_banks.items()
+    }
+    for bank, keys in banks.items():
+        mapping_banks.setdefault(bank, {}).update(
+            parse_bindings(keys, type(manager))
+        )
+    return mapping_banks
+
+
+class FileInputManager(SingleAppManager):
+    """A profile for an app that only has a TOML file, no Python profile."""
+
+    direct_mapping = {}
+
+    def __init__(self, app_name: str):
+        self.app_name = app_name
+        super().__init__()
+
+
+class ProfileWatcher(PeriodicComponent):
+    """Watches the profiles directory and keeps profiles in sync with it."""
+
+    CHECK_INTERVAL_MS = 1000
+
+    profiles_dir: Path
+    registry: PluginRegistry
+
+    # (mtime, app) for each loaded file
+    _loaded: dict[Path, tuple[float, str | None]]
+    # profiles created from files, rather than Python plugins
+    _file_managers: dict[str, FileInputManager]
+
+    def __init__(self, registry: PluginRegistry, profiles_dir: Path = PROFILES_DIR):
+        self.profiles_dir = profiles_dir
+        self.registry = registry
+        self._loaded = {}
+        self._file_managers = {}
+        self.schedule(self.check_profiles, self.CHECK_INTERVAL_MS)
+
+    def profile_files(self) -> dict[Path, float]:
+        try:
+            return {
+                path: path.stat().st_mtime
+                for path in self.profiles_dir.glob("*.toml")
+            }
+        except OSError:
+            return {}
+
+    async def check_profiles(self):
+        files = self.profile_files()
+        for path in list(self._loaded):
+            if path not in files:
+                self.unload(path)
+        for path, mtime in files.items():
+            loaded = self._loaded.get(path)
+            if loaded is None or loaded[0] != mtime:
+                await self.load(path, mtime)
+
+    async def load(self, path: Path, mtime: float):
+        previous = self._loaded.get(path)
+        app = previous[1] if previous else None
+        try:
+            app, keys, banks, backlight = await asyncio.to_thread(read_profile, path)
+            if previous and previous[1] != app:
+                self.unload(path)
+            manager = self.manager_for(app)
+            mapping, mapping_banks, tables = await asyncio.to_thread(
+                self.compile, keys, banks, manager
+            )
+        except (OSError, ProfileError, MappingError) as e:
+            logger.error("Couldn't load profile {}: {}", path, e)
+            blinker.signal("g13_print").send(f"Bad profile {path.name}")
+        else:
+            # a macro recorded while compiling isn't in the new tables yet
+            for table in tables:
+                manager.bind_recorded_macros(table)
+            # swap the new tables in between key events
+            manager.direct_mapping = mapping
+            manager.mapping_banks = mapping_banks
+            manager.set_dispatch(tables)
+            manager.backlight = backlight
+            if manager.active:
+                manager.show_lighting()
+            logger.info("Loaded profile {} for {}", path, app)
+        # don't retry a broken file until it changes again
+        self._loaded[path] = (mtime, app)
+
+    @staticmethod
+    def compile(keys: dict, banks: dict, manager: InputManager):
+        mapping = build_mapping(keys, manager)
+        mapping_banks = build_banks(banks, manager)
+        return mapping, mapping_banks, manager.compile_dispatch(mapping, mapping_banks)
+
+    def manager_for(self, app: str) -> InputManager:
+        manager = self.registry.get(app)
+        if manager is None:
+            manager = FileInputManager(app)
+            self.registry.add(manager)
+            self._file_managers[app] = manager
+        return manager
+
+    def unload(self, path: Path):
+        """Forget a profile file, going back to the Python profile if there is one."""
+        _, app = self._loaded.pop(path)
+        manager = self.registry.managers.get(app)
+        if manager is None:
+            return
+        if app in self._file_managers:
+            del self._file_managers[app]
+            # deactivates it, if its app is focused
+            self.registry.remove(app)
+            asyncio.get_running_loop().create_task(manager.stop_tasks())
+        else:
+            vars(manager).pop("direct_mapping", None)
+            vars(manager).pop("mapping_banks", None)
+            vars(manager).pop("backlight", None)
+            manager.set_dispatch(manager.compile_dispatch())
+        logger.info("Unloaded profile {}", path)
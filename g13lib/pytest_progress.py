@@ -0,0 +1,113 @@
+"""
+A pytest plugin that streams test progress to the G13 daemon.
+
+Enable it in the project under test, e.g. in its pyproject.toml:
+
+    [tool.pytest]
+    addopts = ["-p", "g13lib.pytest_progress"]
+
+(g13lib needs to be importable there; this module only uses the standard
+library, so it can also just be copied into the project.)
+
+While the daemon is listening, the plugin sends the running totals as small
+JSON datagrams over a Unix socket, at most once every `BATCH_INTERVAL_S`, and
+once more when the session finishes. Each message carries cumulative counts,
+so if one is dropped (the plugin never blocks the test run waiting for the
+daemon) the next one makes up for it. It also carries the outcome of each test
+that finished since the previous message, as `[nodeid, outcome]` pairs; if
+there are more than `RESULTS_PER_MESSAGE` of those, passes are left out first.
+"""
+
+import json
+import os
+import socket
+import time
+
+SOCKET_PATH = os.environ.get("G13_PROGRESS_SOCKET", "/tmp/g13slop-progress.sock")
+BATCH_INTERVAL_S = 0.1
+RESULTS_PER_MESSAGE = 100
+
+
+class ProgressReporter:
+    clock = staticmethod(time.monotonic)
+
+    def __init__(self, path: str = SOCKET_PATH):
+        self.path = path
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.sock.setblocking(False)
+        self.run = f"{os.getpid()}-{time.time():.3f}"
+        self.total = 0
+        self.finished = 0
+        self.passed = 0
+        self.failed = 0
+        self.skipped = 0
+        self.first_failure = None
+        self.results = []
+        self._last_sent = None
+
+    def take_results(self) -> list[tuple[str, str]]:
+        results, self.results = self.results, []
+        if len(results) > RESULTS_PER_MESSAGE:
+            results = [result for result in results if result[1] != "passed"]
+        return results[-RESULTS_PER_MESSAGE:]
+
+    def message(self, done: bool = False) -> bytes:
+        return json.dumps(
+            {
+                "run": self.run,
+                "total": self.total,
+                "finished": self.finished,
+                "passed": self.passed,
+                "failed": self.failed,
+                "skipped": self.skipped,
+                "first_failure": self.first_failure,
+                "results": self.take_results(),
+                "done": done,
+            }
+        ).encode()
+
+    def send(self, done: bool = False):
+        self._last_sent = self.clock()
+        if done:
+            # make sure the final counts get there
+            self.sock.settimeout(0.5)
+        try:
+            self.sock.sendto(self.message(done), self.path)
+        except OSError:
+            # the daemon isn't listening, or is too busy to keep up
+            pass
+
+    def maybe_send(self):
+        if self._last_sent is None or self.clock() - self._last_sent >= BATCH_INTERVAL_S:
+            self.send()
+
+    def pytest_collection_finish(self, session):
+        self.total = len(session.items)
+        self.send()
+
+    def pytest_runtest_logreport(self, report):
+        if report.failed:
+            if self.first_failure is None:
+                self.first_failure = report.nodeid
+            # count each test's failure once, whichever phase it failed in
+            if report.when == "call" or report.when == "setup":
+                self.failed += 1
+                self.results.append((report.nodeid, "failed"))
+        elif report.skipped:
+            self.skipped += 1
+            self.results.append((report.nodeid, "skipped"))
+        elif report.when == "call":
+            self.passed += 1
+            self.results.append((report.nodeid, "passed"))
+        if report.when == "teardown":
+            self.finished += 1
+            self.maybe_send()
+
+    def pytest_sessionfinish(self, session):
+        self.send(done=True)
+        self.sock.close()
+
+
+def pytest_configure(config):
+    if os.path.exists(SOCKET_PATH):
+        config.pluginmanager.register(ProgressReporter(), "g13slop-progress")
@@ -1,3 +1,6 @@
+import itertools
+import typing
+
 from loguru import logger
 from PIL import Image
 
@@ -5,41 +8,146 @@ LCD_WIDTH = 160
 LCD_HEIGHT = 48
 
 
+def has_alpha(image: Image.Image) -> bool:
+    return image.mode in ("RGBA", "LA") or (
+        image.mode == "P" and "transparency" in image.info
+    )
+
+
+def paste_image(
+    framebuffer: Image.Image, image: Image.Image, position: tuple[int, int]
+):
+    """Paste any image onto the framebuffer, using its alpha channel as a mask."""
+    # NOTE: does this work as expected with 1-bit images?
+    if has_alpha(image):
+        framebuffer.paste(image, position, image)
+    else:
+        framebuffer.paste(image, position)
+
+
+class Sprite:
+    """An image converted once to the framebuffer's 1-bit mode, with a 1-bit
+    mask if it's partly transparent, so drawing it is a single paste."""
+
+    __slots__ = ("image", "mask")
+
+    image: Image.Image
+    mask: Image.Image | None
+
+    def __init__(self, image: Image.Image, mask: Image.Image | None = None):
+        if mask is None and has_alpha(image):
+            mask = image.convert("RGBA").getchannel("A")
+        self.image = image if image.mode == "1" else image.convert("1")
+        if mask is not None and mask.mode != "1":
+            # opaque where the alpha is at least half
+            mask = mask.convert("L").point(lambda a: 255 * (a >= 128), "1")
+        self.mask = mask
+
+    def draw(self, framebuffer: Image.Image, position: tuple[int, int]):
+        framebuffer.paste(self.image, position, self.mask)
+
+
 class Layer:
+    """Something that can be drawn on the LCD by a compositor.
+
+    A layer is visible while it's in the compositor on the LCD, and hidden
+    otherwise; subclasses can use `on_show` and `on_hide` to avoid work nobody
+    will see.
+
+    `render` may be called on a worker thread (see `G13DeviceOutputManager`),
+    so a layer whose state is changed by signal handlers should lock it.
+
+    A `static` layer only changes when it calls `changed()`. The compositor
+    flattens the static layers at the bottom of its scene into a cached
+    background, and only draws them again when one of them has changed.
+    """
+
+    visible: bool = False
+    static: bool = False
+    # bumped by `changed()`
+    version: int = 0
+
+    def show(self):
+        if not self.visible:
+            self.visible = True
+            self.on_show()
+
+    def hide(self):
+        if self.visible:
+            self.visible = False
+            self.on_hide()
+
+    def on_show(self):
+        pass
+
+    def on_hide(self):
+        pass
+
+    def changed(self):
+        """Mark a static layer as needing to be drawn again."""
+        self.version += 1
 
     def render(self) -> tuple[Image.Image | None, tuple[int, int]]:
         """Render the layer to an image."""
         raise NotImplementedError("Subclasses must implement render method.")
 
+    def composite(self, framebuffer: Image.Image):
+        """Draw the layer onto the framebuffer.
+
+        Layers that keep their content as a `Sprite` can override this to skip
+        working out how to paste it."""
+        image, position = self.render()
+        if image:
+            paste_image(framebuffer, image, position)
+
 
 class LCDCompositor:
     scene: list
 
     lcd_dims = (LCD_WIDTH, LCD_HEIGHT)
 
+    # the static layers at the bottom of the scene, drawn on a blank frame,
+    # and the (layer, version) pairs it was drawn from
+    _background: Image.Image | None = None
+    _background_key: tuple = ()
+
     def __init__(self, *layers):
         self.scene = list(layers)
 
-    def render(self) -> Image.Image:
-        """Render the current scene to an image."""
-        framebuffer = Image.new(
-            "1", self.lcd_dims, color=1
-        )  # start with white background
-
-        for z, layer in enumerate(self.scene):
-            if not layer:
-                continue
-            layer_image, position = layer.render()
-            if layer_image:
-                # if there's an alpha channel, use it as a mask
-                # NOTE: does this work as expected with 1-bit images?
-                if layer_image.mode in ("RGBA", "LA") or (
-                    layer_image.mode == "P" and "transparency" in layer_image.info
-                ):
-                    framebuffer.paste(layer_image, position, layer_image)
-                else:
-                    framebuffer.paste(layer_image, position)
-                # layer_image.save(f"davinci_layer_{z}.png")
+    def attach(self):
+        """This compositor is now on the LCD."""
+        for layer in self.scene:
+            if layer:
+                layer.show()
+
+    def detach(self):
+        """This compositor is no longer on the LCD."""
+        for layer in self.scene:
+            if layer:
+                layer.hide()
+
+    def background(self) -> tuple[Image.Image, int]:
+        """The flattened static layers, and how many layers of the scene they cover."""
+        layers = list(itertools.takewhile(lambda layer: not layer or layer.static, self.scene))
+        key = tuple((layer, layer.version) for layer in layers if layer)
+        if self._background is None or key != self._background_key:
+            background = Image.new(
+                "1", self.lcd_dims, color=1
+            )  # start with white background
+            for layer, _ in key:
+                layer.composite(background)
+            self._background = background
+            self._background_key = key
+        return self._background, len(layers)
+
+    def render(self, overlays: typing.Sequence[Layer] = ()) -> Image.Image:
+        """Render the current scene, and then any overlays, to an image."""
+        background, flattened = self.background()
+        framebuffer = background.copy()
+
+        for layer in itertools.chain(self.scene[flattened:], overlays):
+            if layer:
+                layer.composite(framebuffer)
 
         return framebuffer
 
@@ -9,19 +9,27 @@ from g13lib.render_fb import LCDCompositor
 class SingleAppManager(InputManager):
     """An InputManager for a single application.
 
-    Listens for the active application and activates or deactivates itself accordingly.
+    Activated and deactivated by the `PluginRegistry` as its app gains and
+    loses focus.
 
-    The default compositor shows a terminal log emulator.
+    The default compositor shows a terminal log emulator. It's built once,
+    with the manager, and put back on the LCD on each activation.
     """
 
     active = False
     app_name: str
 
+    _compositor: LCDCompositor
+
     def __init__(self):
         logger.debug("Initializing SingleAppManager for app: {}", self.app_name)
-        blinker.signal("app_changed").connect(self.app_changed)
         self._terminal = LogEmulator()
         super().__init__()
+        self._compositor = self.compositor()
+
+    @property
+    def profile_name(self) -> str:
+        return self.app_name
 
     def compositor(self):
         return LCDCompositor(
@@ -31,15 +39,15 @@ class SingleAppManager(InputManager):
     def activate(self):
         logger.info("Activating SingleAppManager for app: {}", self.app_name)
         self.active = True
-        blinker.signal("set_compositor").send(self.compositor())
+        self.show_bank()
+        self.show_lighting()
+        blinker.signal("set_compositor").send(self._compositor)
         blinker.signal("single_focus").send(self.app_name)
 
-    def deactivate(self):
+    def deactivate(self, release_focus: bool = True):
+        """Go quiet. `release_focus` hands the G13 back to the general manager,
+        which isn't wanted when another app's manager is taking over."""
         self.active = False
-        blinker.signal("release_focus").send(self.app_name)
-
-    def app_changed(self, app_name: str):
-        if app_name == self.app_name:
-            self.activate()
-        elif self.active:
-            self.deactivate()
+        self.release_gestures()
+        if release_focus:
+            blinker.signal("release_focus").send(self.app_name)
@@ -0,0 +1,31 @@
+"""Timing helpers for reporting how long things take."""
+
+import contextlib
+import time
+
+from loguru import logger
+
+
+class StageTimer:
+    """Times named stages of a process, like daemon startup."""
+
+    stages: list[tuple[str, float]]
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started = time.perf_counter()
+        self.stages = []
+
+    @contextlib.contextmanager
+    def stage(self, stage_name: str):
+        stage_started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages.append((stage_name, time.perf_counter() - stage_started))
+
+    def report(self):
+        """Log the time taken by each stage, and in total."""
+        total_ms = (time.perf_counter() - self.started) * 1000
+        stages = ", ".join(f"{name} {secs * 1000:.1f} ms" for name, secs in self.stages)
+        logger.info("{} took {:.1f} ms: {}", self.name, total_ms, stages)
@@ -0,0 +1,143 @@
+"""
+Capture and replay of raw G13 input.
+
+A trace is an append-only binary file: an 8-byte header, then one 12-byte
+record per input report, holding the time since the previous report (in µs)
+and the raw 8-byte report:
+
+    header   b"G13T", version (u8), 3 reserved bytes
+    record   delta_us (u32, little-endian), report (8 bytes)
+
+Each recording session appends to the file, starting with a delta of 0.
+
+Record a session by setting G13_TRACE to a path when starting the daemon, and
+replay it with:
+
+    python -m g13lib.trace replay session.g13trace [--speed 4 | --fast]
+
+Replay feeds the reports through `G13Manager`, so the same trace always
+produces the same key and joystick signals, in the same order.
+"""
+
+import argparse
+import asyncio
+import struct
+import threading
+import time
+import typing
+from pathlib import Path
+
+import blinker
+
+from g13lib.watchdog import watched
+
+MAGIC = b"G13T"
+VERSION = 1
+HEADER = MAGIC + bytes([VERSION, 0, 0, 0])
+RECORD = struct.Struct("<I8s")
+MAX_DELTA_US = 0xFFFFFFFF
+
+
+class TraceError(ValueError):
+    pass
+
+
+class TraceRecorder:
+    """Appends input reports to a trace file. Safe to call from the USB thread."""
+
+    FLUSH_INTERVAL_S = 1.0
+
+    _last_at: float | None = None
+    _flushed_at: float = 0.0
+
+    def __init__(self, path: Path | str):
+        self.path = Path(path)
+        self._file = open(self.path, "ab")
+        if self._file.tell() == 0:
+            self._file.write(HEADER)
+        self._lock = threading.Lock()
+
+    def record(self, report: typing.Sequence[int], at: float):
+        """Record a report read at `at` (a time.perf_counter() time)."""
+        with self._lock:
+            delta = 0 if self._last_at is None else at - self._last_at
+            self._last_at = at
+            delta_us = min(max(int(delta * 1_000_000), 0), MAX_DELTA_US)
+            self._file.write(RECORD.pack(delta_us, bytes(report)))
+            if at - self._flushed_at >= self.FLUSH_INTERVAL_S:
+                self._file.flush()
+                self._flushed_at = at
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+def read_trace(path: Path | str) -> typing.Iterator[tuple[float, bytes]]:
+    """Yield (seconds since the previous report, report) for each record."""
+    data = Path(path).read_bytes()
+    if data[:4] != MAGIC:
+        raise TraceError(f"{path} is not a G13 trace")
+    if data[4] != VERSION:
+        raise TraceError(f"{path} is trace version {data[4]}, not {VERSION}")
+    body = memoryview(data)[len(HEADER) :]
+    # ignore a partly-written last record
+    body = body[: len(body) - len(body) % RECORD.size]
+    for delta_us, report in RECORD.iter_unpack(body):
+        yield delta_us / 1_000_000, report
+
+
+async def replay(manager, path: Path | str, speed: float | None = 1.0) -> int:
+    """Feed a trace to a G13Manager, returning the number of reports.
+
+    `speed` is a multiple of real time; None replays as fast as possible.
+    """
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    offset = 0.0
+    count = 0
+    for delta, report in read_trace(path):
+        if speed is not None:
+            offset += delta / speed
+            # keep to the trace's own timeline, so delays don't accumulate
+            wait = started + offset - loop.time()
+            if wait > 0:
+                await asyncio.sleep(wait)
+        await manager.process_report(report)
+        count += 1
+    return count
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    replay_parser = commands.add_parser("replay", help="replay a trace")
+    replay_parser.add_argument("trace", type=Path)
+    timing = replay_parser.add_mutually_exclusive_group()
+    timing.add_argument("--speed", type=float, default=1.0, help="multiple of real time")
+    timing.add_argument("--fast", action="store_true", help="as fast as possible")
+    replay_parser.add_argument(
+        "--quiet", action="store_true", help="don't print each event"
+    )
+    args = parser.parse_args(argv)
+
+    # imported here, as the device modules need pyusb
+    from g13lib.device_manager import G13Manager
+
+    @watched("g13_key", "g13_joy")
+    async def print_event(event):
+        print(event)
+
+    if not args.quiet:
+        blinker.signal("g13_key").connect(print_event)
+        blinker.signal("g13_joy").connect(print_event)
+
+    manager = G13Manager(g13_usb_device=None)
+    started = time.perf_counter()
+    count = asyncio.run(replay(manager, args.trace, None if args.fast else args.speed))
+    elapsed = time.perf_counter() - started
+    print(f"Replayed {count} reports in {elapsed:.3f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+"""
+Watches for anything blocking the event loop.
+
+`LoopWatchdog` times every signal receiver marked with `watched` and every
+scheduler callback, and keeps worst-case statistics for each. Async handlers
+are timed a step at a time, so time spent awaiting isn't counted: only the
+time the handler actually held the loop. A handler that holds the loop for longer than
+`HANDLER_BUDGET_MS` is logged.
+
+Receivers are marked where they're defined, so the signals themselves are
+left alone:
+
+    @watched("g13_key")
+    async def handle_keystroke(self, code): ...
+
+Every receiver of the signals in `WATCHED_SIGNALS` should be marked. While no
+watchdog is running, a watched receiver just calls straight through.
+
+It also measures the loop's lag with a heartbeat timer, and runs a monitor
+thread that samples the loop thread's stack whenever a handler (or anything
+else) has been holding the loop for too long, so the log says where it was
+stuck rather than just who was to blame.
+"""
+
+import asyncio
+import functools
+import inspect
+import sys
+import threading
+import time
+import traceback
+import typing
+
+from loguru import logger
+
+import g13lib.metrics as metrics
+from g13lib.async_help import PeriodicComponent
+
+LOOP_LAG = metrics.histogram("loop.lag")
+
+# signals whose receivers are on the input path, so must all be `watched`
+WATCHED_SIGNALS = ("g13_key", "g13_joy", "app_changed", "set_compositor")
+
+# the watchdog timing watched receivers, if one's running
+_current: "LoopWatchdog | None" = None
+
+
+class HandlerStats:
+    calls: int = 0
+    total: float = 0.0
+    worst: float = 0.0
+    over_budget: int = 0
+
+    def record(self, elapsed: float, over_budget: bool, step: bool = False):
+        # later steps of an async handler are part of the same call
+        if not step:
+            self.calls += 1
+        self.total += elapsed
+        if elapsed > self.worst:
+            self.worst = elapsed
+        if over_budget:
+            self.over_budget += 1
+
+
+def handler_name(handler) -> str:
+    if isinstance(handler, functools.partial):
+        return handler_name(handler.func)
+    return getattr(handler, "__qualname__", None) or repr(handler)
+
+
+class _TimedAwaitable:
+    """Awaits `awaitable`, timing each step it runs on the loop."""
+
+    def __init__(self, watchdog: "LoopWatchdog", awaitable, name: str):
+        self.watchdog = watchdog
+        self.awaitable = awaitable
+        self.name = name
+
+    def __await__(self):
+        steps = self.awaitable.__await__()
+        send, error = None, None
+        while True:
+            token = self.watchdog._enter(self.name, step=True)
+            try:
+                if error is None:
+                    yielded = steps.send(send)
+                else:
+                    yielded = steps.throw(error)
+            except StopIteration as e:
+                return e.value
+            finally:
+                self.watchdog._exit(token)
+            try:
+                send, error = (yield yielded), None
+            except BaseException as e:
+                send, error = None, e
+
+
+def watched(*signal_names: str):
+    """Mark a receiver of one or more signals to be timed by the running
+    watchdog, as "signal_name: receiver"."""
+
+    def decorate(receiver):
+        name = f"{', '.join(signal_names)}: {handler_name(receiver)}"
+        if inspect.iscoroutinefunction(receiver):
+
+            @functools.wraps(receiver)
+            async def timed_async(*args, **kwargs):
+                if _current is None:
+                    return await receiver(*args, **kwargs)
+                return await _current.call(name, receiver, *args, **kwargs)
+
+            timed_async.watched_signals = signal_names
+            return timed_async
+
+        @functools.wraps(receiver)
+        def timed(*args, **kwargs):
+            if _current is None:
+                return receiver(*args, **kwargs)
+            return _current.call(name, receiver, *args, **kwargs)
+
+        timed.watched_signals = signal_names
+        return timed
+
+    return decorate
+
+
+class LoopWatchdog(PeriodicComponent):
+    HANDLER_BUDGET_MS = 20
+    LAG_BUDGET_MS = 50
+    HEARTBEAT_MS = 100
+
+    handler_budget: float
+    lag_budget: float
+    stats: dict[str, HandlerStats]
+
+    # what's holding the loop right now, innermost last:
+    # (name, started, token, is an async step)
+    _running: list[tuple[str, float, int, bool]]
+    # stacks sampled by the monitor thread, by token
+    _samples: dict[int, str]
+    _heartbeat: float = 0.0
+    _thread: threading.Thread | None = None
+
+    def __init__(
+        self,
+        handler_budget_ms: float = HANDLER_BUDGET_MS,
+        lag_budget_ms: float = LAG_BUDGET_MS,
+    ):
+        self.handler_budget = handler_budget_ms / 1000.0
+        self.lag_budget = lag_budget_ms / 1000.0
+        self.stats = {}
+        self._samples = {}
+        self._running = []
+        self._tokens = iter(range(1, sys.maxsize))
+        self._loop_thread = threading.get_ident()
+        self._stopping = threading.Event()
+
+        global _current
+        _current = self
+
+        self.scheduler.callback_wrapper = self.wrap_callback
+        for timer in self.scheduler.timers:
+            timer.callback = self.wrap_callback(timer.callback, timer.name)
+
+        self._heartbeat = time.perf_counter()
+        self.schedule(self.heartbeat, self.HEARTBEAT_MS)
+
+    # timing
+
+    def _enter(self, name: str, step: bool = False) -> int:
+        token = next(self._tokens)
+        self._running.append((name, time.perf_counter(), token, step))
+        return token
+
+    def _exit(self, token: int):
+        name, started, _, step = self._running.pop()
+        elapsed = time.perf_counter() - started
+        over_budget = elapsed > self.handler_budget
+        self.stats.setdefault(name, HandlerStats()).record(elapsed, over_budget, step)
+        stack = self._samples.pop(token, None)
+        if over_budget:
+            if stack:
+                logger.warning(
+                    "{} held the event loop for {:.0f} ms, in:\n{}",
+                    name,
+                    elapsed * 1000,
+                    stack,
+                )
+            else:
+                logger.warning(
+                    "{} held the event loop for {:.0f} ms", name, elapsed * 1000
+                )
+
+    def call(self, name: str, handler, *args, **kwargs):
+        """Call a handler, timing it (and each step of it, if it's async)."""
+        token = self._enter(name)
+        try:
+            result = handler(*args, **kwargs)
+        finally:
+            self._exit(token)
+        if inspect.isawaitable(result):
+            return _TimedAwaitable(self, result, name)
+        return result
+
+    def wrap_callback(self, callback: typing.Callable, name: str) -> typing.Callable:
+        """Wrap a scheduler callback so it's timed."""
+
+        def timed():
+            result = self.call(name, callback)
+            if isinstance(result, _TimedAwaitable):
+                # the scheduler starts coroutines as tasks
+                return _await(result)
+            return result
+
+        timed.__qualname__ = name
+        return timed
+
+    # lag
+
+    def heartbeat(self):
+        now = time.perf_counter()
+        lag = max(0.0, now - self._heartbeat - self.HEARTBEAT_MS / 1000.0)
+        LOOP_LAG.observe(lag)
+        self._heartbeat = now
+
+    def _monitor(self):
+        """Samples the loop thread's stack when something's holding the loop."""
+        interval = self.handler_budget / 2
+        stalled_since = None
+        while not self._stopping.wait(interval):
+            now = time.perf_counter()
+            try:
+                current = self._running[-1]
+            except IndexError:
+                # (it may also have finished since we looked)
+                current = None
+            if current is not None:
+                _, started, token, _ = current
+                if now - started > self.handler_budget and token not in self._samples:
+                    self._samples[token] = self._sample_stack()
+
+            # nothing instrumented might be running, but the loop's still stuck
+            behind = now - self._heartbeat - self.HEARTBEAT_MS / 1000.0
+            if behind > self.lag_budget and current is None:
+                if stalled_since != self._heartbeat:
+                    stalled_since = self._heartbeat
+                    logger.warning(
+                        "Event loop blocked for {:.0f} ms, in:\n{}",
+                        behind * 1000,
+                        self._sample_stack(),
+                    )
+
+    def _sample_stack(self) -> str:
+        frame = sys._current_frames().get(self._loop_thread)
+        if frame is None:
+            return "(no stack)"
+        return "".join(traceback.format_stack(frame, limit=12))
+
+    def report(self) -> dict[str, tuple[int, float, float]]:
+        """(calls, mean ms, worst ms) for each handler, worst first."""
+        return {
+            name: (stats.calls, stats.total / stats.calls * 1000, stats.worst * 1000)
+            for name, stats in sorted(
+                self.stats.items(), key=lambda item: item[1].worst, reverse=True
+            )
+        }
+
+    def start_tasks(self, tg: asyncio.TaskGroup):
+        super().start_tasks(tg)
+        self._loop_thread = threading.get_ident()
+        self._thread = threading.Thread(
+            target=self._monitor, name="loop-watchdog", daemon=True
+        )
+        self._thread.start()
+
+    async def stop_tasks(self):
+        global _current
+        self._stopping.set()
+        if _current is self:
+            _current = None
+        if self.scheduler.callback_wrapper == self.wrap_callback:
+            self.scheduler.callback_wrapper = None
+        await super().stop_tasks()
+
+
+async def _await(awaitable):
+    return await awaitable
@@ -1,64 +1,110 @@
 import asyncio
+import os
 import sys
-import time
 
 import blinker
 from loguru import logger
 
-from g13lib.apps.davinci_resolve import DavinciInputManager
 from g13lib.apps.general import GeneralManager
-from g13lib.apps.vscode import VSCodeInputManager
+from g13lib.async_help import default_scheduler
+from g13lib.control import ControlServer
 from g13lib.device.g13_output import G13DeviceOutputManager
-from g13lib.device.g13_usb_device import FatalG13USBError, G13USBDevice, G13USBError
+from g13lib.device.g13_usb_device import (
+    FatalG13USBError,
+    G13USBDevice,
+    G13USBError,
+)
+from g13lib.device.usb_process import G13USBProcess
 from g13lib.device_manager import G13Manager
 from g13lib.input_manager import EndProgram
+from g13lib.lcd.shared_layers import SharedLayerServer
+from g13lib.metrics import MetricsExporter
 from g13lib.monitors.current_app import AppMonitor
+from g13lib.monitors.system_stats import SystemStats
+from g13lib.plugins import PluginRegistry, discover_plugins
+from g13lib.profiles import ProfileWatcher
+from g13lib.timing import StageTimer
+from g13lib.trace import TraceRecorder
+from g13lib.watchdog import LoopWatchdog
 
+# how long to wait for the G13 to finish initializing
+USB_READY_TIMEOUT_S = 5.0
 
-async def main():
-
-    # load all the things that listen for signals
-    # probably this should be more configurable
-    # and allow for reload of application managers
+# where to export metrics snapshots, if anywhere: a file path or "unix:/socket/path"
+METRICS_EXPORT = os.environ.get("G13_METRICS_EXPORT")
 
-    usb_device_manager = G13USBDevice()
+# where to record a trace of the raw input, if anywhere (see g13lib/trace.py)
+TRACE_PATH = os.environ.get("G13_TRACE")
 
-    device_input_manager = G13Manager(usb_device_manager)
-    device_output_manager = G13DeviceOutputManager(usb_device_manager)
+# do the USB I/O in a child process, rather than a thread (see g13lib/device/usb_process.py)
+USB_PROCESS = os.environ.get("G13_USB_PROCESS") == "1"
 
-    # we're trying to avoid USB errors on startup
-    # if we try to read too soon after opening the device
-    # we seek to get spurious I/O and Permission Denied errors
-    # so just wait a bit
 
-    time.sleep(0.5)  # use a blocking sleep here to be sure nothing happens too soon
+async def main():
+    # (imports aren't a stage; `python -X importtime main.py` breaks them down)
+    startup = StageTimer("Startup")
 
-    _listeners = [
-        device_input_manager,
-        device_output_manager,
-        DavinciInputManager(),
-        VSCodeInputManager(),
-        AppMonitor(),
-        GeneralManager(),
-    ]
+    # load all the things that listen for signals
+    # app managers are plugins, loaded when their app is first focused
+
+    with startup.stage("usb open"):
+        usb_class = G13USBProcess if USB_PROCESS else G13USBDevice
+        usb_device_manager = usb_class(
+            trace=TraceRecorder(TRACE_PATH) if TRACE_PATH else None
+        )
+
+        device_input_manager = G13Manager(usb_device_manager)
+        device_output_manager = G13DeviceOutputManager(usb_device_manager)
+
+    # set everything else up while the device initializes
+    with startup.stage("listeners"):
+        watchdog = LoopWatchdog()
+        plugins = PluginRegistry(discover_plugins())
+        _listeners = [
+            watchdog,
+            device_input_manager,
+            device_output_manager,
+            plugins,
+            ProfileWatcher(plugins),
+            AppMonitor(),
+            SystemStats(),
+            GeneralManager(),
+            ControlServer(),
+            SharedLayerServer(),
+        ]
+        if METRICS_EXPORT:
+            _listeners.append(MetricsExporter(METRICS_EXPORT))
     logger.debug("Initialized {} listeners", len(_listeners))
 
+    with startup.stage("usb ready"):
+        # nothing may touch the device until it's answered a probe read
+        try:
+            await usb_device_manager.wait_ready(USB_READY_TIMEOUT_S)
+        except FatalG13USBError as e:
+            logger.error("G13 didn't become ready: {}", e)
+            usb_device_manager.close()
+            return 1
+
     try:
 
         # Run core loops and periodic tasks concurrently
         async with asyncio.TaskGroup() as tg:
             tg.create_task(read_data_loop(device_input_manager))
+            tg.create_task(default_scheduler.run())
             for listener in _listeners:
                 if hasattr(listener, "start_tasks"):
                     logger.debug("Starting tasks for {}", listener.__class__.__name__)
                     listener.start_tasks(tg)
             blinker.signal("release_focus").send()
+            startup.report()
     except* EndProgram:
         blinker.signal("g13_clear_status").send()
         blinker.signal("g13_print").send("That's all!\n \n ")
         logger.success("Exiting...")
 
     finally:
+        logger.debug("Timer drift (last, worst ms): {}", default_scheduler.drift_report())
+        logger.debug("Handlers (calls, mean, worst ms): {}", watchdog.report())
         logger.success("Closing device manager...")
         usb_device_manager.close()
 
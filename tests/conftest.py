@@ -0,0 +1,27 @@
+import gc
+
+import pytest
+
+from g13lib.async_help import PeriodicComponent, Scheduler, VirtualClock
+from g13lib.input_manager import InputManager
+from g13lib.macros import MacroStore
+
+
+@pytest.fixture(autouse=True)
+def macro_store(tmp_path, monkeypatch):
+    """Keep recorded macros out of the real ~/.config while testing."""
+    store = MacroStore(tmp_path / "macros.json")
+    monkeypatch.setattr(InputManager, "macro_store", store)
+    return store
+
+
+@pytest.fixture(autouse=True)
+def scheduler(monkeypatch):
+    """Give each test's components a scheduler of their own, so nothing one
+    test creates outlives it (or hears another test's signals)."""
+    scheduler = Scheduler(VirtualClock())
+    monkeypatch.setattr(PeriodicComponent, "scheduler", scheduler)
+    yield scheduler
+    # components refer to themselves through their handlers; collect them now,
+    # so their weakly connected receivers go with them
+    gc.collect()
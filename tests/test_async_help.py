@@ -0,0 +1,125 @@
+import asyncio
+
+import blinker
+import pytest
+
+from g13lib.async_help import PeriodicComponent, Scheduler, VirtualClock
+
+
+def test_timers_fire_on_virtual_clock():
+    clock = VirtualClock()
+    scheduler = Scheduler(clock)
+    fast, slow = [], []
+    scheduler.every(33, lambda: fast.append(clock.now()))
+    scheduler.every(1000, lambda: slow.append(clock.now()), initial_delay_ms=500)
+
+    # ten virtual seconds, instantly
+    asyncio.run(scheduler.run(until=10.0))
+
+    assert len(fast) == 303
+    assert len(slow) == 10
+    assert slow[0] == 0.5
+    # never early, and never later than the wheel's resolution
+    assert all(-1e-9 <= t - 0.033 * (i + 1) < 0.001 for i, t in enumerate(fast))
+
+
+def test_coalesced_timers_share_a_wakeup():
+    clock = VirtualClock()
+    scheduler = Scheduler(clock, resolution_ms=10)
+    fired = []
+    scheduler.every(101, lambda: fired.append(("a", clock.now())))
+    scheduler.every(105, lambda: fired.append(("b", clock.now())))
+
+    asyncio.run(scheduler.run(until=0.15))
+
+    assert [name for name, _ in fired] == ["a", "b"]
+    assert fired[0][1] == fired[1][1]
+
+
+def test_suspended_timers_dont_fire():
+    clock = VirtualClock()
+    scheduler = Scheduler(clock)
+    ticks = []
+    timer = scheduler.every(100, lambda: ticks.append(clock.now()), suspended=True)
+
+    async def run():
+        await scheduler.run(until=1.0)
+        timer.resume()
+        await scheduler.run(until=1.35)
+        timer.suspend()
+        await scheduler.run(until=2.0)
+
+    asyncio.run(run())
+
+    assert len(ticks) == 3
+    assert scheduler.drift_report()[timer.name][1] < 1.0
+
+
+def test_async_callbacks():
+    clock = VirtualClock()
+    scheduler = Scheduler(clock)
+    calls = []
+
+    async def callback():
+        calls.append(clock.now())
+
+    scheduler.every(50, callback)
+    asyncio.run(scheduler.run(until=0.5))
+    assert len(calls) == 10
+
+
+def test_fire_soon():
+    clock = VirtualClock()
+    scheduler = Scheduler(clock)
+    ticks = []
+    timer = scheduler.every(100, lambda: ticks.append(clock.now()))
+
+    async def run():
+        await scheduler.run(until=0.25)
+        timer.fire_soon()
+        await scheduler.run(until=0.4)
+
+    asyncio.run(run())
+
+    # fired straight away, then an interval on from there
+    assert ticks == pytest.approx([0.1, 0.2, 0.25, 0.35])
+
+
+def test_one_shot_timers():
+    clock = VirtualClock()
+    scheduler = Scheduler(clock)
+    fired = []
+    scheduler.after(50, lambda: fired.append(clock.now()))
+    cancelled = scheduler.after(60, lambda: fired.append("cancelled"))
+    scheduler.cancel(cancelled)
+
+    asyncio.run(scheduler.run(until=1.0))
+
+    assert fired == pytest.approx([0.05])
+    assert scheduler.timers == []
+
+
+def test_stopping_a_component_tears_it_down(scheduler):
+    class Component(PeriodicComponent):
+        def __init__(self):
+            self.heard = []
+            self.timer = self.schedule(self.tick, 10)
+            self.schedule(self.tick, 10).fire_soon()
+            self.connect("test_async_help", self.hear)
+
+        def tick(self):
+            pass
+
+        def hear(self, sender):
+            self.heard.append(sender)
+
+    component = Component()
+    blinker.signal("test_async_help").send("before")
+    asyncio.run(component.stop_tasks())
+    blinker.signal("test_async_help").send("after")
+
+    assert component.heard == ["before"]
+    assert component.timer.cancelled
+    # the scheduler keeps no reference to the component
+    assert scheduler.timers == []
+    assert not any(scheduler._slots.values())
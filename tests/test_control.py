@@ -0,0 +1,82 @@
+import asyncio
+import json
+import unittest.mock as mock
+
+import blinker
+
+from g13lib.control import FRAME, ControlServer, encode
+
+
+async def read_message(reader):
+    (length,) = FRAME.unpack(await reader.readexactly(FRAME.size))
+    return json.loads(await reader.readexactly(length))
+
+
+def test_batched_commands_and_subscription(tmp_path):
+    received = mock.MagicMock()
+    key = blinker.signal("g13_key")
+
+    async def run():
+        server = ControlServer(str(tmp_path / "control.sock"))
+        async with asyncio.TaskGroup() as tg:
+            server.start_tasks(tg)
+            await asyncio.sleep(0.05)
+            reader, writer = await asyncio.open_unix_connection(server.path)
+            with (
+                blinker.signal("g13_set_status").connected_to(received.status),
+                blinker.signal("g13_led_on").connected_to(received.led_on),
+                blinker.signal("g13_backlight").connected_to(received.backlight),
+            ):
+                writer.write(
+                    encode(
+                        [
+                            ["status", "building"],
+                            ["led_on", "M1", 3],
+                            ["backlight", "#ff8000", 0],
+                            ["led_on", "M9"],
+                            ["nope"],
+                            "print",
+                            ["subscribe"],
+                        ]
+                    )
+                )
+                message = await read_message(reader)
+                assert [index for index, _ in message["errors"]] == [3, 4, 5]
+
+            await key.send_async("G1_PRESSED")
+            assert await read_message(reader) == {"event": "G1_PRESSED"}
+
+            writer.close()
+            await asyncio.sleep(0.05)
+            assert not server.subscribers
+            await server.stop_tasks()
+
+    asyncio.run(run())
+    received.status.assert_called_once_with("building")
+    assert received.led_on.call_args_list == [mock.call(0), mock.call(3)]
+    received.backlight.assert_called_once_with((255, 128, 0), fade_ms=0.0)
+
+
+def test_large_batches_let_input_through(tmp_path):
+    printed, seen = [], []
+
+    async def run():
+        server = ControlServer(str(tmp_path / "control.sock"))
+        async with asyncio.TaskGroup() as tg:
+            server.start_tasks(tg)
+            await asyncio.sleep(0.05)
+            _, writer = await asyncio.open_unix_connection(server.path)
+            writer.write(encode([["print", str(i)] for i in range(1000)]))
+            # what an input event arriving at each turn of the loop would wait behind
+            while len(printed) < 1000:
+                seen.append(len(printed))
+                await asyncio.sleep(0)
+            writer.close()
+            await server.stop_tasks()
+
+    with blinker.signal("g13_print").connected_to(printed.append):
+        asyncio.run(run())
+
+    assert printed == [str(i) for i in range(1000)]
+    gaps = [after - before for before, after in zip(seen, seen[1:])]
+    assert 0 < max(gaps) <= ControlServer.COMMANDS_PER_YIELD
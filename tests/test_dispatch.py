@@ -0,0 +1,102 @@
+import asyncio
+import unittest.mock as mock
+
+import pytest
+
+from g13lib.device.keycodes import event_slots
+from g13lib.dispatch import MappingError, compile_mapping
+
+
+def test_compile_mapping():
+    manager = mock.MagicMock()
+    callback = mock.MagicMock()
+    table = compile_mapping(
+        manager,
+        {
+            "G1": "a",
+            "G2": ("x", "y"),
+            "G3": callback,
+            "L1": ["a", 5],
+        },
+    )
+
+    table[event_slots["G1_PRESSED"]]()
+    table[event_slots["G1_RELEASED"]]()
+    table[event_slots["G2_PRESSED"]]()
+    table[event_slots["G2_RELEASED"]]()
+    assert manager.executor.method_calls == [
+        mock.call.press("a"),
+        mock.call.release("a"),
+        mock.call.chord(("x", "y")),
+    ]
+
+    table[event_slots["G3_RELEASED"]]()
+    callback.assert_called_once_with(manager, "RELEASED", "G3")
+
+    table[event_slots["L1_PRESSED"]]()
+    manager.executor.submit.assert_called_once()
+
+
+def test_unmapped_keys_print_their_code():
+    table = compile_mapping(mock.MagicMock(), {})
+    with mock.patch("blinker.signal") as signal:
+        table[event_slots["G22_PRESSED"]]()
+    signal.return_value.send.assert_called_once_with("G22_PRESSED")
+
+
+@pytest.mark.parametrize(
+    "mapping",
+    [
+        {"G23": "a"},
+        {"G1": "ab"},
+        {"G1": None},
+        {"G1": ("a", 3)},
+        {"G1": ["a", -5]},
+    ],
+)
+def test_bad_mappings_fail_to_compile(mapping):
+    with pytest.raises(MappingError):
+        compile_mapping(mock.MagicMock(), mapping)
+
+
+def test_bank_switch_releases_held_keys():
+    from g13lib.input_manager import InputManager
+
+    class BankedProfile(InputManager):
+        direct_mapping = {"G1": "a"}
+        mapping_banks = {"M2": {"G1": "b"}}
+
+    manager = BankedProfile()
+    manager.executor = mock.MagicMock()
+    manager.set_dispatch(manager.compile_dispatch())
+    assert manager._bank_tables[0] is manager._bank_tables[2]
+
+    async def run():
+        await manager.handle_keystroke("G1_PRESSED")
+        with mock.patch("blinker.signal"):
+            await manager.handle_keystroke("M2_PRESSED")
+        await manager.handle_keystroke("G1_RELEASED")
+        await manager.handle_keystroke("G1_PRESSED")
+        await manager.handle_keystroke("G1_RELEASED")
+
+    asyncio.run(run())
+
+    assert manager.executor.method_calls == [
+        mock.call.press("a"),
+        mock.call.release("a"),
+        mock.call.press("b"),
+        mock.call.release("b"),
+    ]
+
+
+def test_unknown_codes_are_printed():
+    from g13lib.input_manager import InputManager
+
+    manager = InputManager()
+    manager.executor = mock.MagicMock()
+    manager.set_dispatch(manager.compile_dispatch())
+
+    with mock.patch("blinker.signal") as signal:
+        asyncio.run(manager.handle_keystroke("G99_PRESSED"))
+    signal.return_value.send.assert_called_once_with("G99_PRESSED")
+    assert manager.executor.method_calls == []
@@ -0,0 +1,62 @@
+import unittest.mock as mock
+
+import pytest
+from PIL import Image, ImageDraw, ImageFont
+
+import g13lib.lcd.fonts
+from g13lib.lcd.fonts import FONT_DIR, load_font_file
+
+SPLEEN = FONT_DIR / "spleen-5x8.bdf"
+
+
+def test_matches_pil_rendering(tmp_path):
+    font = load_font_file(SPLEEN, tmp_path)
+    pil_font = ImageFont.load(str(FONT_DIR / "spleen-5x8.pil"))
+    text = "Hello, World! gjpqy_|{}~ 0123456789"
+
+    expected = Image.new("1", (160, 9), 1)
+    ImageDraw.Draw(expected).text((0, 0), text, font=pil_font, fill=0)
+    actual = Image.new("1", (160, 9), 1)
+    ImageDraw.Draw(actual).bitmap((0, 0), font.render(text), fill=0)
+
+    assert actual.tobytes() == expected.tobytes()
+    assert font.text_width(text) == 5 * len(text)
+
+
+def test_column_layout(tmp_path):
+    font = load_font_file(SPLEEN, tmp_path)
+    # "|" is one full-height column in the middle of its cell
+    assert font.bands == 1
+    assert font.columns("|") == b"\x00\x00\xff\x00\x00"
+    # unknown characters use the default glyph (space)
+    assert font.columns("\U0001f600") == font.columns(" ")
+
+
+def test_cached_by_source_hash(tmp_path):
+    load_font_file(SPLEEN, tmp_path)
+    (cached,) = tmp_path.iterdir()
+    assert cached.name.startswith("spleen-5x8-")
+
+    with mock.patch.object(g13lib.lcd.fonts, "compile_bdf") as compile_bdf:
+        font = load_font_file(SPLEEN, tmp_path)
+    compile_bdf.assert_not_called()
+    assert font.height == 8
+
+    # a different source compiles to a different cache file
+    changed = tmp_path / "spleen-5x8.bdf"
+    changed.write_bytes(SPLEEN.read_bytes().replace(b"Spleen 5x8", b"Spleen 5x9"))
+    load_font_file(changed, tmp_path / "cache")
+    assert next((tmp_path / "cache").iterdir()).name != cached.name
+
+
+@pytest.mark.parametrize("length", [0, 3, 17, 100, -1])
+def test_truncated_cache_is_recompiled(tmp_path, length):
+    load_font_file(SPLEEN, tmp_path)
+    (cached,) = tmp_path.iterdir()
+    data = cached.read_bytes()
+    cached.write_bytes(data[:length])
+
+    font = load_font_file(SPLEEN, tmp_path)
+    assert font.columns("|") == b"\x00\x00\xff\x00\x00"
+    # and the good copy's cached again
+    assert cached.read_bytes() == data
@@ -0,0 +1,237 @@
+import asyncio
+import unittest.mock as mock
+
+import pytest
+
+import g13lib.device.keycodes
+from g13lib.async_help import Scheduler, VirtualClock
+from g13lib.dispatch import MappingError, compile_mapping
+from g13lib.gestures import GestureDetector, parse_gesture
+
+
+def detector(*gestures):
+    clock = VirtualClock()
+    events = []
+    gesture_detector = GestureDetector(events.append, Scheduler(clock))
+    gesture_detector.configure(gestures)
+
+    def key(code: str, at: float | None = None):
+        """Send a key event at a virtual time, running any timers due before it."""
+        if at is not None:
+            asyncio.run(gesture_detector.scheduler.run(until=at))
+        name, _, action = code.rpartition("_")
+        key_id = g13lib.device.keycodes.key_ids[name]
+        gesture_detector.key_event(name, key_id, action == "PRESSED")
+
+    return gesture_detector, key, events
+
+
+def test_parse_gesture():
+    assert parse_gesture("G1") is None
+    assert parse_gesture("G2+G1") == "G1+G2"
+    assert parse_gesture("G5:hold") == "G5:hold"
+    with pytest.raises(ValueError):
+        parse_gesture("G1+G1")
+    with pytest.raises(ValueError):
+        parse_gesture("G5:squeeze")
+
+
+def test_chord():
+    gestures, key, events = detector("G1+G2")
+    key("G1_PRESSED", 0.0)
+    key("G2_PRESSED", 0.02)
+    key("G1_RELEASED", 0.1)
+    key("G2_RELEASED", 0.12)
+    assert events == ["G1+G2_PRESSED", "G1+G2_RELEASED"]
+
+
+def test_chord_window_closes():
+    gestures, key, events = detector("G1+G2")
+    key("G1_PRESSED", 0.0)
+    assert events == []
+    key("G2_PRESSED", 0.2)
+    key("G2_RELEASED", 0.3)
+    assert events == ["G1_PRESSED", "G2_PRESSED", "G2_RELEASED"]
+
+
+def test_chord_key_released_in_the_window():
+    gestures, key, events = detector("G1+G2")
+    key("G1_PRESSED", 0.0)
+    key("G1_RELEASED", 0.01)
+    assert events == ["G1_PRESSED", "G1_RELEASED"]
+
+
+def test_larger_chord_waits_for_the_window():
+    gestures, key, events = detector("G1+G2", "G1+G2+G3")
+    key("G1_PRESSED", 0.0)
+    key("G2_PRESSED", 0.01)
+    assert events == []
+    key("G3_PRESSED", 0.02)
+    assert events == ["G1+G2+G3_PRESSED"]
+
+    gestures, key, events = detector("G1+G2", "G1+G2+G3")
+    key("G1_PRESSED", 0.0)
+    key("G2_PRESSED", 0.01)
+    asyncio.run(gestures.scheduler.run(until=0.1))
+    assert events == ["G1+G2_PRESSED"]
+
+
+def test_other_presses_wait_for_held_back_keys():
+    gestures, key, events = detector("G1+G2", "G5:hold")
+    key("G1_PRESSED", 0.0)
+    key("G5_PRESSED", 0.01)
+    key("G5_RELEASED", 0.02)
+    assert events == ["G1_PRESSED", "G5_PRESSED", "G5_RELEASED"]
+
+    gestures, key, events = detector("G1+G2", "G1+G2+G3")
+    key("G1_PRESSED", 0.0)
+    key("G2_PRESSED", 0.01)
+    # not part of a chord with G1 and G2, so the chord that's down goes first
+    key("G4_PRESSED", 0.02)
+    assert events == ["G1+G2_PRESSED", "G4_PRESSED"]
+
+
+def test_tap_and_hold():
+    gestures, key, events = detector("G5:hold")
+    key("G5_PRESSED", 0.0)
+    key("G5_RELEASED", 0.1)
+    # a tap falls back to the key's own binding
+    assert events == ["G5_PRESSED", "G5_RELEASED"]
+    events.clear()
+
+    key("G5_PRESSED", 1.0)
+    asyncio.run(gestures.scheduler.run(until=1.5))
+    assert events == ["G5:hold_PRESSED"]
+    key("G5_RELEASED", 2.0)
+    assert events == ["G5:hold_PRESSED", "G5:hold_RELEASED"]
+
+
+def test_double_tap():
+    gestures, key, events = detector("G5:tap", "G5:double_tap")
+    key("G5_PRESSED", 0.0)
+    key("G5_RELEASED", 0.05)
+    key("G5_PRESSED", 0.1)
+    key("G5_RELEASED", 0.15)
+    assert events == ["G5:double_tap_PRESSED", "G5:double_tap_RELEASED"]
+    events.clear()
+
+    key("G5_PRESSED", 1.0)
+    key("G5_RELEASED", 1.05)
+    assert events == []
+    asyncio.run(gestures.scheduler.run(until=1.5))
+    assert events == ["G5:tap_PRESSED", "G5:tap_RELEASED"]
+
+
+def test_unwatched_keys():
+    gestures, key, events = detector("G1+G2", "G5:hold")
+    key_ids = g13lib.device.keycodes.key_ids
+    assert gestures.watched == (1 << key_ids["G1"]) | (1 << key_ids["G2"]) | (
+        1 << key_ids["G5"]
+    )
+    assert not gestures.watched >> key_ids["G3"] & 1
+
+
+def test_compile_gestures():
+    manager = mock.MagicMock()
+    table = compile_mapping(manager, {"G2+G1": "a", "G5:hold": "b", "G5": "c"})
+    assert set(table.gestures) == {"G1+G2", "G5:hold"}
+    with pytest.raises(MappingError):
+        compile_mapping(manager, {"G5:squeeze": "a"})
+
+
+def test_input_manager_dispatches_gestures():
+    from g13lib.input_manager import InputManager
+
+    class ChordProfile(InputManager):
+        direct_mapping = {"G1": "a", "G2": "b", "G3": "c", "G1+G2": ("x",)}
+        scheduler = Scheduler(VirtualClock())
+
+    manager = ChordProfile()
+    manager.executor = mock.MagicMock()
+    manager.set_dispatch(manager.compile_dispatch())
+
+    async def run():
+        # not part of a gesture, so straight through
+        await manager.handle_keystroke("G3_PRESSED")
+        assert manager.executor.method_calls == [mock.call.press("c")]
+        await manager.handle_keystroke("G1_PRESSED")
+        await manager.handle_keystroke("G2_PRESSED")
+        await manager.handle_keystroke("G2_RELEASED")
+        await manager.handle_keystroke("G1_RELEASED")
+        await manager.handle_keystroke("G3_RELEASED")
+
+    asyncio.run(run())
+
+    assert manager.executor.method_calls == [
+        mock.call.press("c"),
+        mock.call.chord(("x",)),
+        mock.call.release("c"),
+    ]
+    # timed on the manager's own scheduler
+    assert manager.gestures.scheduler is manager.scheduler
+
+
+def test_unwatched_press_waits_for_held_back_chord_keys():
+    from g13lib.input_manager import InputManager
+
+    class ChordProfile(InputManager):
+        direct_mapping = {"G1": "a", "G2": "b", "G3": "c", "G1+G2": ("x",)}
+        scheduler = Scheduler(VirtualClock())
+
+    manager = ChordProfile()
+    manager.executor = mock.MagicMock()
+    manager.set_dispatch(manager.compile_dispatch())
+
+    async def run():
+        await manager.handle_keystroke("G1_PRESSED")
+        await manager.handle_keystroke("G3_PRESSED")
+
+    asyncio.run(run())
+
+    # G1 can still modify G3
+    assert manager.executor.method_calls == [mock.call.press("a"), mock.call.press("c")]
+
+
+def test_bank_switch_releases_held_gestures():
+    import pynput
+
+    from g13lib.input_manager import InputManager
+
+    shift = pynput.keyboard.Key.shift
+
+    class GestureProfile(InputManager):
+        direct_mapping = {"G5": "a", "G5:hold": shift, "G1+G2": "x"}
+        mapping_banks = {"M2": {"G3+G4": "y"}}
+        scheduler = Scheduler(VirtualClock())
+
+    manager = GestureProfile()
+    manager.executor = mock.MagicMock()
+    manager.set_dispatch(manager.compile_dispatch())
+
+    async def run():
+        await manager.handle_keystroke("G5_PRESSED")
+        await manager.scheduler.run(until=manager.scheduler.clock.now() + 0.4)
+        await manager.handle_keystroke("G1_PRESSED")
+        await manager.handle_keystroke("G2_PRESSED")
+        # M2 adds a gesture, so the detector starts afresh
+        with mock.patch("blinker.signal"):
+            await manager.handle_keystroke("M2_PRESSED")
+        assert manager.executor.method_calls == [
+            mock.call.press(shift),
+            mock.call.press("x"),
+            mock.call.release(shift),
+            mock.call.release("x"),
+        ]
+        # the keys' releases went with the gestures
+        for code in ["G2_RELEASED", "G1_RELEASED", "G5_RELEASED", "M2_RELEASED"]:
+            await manager.handle_keystroke(code)
+        # and they work as usual afterwards
+        await manager.handle_keystroke("G5_PRESSED")
+        await manager.handle_keystroke("G5_RELEASED")
+
+    asyncio.run(run())
+
+    assert manager.executor.method_calls[4:] == [
+        mock.call.press("a"),
+        mock.call.release("a"),
+    ]
@@ -0,0 +1,75 @@
+import asyncio
+import sys
+import unittest.mock as mock
+
+import pytest
+
+from g13lib.monitors.junit import JunitWatcher, ResultSummary, read_summary
+
+RESULTS = (
+    '<?xml version="1.0" encoding="utf-8"?><testsuites name="pytest tests">'
+    '<testsuite name="pytest" errors="1" failures="2" skipped="3" tests="40">'
+)
+CASE = '<testcase classname="tests.test_x" name="test_{}" time="0.001" />'
+
+
+def write_results(path, cases=10, finished=True):
+    body = "".join(CASE.format(i) for i in range(cases))
+    tail = "</testsuite></testsuites>" if finished else ""
+    path.write_text(RESULTS + body + tail)
+
+
+def test_read_summary(tmp_path):
+    path = tmp_path / "results.xml"
+    write_results(path)
+    assert read_summary(path) == ResultSummary(tests=40, failures=2, errors=1, skipped=3)
+
+
+def test_read_summary_stops_at_summary(tmp_path):
+    path = tmp_path / "results.xml"
+    # cut off mid-test case: the summary is already known
+    write_results(path, cases=1000, finished=False)
+    path.write_text(path.read_text()[:-20])
+    assert read_summary(path).tests == 40
+
+    # cut off before the summary: try again later
+    path.write_text(RESULTS[:60])
+    assert read_summary(path) is None
+    assert read_summary(tmp_path / "missing.xml") is None
+
+
+def test_polling_watcher(tmp_path):
+    callback = mock.Mock()
+    watcher = JunitWatcher([tmp_path], callback, use_inotify=False)
+    watcher.resume()
+    callback.assert_not_called()
+
+    write_results(tmp_path / "a.xml")
+    (tmp_path / "notes.txt").write_text("not results")
+    watcher.poll()
+    callback.assert_called_once_with(tmp_path / "a.xml", read_summary(tmp_path / "a.xml"))
+
+    # unchanged files aren't reported again
+    watcher.poll()
+    assert callback.call_count == 1
+    watcher.suspend()
+    assert watcher._timer.suspended
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="needs inotify")
+def test_inotify_watcher(tmp_path):
+    path = tmp_path / "results.xml"
+
+    async def run():
+        reported = asyncio.Event()
+        watcher = JunitWatcher([path], lambda *args: reported.set(), use_inotify=True)
+        watcher.resume()
+        assert watcher._inotify is not None
+        assert watcher._timer.suspended
+
+        write_results(path)
+        await asyncio.wait_for(reported.wait(), 1)
+        watcher.suspend()
+        assert watcher._inotify is None
+
+    asyncio.run(run())
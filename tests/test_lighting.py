@@ -0,0 +1,82 @@
+import asyncio
+import unittest.mock as mock
+
+import pytest
+
+from g13lib.device.g13_output import G13DeviceOutputManager
+from g13lib.device.g13_usb_device import G13USBDevice
+from g13lib.lighting import Flash, LightingEngine, Pulse, parse_colour
+
+
+def test_parse_colour():
+    assert parse_colour("#ff8000") == (255, 128, 0)
+    assert parse_colour([1, 2, 3]) == (1, 2, 3)
+    for bad in ("ff8000", "#ggg000", [1, 2], [1, 2, 256], [1.0, 2, 3]):
+        with pytest.raises(ValueError):
+            parse_colour(bad)
+
+
+def test_engine_fades_and_plays_effects():
+    engine = LightingEngine()
+    # nothing to show until a colour is set
+    assert engine.step(0.0) is None
+
+    engine.set_base((0, 0, 0))
+    assert engine.step(0.0) == (0, 0, 0)
+
+    engine.set_base((200, 100, 0), fade_ms=100)
+    assert engine.step(0.05) == (100, 50, 0)
+    assert engine.step(0.1) == (200, 100, 0)
+
+    engine.play(Flash((0, 0, 255), duration_s=0.2))
+    assert engine.step(0.2) == (0, 0, 255)
+    assert engine.step(0.4) == (200, 100, 0)
+
+    engine.play(Pulse((0, 0, 0), period_s=1.0))
+    assert engine.step(0.65) == (100, 50, 0)
+    assert engine.step(0.9) == (0, 0, 0)
+    assert engine.step(1.5) == (200, 100, 0)
+    assert not engine.effects
+
+
+def test_one_control_transfer_per_frame():
+    usb_device = mock.MagicMock()
+    output_manager = G13DeviceOutputManager(usb_device)
+    output_manager.lighting.set_base((10, 20, 30))
+
+    output_manager.led_on(0)
+    output_manager.led_on(1)
+    output_manager.led_off(1)
+    output_manager.flush_lighting(0.0)
+    # the LEDs go first, once, and the backlight waits for the next frame
+    usb_device.update_leds.assert_called_once_with([1, 0, 0, 0])
+    usb_device.set_backlight.assert_not_called()
+
+    output_manager.flush_lighting(0.1)
+    usb_device.set_backlight.assert_called_once_with(10, 20, 30)
+
+    # nothing's changed, so nothing's sent
+    output_manager.led_on(0)
+    output_manager.flush_lighting(0.2)
+    assert usb_device.update_leds.call_count == 1
+    assert usb_device.set_backlight.call_count == 1
+    asyncio.run(output_manager.stop_tasks())
+
+
+def test_device_skips_acknowledged_state():
+    device = G13USBDevice.__new__(G13USBDevice)
+    device.usb_device = mock.MagicMock()
+
+    device._update_leds([1, 0, 1, 0])
+    device._update_leds([1, 0, 1, 0])
+    device._set_backlight(1, 2, 3)
+    device._set_backlight(1, 2, 3)
+    assert device.usb_device.ctrl_transfer.call_count == 2
+
+    # a failed transfer isn't acknowledged, so it's tried again
+    device.usb_device.ctrl_transfer.side_effect = OSError
+    with pytest.raises(OSError):
+        device._update_leds([0, 0, 0, 0])
+    device.usb_device.ctrl_transfer.side_effect = None
+    device._update_leds([0, 0, 0, 0])
+    assert device.usb_device.ctrl_transfer.call_count == 4
@@ -0,0 +1,54 @@
+import pynput
+
+from g13lib.macros import MacroRecorder, MacroStore, decode_steps, encode_steps
+from g13lib.output_executor import DELAY, PRESS, RELEASE
+
+
+def test_recorder_captures_timing():
+    now = [0.0]
+    recorder = MacroRecorder(clock=lambda: now[0])
+    recorder.start()
+
+    recorder.record(PRESS, "a")
+    now[0] += 0.0001  # too short to be worth a delay step
+    recorder.record(RELEASE, "a")
+    now[0] += 0.25
+    recorder.record(PRESS, "b")
+
+    steps = recorder.stop()
+    assert recorder.mode == "binding"
+    # "b" was never released, so the recording releases it
+    assert steps == [
+        (PRESS, "a"),
+        (RELEASE, "a"),
+        (DELAY, 0.25),
+        (PRESS, "b"),
+        (RELEASE, "b"),
+    ]
+    assert recorder.take() == steps
+    assert recorder.mode == "idle"
+
+
+def test_recorder_ignores_events_when_not_recording():
+    recorder = MacroRecorder()
+    recorder.record(PRESS, "a")
+    recorder.start()
+    assert recorder.stop() == []
+    assert recorder.mode == "idle"
+
+
+def test_store_round_trip(tmp_path):
+    steps = [
+        (PRESS, pynput.keyboard.Key.shift),
+        (PRESS, "+"),
+        (DELAY, 0.0125),
+        (RELEASE, "+"),
+        (RELEASE, pynput.keyboard.Key.shift),
+    ]
+    assert decode_steps(encode_steps(steps)) == steps
+
+    store = MacroStore(tmp_path / "macros.json")
+    assert store.load("Code") == {}
+    store.save("Code", {"G4": steps})
+    store.save("Other", {})
+    assert store.load("Code") == {"G4": steps}
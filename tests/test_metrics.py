@@ -0,0 +1,56 @@
+import asyncio
+import json
+import unittest.mock as mock
+
+import pytest
+
+from g13lib.device.g13_output import G13DeviceOutputManager
+from g13lib.metrics import MetricsExporter, Registry
+from g13lib.render_fb import LCDCompositor
+
+
+def test_registry_snapshot():
+    registry = Registry()
+    registry.counter("frames").inc()
+    registry.counter("frames").inc(2)
+    registry.gauge("depth").set(4)
+    registry.gauge("live", lambda: 7)
+    timings = registry.histogram("time")
+    for ms in range(1, 101):
+        timings.observe(ms / 1000)
+
+    snapshot = registry.snapshot()
+    assert snapshot["frames"] == 3
+    assert snapshot["depth"] == 4
+    assert snapshot["live"] == 7
+    assert snapshot["time"]["count"] == 100
+    assert snapshot["time"]["p50_ms"] == pytest.approx(51)
+    assert snapshot["time"]["max_ms"] == pytest.approx(100)
+
+    with pytest.raises(TypeError):
+        registry.histogram("frames")
+
+
+def test_export_to_file(tmp_path):
+    registry = Registry()
+    registry.counter("frames").inc()
+    path = tmp_path / "metrics.json"
+    exporter = MetricsExporter(str(path), registry)
+    exporter.export()
+    assert json.loads(path.read_text())["metrics"] == {"frames": 1}
+    asyncio.run(exporter.stop_tasks())
+
+
+def test_hud_overlay():
+    output_manager = G13DeviceOutputManager(mock.MagicMock())
+    output_manager.set_compositor(LCDCompositor())
+    blank = output_manager.compositor.render(output_manager.overlays)
+
+    output_manager.toggle_hud()
+    assert output_manager.hud.visible
+    assert output_manager.compositor.render(output_manager.overlays) != blank
+
+    output_manager.toggle_hud()
+    assert not output_manager.hud.visible
+    assert output_manager.compositor.render(output_manager.overlays) == blank
+    asyncio.run(output_manager.stop_tasks())
@@ -0,0 +1,86 @@
+import asyncio
+import unittest.mock as mock
+
+from g13lib.output_executor import (
+    DELAY,
+    PRESS,
+    RELEASE,
+    OutputExecutor,
+    compile_macro,
+)
+
+
+def test_compile_macro():
+    steps = compile_macro(["a", ("cmd", "c"), 5])
+    assert steps == [
+        (PRESS, "a"),
+        (RELEASE, "a"),
+        (PRESS, "cmd"),
+        (PRESS, "c"),
+        (RELEASE, "c"),
+        (RELEASE, "cmd"),
+        (DELAY, 0.005),
+    ]
+
+
+def test_macro_does_not_block_loop():
+    keyboard = mock.MagicMock()
+    executor = OutputExecutor(keyboard)
+    ticks = []
+
+    async def ticker():
+        for _ in range(5):
+            ticks.append(keyboard.method_calls.copy())
+            await asyncio.sleep(0.005)
+
+    async def run():
+        executor.submit(compile_macro(["a", 50, "b"]))
+        await asyncio.gather(ticker(), executor.join())
+
+    asyncio.run(run())
+
+    # the ticker kept running while the macro waited between "a" and "b"
+    assert len(ticks) == 5
+    assert ticks[-1] == [mock.call.press("a"), mock.call.release("a")]
+    assert keyboard.method_calls[-2:] == [mock.call.press("b"), mock.call.release("b")]
+
+
+def test_keys_queue_behind_macro():
+    keyboard = mock.MagicMock()
+    executor = OutputExecutor(keyboard)
+
+    async def run():
+        executor.submit(compile_macro(["a", 10]))
+        executor.press("x")
+        executor.release("x")
+        await executor.join()
+
+    asyncio.run(run())
+
+    assert keyboard.method_calls == [
+        mock.call.press("a"),
+        mock.call.release("a"),
+        mock.call.press("x"),
+        mock.call.release("x"),
+    ]
+
+
+def test_new_macro_cancels_running_macro():
+    keyboard = mock.MagicMock()
+    executor = OutputExecutor(keyboard)
+
+    async def run():
+        executor.submit([(PRESS, "shift"), (DELAY, 1.0), (RELEASE, "shift")])
+        await asyncio.sleep(0.01)
+        executor.submit(compile_macro("b"))
+        await executor.join()
+
+    asyncio.run(run())
+
+    # the held shift is released when the first macro is cancelled
+    assert keyboard.method_calls == [
+        mock.call.press("shift"),
+        mock.call.release("shift"),
+        mock.call.press("b"),
+        mock.call.release("b"),
+    ]
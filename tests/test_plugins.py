@@ -0,0 +1,65 @@
+import unittest.mock as mock
+
+import blinker
+
+from g13lib.plugins import PluginRegistry
+
+
+class FakeManager:
+    active = False
+
+    def __init__(self, app_name: str, calls: list):
+        self.app_name = app_name
+        self.calls = calls
+
+    def activate(self):
+        self.active = True
+        self.calls.append(("activate", self.app_name))
+
+    def deactivate(self, release_focus: bool = True):
+        self.active = False
+        self.calls.append(("deactivate", self.app_name, release_focus))
+
+
+def test_app_switching():
+    calls = []
+    registry = PluginRegistry({})
+    code, resolve = FakeManager("Code", calls), FakeManager("Resolve", calls)
+    registry.add(code)
+    registry.add(resolve)
+
+    blinker.signal("app_changed").send("Code")
+    blinker.signal("app_changed").send("Resolve")
+    blinker.signal("app_changed").send("Finder")
+    blinker.signal("app_changed").send("Finder")
+
+    assert calls == [
+        ("activate", "Code"),
+        # straight to another app, without going through the general manager
+        ("deactivate", "Code", False),
+        ("activate", "Resolve"),
+        ("deactivate", "Resolve", True),
+    ]
+    assert registry.active is None
+
+
+def test_adding_and_removing_the_focused_apps_manager():
+    calls = []
+    registry = PluginRegistry({})
+    blinker.signal("app_changed").send("Notes")
+    notes = FakeManager("Notes", calls)
+    registry.add(notes)
+    assert registry.active is notes
+    registry.remove("Notes")
+
+    assert calls == [("activate", "Notes"), ("deactivate", "Notes", True)]
+
+
+def test_plugins_load_when_focused():
+    manager = FakeManager("Code", [])
+    with mock.patch("g13lib.plugins.load_class", return_value=lambda: manager):
+        registry = PluginRegistry({"Code": "g13lib.apps.vscode:VSCodeInputManager"})
+        blinker.signal("app_changed").send("Code")
+
+    assert registry.managers == {"Code": manager}
+    assert manager.active
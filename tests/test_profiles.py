@@ -0,0 +1,90 @@
+import asyncio
+import unittest.mock as mock
+
+import pynput
+import pytest
+
+from g13lib.device.keycodes import event_slots
+from g13lib.plugins import PluginRegistry
+from g13lib.profiles import (
+    ProfileError,
+    ProfileWatcher,
+    build_mapping,
+    parse_binding,
+    read_profile,
+)
+
+
+class FakeProfile:
+    direct_mapping = {"G1": "a", "G2": "b"}
+
+    def do_thing(self, action, key_code):
+        pass
+
+
+def test_parse_binding():
+    Key = pynput.keyboard.Key
+    assert parse_binding("a", FakeProfile) == "a"
+    assert parse_binding("space", FakeProfile) == Key.space
+    assert parse_binding("cmd+shift+z", FakeProfile) == (Key.cmd, Key.shift, "z")
+    assert parse_binding("cmd+-", FakeProfile) == (Key.cmd, "-")
+    assert parse_binding(["cmd+a", 50, "x"], FakeProfile) == [(Key.cmd, "a"), 50, "x"]
+    assert parse_binding({"call": "do_thing"}, FakeProfile) is FakeProfile.do_thing
+
+
+@pytest.mark.parametrize(
+    "value",
+    ["nosuchkey", ["a", 1.5], {"call": "missing"}, {"call": "os:nope"}, 5],
+)
+def test_parse_bad_binding(value):
+    with pytest.raises(ProfileError):
+        parse_binding(value, FakeProfile)
+
+
+def test_read_profile(tmp_path):
+    path = tmp_path / "app.toml"
+    path.write_text('app = "Preview"\n[keys]\nG2 = "left"\nL1 = ["a", 10]\n')
+    app, keys, banks, backlight = read_profile(path)
+    assert app == "Preview"
+    assert banks == {}
+    assert backlight is None
+
+    mapping = build_mapping(keys, FakeProfile())
+    assert mapping == {"G1": "a", "G2": pynput.keyboard.Key.left, "L1": ["a", 10]}
+
+    path.write_text('app = "Preview"\nbacklight = "#ff8000"\n')
+    assert read_profile(path)[3] == (255, 128, 0)
+
+    path.write_text("[keys]\nG1 = 'a'\n")
+    with pytest.raises(ProfileError):
+        read_profile(path)
+
+    path.write_text('app = "Preview"\nbacklight = "orange"\n')
+    with pytest.raises(ProfileError):
+        read_profile(path)
+
+
+def test_macro_recorded_while_reloading_survives(tmp_path):
+    path = tmp_path / "preview.toml"
+    path.write_text('app = "Preview"\n[keys]\nG2 = "left"\n')
+    watcher = ProfileWatcher(PluginRegistry({}), tmp_path)
+    asyncio.run(watcher.load(path, 1.0))
+    manager = watcher.registry.get("Preview")
+    manager.executor = mock.MagicMock()
+    steps = [(0, "x")]
+
+    def compile_and_record(keys, banks, manager):
+        compiled = ProfileWatcher.compile(keys, banks, manager)
+        # the macro's bound after the new tables were compiled without it
+        with (
+            mock.patch.object(manager.macro_recorder, "take", return_value=steps),
+            mock.patch("blinker.signal"),
+        ):
+            manager.bind_recorded_macro("G2")
+        return compiled
+
+    with mock.patch.object(watcher, "compile", compile_and_record):
+        asyncio.run(watcher.load(path, 2.0))
+
+    manager._dispatch[event_slots["G2_PRESSED"]]()
+    manager.executor.submit.assert_called_once_with(steps)
@@ -0,0 +1,115 @@
+import asyncio
+import json
+import socket
+import types
+import unittest.mock as mock
+
+import blinker
+
+from g13lib.monitors.test_progress import ProgressServer
+from g13lib.pytest_progress import ProgressReporter
+
+
+def report(nodeid, when, outcome):
+    return types.SimpleNamespace(
+        nodeid=nodeid,
+        when=when,
+        passed=outcome == "passed",
+        failed=outcome == "failed",
+        skipped=outcome == "skipped",
+    )
+
+
+def run_test(reporter, nodeid, outcome):
+    reporter.pytest_runtest_logreport(report(nodeid, "setup", "passed"))
+    reporter.pytest_runtest_logreport(report(nodeid, "call", outcome))
+    reporter.pytest_runtest_logreport(report(nodeid, "teardown", "passed"))
+
+
+def test_progress_reaches_status_line(tmp_path):
+    path = str(tmp_path / "progress.sock")
+    printed, statuses = [], []
+
+    def on_print(line):
+        printed.append(line)
+
+    def on_status(status):
+        statuses.append(status)
+
+    async def run():
+        server = ProgressServer(path)
+        server.resume()
+
+        reporter = ProgressReporter(path)
+        reporter.clock = mock.Mock(return_value=0.0)
+        reporter.pytest_collection_finish(types.SimpleNamespace(items=[None] * 100))
+        with mock.patch.object(reporter, "send", wraps=reporter.send) as send:
+            # a fast burst of tests is batched into a single update
+            for i in range(50):
+                run_test(reporter, f"tests/test_a.py::test_{i}", "passed")
+            run_test(reporter, "tests/test_a.py::test_broken", "failed")
+            send.assert_not_called()
+
+            reporter.clock.return_value = 1.0
+            run_test(reporter, "tests/test_a.py::test_skip", "skipped")
+            send.assert_called_once()
+        server.receive()
+        server.refresh()
+
+        # later failures are reported too, once each
+        run_test(reporter, "tests/test_b.py::test_also_broken", "failed")
+        reporter.pytest_sessionfinish(None)
+        server.receive()
+        server.refresh()
+        await server.stop_tasks()
+
+    with (
+        blinker.signal("g13_print").connected_to(on_print),
+        blinker.signal("g13_set_status").connected_to(on_status),
+    ):
+        asyncio.run(run())
+
+    assert printed == ["FAIL test_broken", "FAIL test_also_broken"]
+    assert statuses == ["50 ok 1 fail 52/100", "Done: 50 ok 2 fail"]
+
+
+def test_results_favour_failures():
+    reporter = ProgressReporter("/nonexistent")
+    for i in range(150):
+        run_test(reporter, f"test_{i}", "failed" if i == 3 else "passed")
+    run_test(reporter, "test_skip", "skipped")
+    results = json.loads(reporter.message())["results"]
+    assert results == [["test_3", "failed"], ["test_skip", "skipped"]]
+    assert json.loads(reporter.message())["results"] == []
+    reporter.sock.close()
+
+
+def test_bad_messages_are_dropped(tmp_path):
+    path = str(tmp_path / "progress.sock")
+    reporter = ProgressReporter(path)
+    good = reporter.message()
+    reporter.sock.close()
+
+    async def run():
+        server = ProgressServer(path)
+        sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        for data in [
+            b"not json",
+            b"{}",
+            b"[]",
+            b"null",
+            good.replace(b'"total": 0', b'"total": "0"'),
+            good.replace(b'"results": []', b'"results": [["x"]]'),
+            good,
+            b'{"run": "x"}',
+        ]:
+            sender.sendto(data, path)
+        sender.close()
+        with mock.patch("g13lib.monitors.test_progress.logger") as logger:
+            server.resume()
+        await server.stop_tasks()
+        return server, logger
+
+    server, logger = asyncio.run(run())
+    assert logger.warning.call_count == 7
+    assert server.progress == json.loads(good)
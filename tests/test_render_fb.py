@@ -0,0 +1,53 @@
+import unittest.mock as mock
+
+from PIL import Image, ImageDraw
+
+from g13lib.lcd.images import DecayingImage, SimpleImageLayer
+from g13lib.lcd.terminal import LogEmulator
+from g13lib.render_fb import LCDCompositor, Sprite
+
+
+def test_sprite_mask():
+    image = Image.new("RGBA", (4, 1), (0, 0, 0, 255))
+    image.putpixel((1, 0), (0, 0, 0, 100))
+    image.putpixel((2, 0), (0, 0, 0, 0))
+    sprite = Sprite(image)
+    assert sprite.image.mode == "1" and sprite.mask.mode == "1"
+    assert [bool(sprite.mask.getpixel((x, 0))) for x in range(4)] == [1, 0, 0, 1]
+
+    framebuffer = Image.new("1", (4, 1), 1)
+    sprite.draw(framebuffer, (0, 0))
+    assert [bool(framebuffer.getpixel((x, 0))) for x in range(4)] == [0, 1, 1, 0]
+
+
+def test_static_layers_are_flattened():
+    terminal = LogEmulator()
+    icon = Image.new("1", (8, 8), 0)
+    ImageDraw.Draw(icon).point((0, 0), 1)
+    image_layer = SimpleImageLayer(icon, (64, 0))
+    decaying = DecayingImage(Image.new("RGB", (8, 8), "white"), (100, 0))
+    compositor = LCDCompositor(terminal, image_layer, decaying)
+    compositor.attach()
+
+    with mock.patch.object(
+        terminal, "composite", wraps=terminal.composite
+    ) as terminal_drawn:
+        first = compositor.render()
+        compositor.render()
+        # the dynamic layer's drawn every frame, the static ones only once
+        terminal_drawn.assert_called_once()
+        assert decaying.current_ticks == 2
+        assert first.getpixel((64, 0)) and not first.getpixel((65, 0))
+
+        terminal.output("hello")
+        changed = compositor.render()
+        assert terminal_drawn.call_count == 2
+        assert changed != first
+
+    # the same frame as drawing every layer from scratch
+    expected = Image.new("1", (160, 48), 1)
+    for layer in (terminal, image_layer):
+        image, position = layer.render()
+        expected.paste(image, position)
+    decaying.current_ticks = decaying.decay_ticks
+    assert compositor.render() == expected
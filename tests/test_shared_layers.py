@@ -0,0 +1,123 @@
+import asyncio
+import os
+import unittest.mock as mock
+import uuid
+
+import blinker
+import pytest
+from PIL import Image, ImageDraw
+
+from g13lib.lcd.shared_layers import (
+    SharedLayer,
+    SharedLayerError,
+    SharedLayerServer,
+    SharedLayerWriter,
+)
+from g13lib.render_fb import LCDCompositor
+
+
+def layer_name():
+    return "t" + uuid.uuid4().hex[:12]
+
+
+def test_writer_and_layer(tmp_path):
+    name = layer_name()
+    with SharedLayerWriter(name, (12, 4), (100, 2), str(tmp_path / "none")) as writer:
+        layer = SharedLayer(name)
+        image, position = layer.render()
+        assert position == (100, 2)
+        # nothing's been drawn, so it's all transparent
+        assert image.getextrema() == ((0, 0), (0, 0))
+
+        drawing = Image.new("1", (12, 4), 0)
+        ImageDraw.Draw(drawing).rectangle((0, 0, 5, 3), fill=1)
+        mask = Image.new("1", (12, 4), 1)
+        ImageDraw.Draw(mask).rectangle((8, 0, 11, 3), fill=0)
+        writer.write(drawing, mask)
+
+        # not decoded again until it's damaged
+        assert layer.render()[0].getpixel((0, 0)) == (0, 0)
+        layer.mark_damaged()
+        image, _ = layer.render()
+        assert image.getpixel((0, 0)) == (255, 255)
+        assert image.getpixel((6, 0)) == (0, 255)
+        assert image.getpixel((9, 0)) == (0, 0)
+
+        # a write in progress isn't trusted
+        writer.generation += 1
+        writer._write_header()
+        layer.mark_damaged()
+        assert layer.render()[0] is image and layer.damaged
+        layer.close()
+
+    with pytest.raises(SharedLayerError):
+        SharedLayerWriter("../etc", path=str(tmp_path / "none"))
+
+
+def test_writer_reports_permission_errors(tmp_path):
+    with SharedLayerWriter(layer_name(), path=str(tmp_path / "none")) as writer:
+        # a daemon that isn't running is fine, but one we can't reach isn't
+        with mock.patch.object(writer, "sock") as sock:
+            sock.sendto.side_effect = PermissionError
+            with pytest.raises(PermissionError):
+                writer.move(1, 1)
+
+
+def test_server_attaches_and_removes_layers(tmp_path):
+    added, removed = [], []
+
+    async def run():
+        server = SharedLayerServer(str(tmp_path / "layers.sock"))
+        # not bound until it starts, once root privileges are dropped
+        assert not os.path.exists(server.path)
+        async with asyncio.TaskGroup() as tg:
+            server.start_tasks(tg)
+            with (
+                blinker.signal("g13_add_overlay").connected_to(added.append),
+                blinker.signal("g13_remove_overlay").connected_to(removed.append),
+            ):
+                name = layer_name()
+                writer = SharedLayerWriter(name, path=server.path)
+                writer.write(Image.new("1", (160, 48), 0))
+                await asyncio.sleep(0.05)
+                assert list(server.layers) == [name]
+                # the layer covers the compositor's white background
+                frame = LCDCompositor().render(added)
+                assert frame.getextrema() == (0, 0)
+
+                writer.close()
+                await asyncio.sleep(0.05)
+                assert not server.layers
+            await server.stop_tasks()
+
+    asyncio.run(run())
+    assert len(added) == 1 and removed == added
+
+
+def test_restarted_writer_replaces_its_crashed_layer(tmp_path):
+    added = []
+
+    async def run():
+        server = SharedLayerServer(str(tmp_path / "layers.sock"))
+        async with asyncio.TaskGroup() as tg:
+            server.start_tasks(tg)
+            with blinker.signal("g13_add_overlay").connected_to(added.append):
+                name = layer_name()
+                crashed = SharedLayerWriter(name, (8, 1), path=server.path)
+                crashed.write(Image.new("1", (8, 1), 1))
+                await asyncio.sleep(0.05)
+                # gone without closing the layer
+                crashed.sock.close()
+                crashed.memory.close()
+
+                writer = SharedLayerWriter(name, (8, 1), path=server.path)
+                writer.write(Image.new("1", (8, 1), 0))
+                await asyncio.sleep(0.05)
+                image, _ = server.layers[name].render()
+                assert image.getpixel((0, 0)) == (0, 255)
+                writer.close()
+                await asyncio.sleep(0.05)
+            await server.stop_tasks()
+
+    asyncio.run(run())
+    assert len(added) == 2
@@ -0,0 +1,104 @@
+import asyncio
+import threading
+import unittest.mock as mock
+
+from PIL import Image
+
+from g13lib.device.g13_output import G13DeviceOutputManager
+from g13lib.lcd.terminal import LogEmulator
+from g13lib.render_fb import LCDCompositor
+
+
+def test_print_flood_renders_once():
+    terminal = LogEmulator()
+    terminal.show()
+    with mock.patch.object(
+        terminal, "_render_buffer_to_image", wraps=terminal._render_buffer_to_image
+    ) as render:
+        for i in range(1000):
+            terminal.output(f"line {i}")
+        render.assert_not_called()
+
+        terminal.render()
+        terminal.render()
+        render.assert_called_once()
+
+    assert len(terminal.buffer) == terminal.scrollback
+    assert terminal.content()[-1].rstrip() == "line 999"
+
+
+def test_scroll_back_through_history():
+    terminal = LogEmulator()
+    terminal.show()
+    for i in range(10):
+        terminal.output(f"line {i}")
+
+    terminal.scroll(3)
+    assert terminal.content()[-1].rstrip() == "line 6"
+
+    # new lines don't move the view while scrolled back
+    terminal.output("line 10")
+    assert terminal.content()[-1].rstrip() == "line 6"
+
+    # can't scroll past either end
+    terminal.scroll(1000)
+    assert terminal.content()[0].strip() == ""
+    terminal.scroll(-1000)
+    assert terminal.content()[-1].rstrip() == "line 10"
+
+
+def test_hidden_terminal_defers_wrapping():
+    output_manager = G13DeviceOutputManager(mock.MagicMock())
+    shown, hidden = LogEmulator(), LogEmulator()
+    output_manager.set_compositor(LCDCompositor(shown))
+    assert shown.visible and not hidden.visible
+
+    with mock.patch.object(hidden, "split_input", wraps=hidden.split_input) as split:
+        for i in range(500):
+            hidden.output(f"line {i}")
+        split.assert_not_called()
+
+        output_manager.set_compositor(LCDCompositor(hidden))
+        assert hidden.visible and not shown.visible
+        assert split.call_count == hidden.scrollback
+    assert isinstance(hidden.render()[0], Image.Image)
+    assert hidden.content()[-1].rstrip() == "line 499"
+    asyncio.run(output_manager.stop_tasks())
+
+
+def test_prints_while_rendering_on_another_thread():
+    terminal = LogEmulator()
+    terminal.show()
+    done = threading.Event()
+
+    def render():
+        while not done.is_set():
+            assert isinstance(terminal.render()[0], Image.Image)
+
+    renderer = threading.Thread(target=render)
+    renderer.start()
+    for i in range(2000):
+        terminal.output(f"line {i}")
+        if i % 100 == 0:
+            terminal.set_status(f"status {i}")
+    done.set()
+    renderer.join()
+
+    assert terminal.content()[-1].rstrip() == "line 1999"
+    # nothing stale was cached
+    assert terminal.render()[0] == terminal._render_buffer_to_image(
+        terminal.content(), terminal.status
+    )
+
+
+def test_parallel_render_tick():
+    usb_device = mock.MagicMock()
+    output_manager = G13DeviceOutputManager(usb_device)
+    output_manager.parallel_render = True
+    terminal = LogEmulator()
+    output_manager.set_compositor(LCDCompositor(terminal))
+    terminal.output("hello")
+
+    asyncio.run(output_manager.lcd_tick())
+    usb_device.setLCD.assert_called_once_with(terminal.render()[0])
+    asyncio.run(output_manager.stop_tasks())
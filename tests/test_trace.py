@@ -0,0 +1,84 @@
+import asyncio
+import unittest.mock as mock
+
+import blinker
+import pytest
+
+from g13lib.device_manager import G13Manager
+from g13lib.trace import RECORD, TraceError, TraceRecorder, read_trace, replay
+
+CENTRED = [1, 0x80, 0x80]
+REPORTS = [
+    bytes(CENTRED + [0b00000001, 0, 0, 0, 0]),  # G1
+    bytes(CENTRED + [0b00010001, 0, 0, 0b01000000, 0]),  # G1, G5, M2
+    bytes([1, 0xC5, 0x20, 0, 0, 0, 0, 0]),  # all released, stick moved
+    bytes(CENTRED + [0, 0, 0, 0, 0]),
+]
+
+
+def write_trace(path, start=100.0, step=0.010):
+    recorder = TraceRecorder(path)
+    for i, report in enumerate(REPORTS):
+        recorder.record(report, start + i * step)
+    recorder.close()
+
+
+def test_round_trip(tmp_path):
+    path = tmp_path / "session.g13trace"
+    write_trace(path)
+    # a second session appends, starting from a zero delta
+    write_trace(path, start=500.0)
+
+    records = list(read_trace(path))
+    assert [report for _, report in records] == REPORTS * 2
+    assert [round(delta, 3) for delta, _ in records] == [0, 0.01, 0.01, 0.01] * 2
+    assert path.stat().st_size == 8 + 8 * RECORD.size
+
+    # a partly written record is ignored
+    with open(path, "ab") as f:
+        f.write(b"\x01\x02")
+    assert len(list(read_trace(path))) == 8
+
+    (tmp_path / "other").write_bytes(b"nope")
+    with pytest.raises(TraceError):
+        list(read_trace(tmp_path / "other"))
+
+
+def replay_events(path, speed):
+    events = []
+
+    async def on_event(event):
+        events.append(event)
+
+    async def run():
+        key, joy = blinker.signal("g13_key"), blinker.signal("g13_joy")
+        with (
+            key.connected_to(on_event),
+            joy.connected_to(on_event),
+        ):
+            manager = G13Manager(g13_usb_device=mock.MagicMock())
+            return await replay(manager, path, speed)
+
+    return asyncio.run(run()), events
+
+
+def test_replay_is_deterministic(tmp_path):
+    path = tmp_path / "session.g13trace"
+    write_trace(path)
+
+    count, events = replay_events(path, None)
+    assert count == len(REPORTS)
+    assert events == [
+        "G1_PRESSED",
+        "G5_PRESSED",
+        "M2_PRESSED",
+        "G1_RELEASED",
+        "G5_RELEASED",
+        "M2_RELEASED",
+        "JOY_X_POS_3",
+        "JOY_Y_POS_3",
+        "JOY_X_ZERO_0",
+        "JOY_Y_ZERO_0",
+    ]
+    # real-time replay gives the same events
+    assert replay_events(path, 10.0)[1] == events
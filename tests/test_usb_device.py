@@ -0,0 +1,47 @@
+import asyncio
+import errno
+import queue
+import threading
+import unittest.mock as mock
+
+import pytest
+import usb.core
+
+from g13lib.device.g13_usb_device import FatalG13USBError, G13USBDevice
+
+
+def make_device(read_results):
+    """A G13USBDevice without its USB thread, reading from a fake device."""
+    device = G13USBDevice.__new__(G13USBDevice)
+    device.read_queue = queue.Queue()
+    device.write_queue = queue.Queue()
+    device._ready = threading.Event()
+    device.READY_RETRY_MS = 0
+    device.usb_device = mock.MagicMock()
+    device.usb_device.read.side_effect = read_results
+    return device
+
+
+def test_ready_after_probe_retries():
+    device = make_device(
+        [
+            usb.core.USBError("I/O error", errno=errno.EIO),
+            usb.core.USBError("Access denied", errno=errno.EACCES),
+            usb.core.USBTimeoutError("Timed out", errno=errno.ETIMEDOUT),
+        ]
+    )
+    device._wait_until_ready()
+    assert device.ready
+    assert device.usb_device.read.call_count == 3
+    asyncio.run(device.wait_ready(0))
+
+
+def test_not_ready_after_too_many_failures():
+    device = make_device(
+        [usb.core.USBError("I/O error", errno=errno.EIO)] * G13USBDevice.READY_ATTEMPTS
+    )
+    with pytest.raises(FatalG13USBError):
+        device._wait_until_ready()
+    assert not device.ready
+    with pytest.raises(FatalG13USBError):
+        asyncio.run(device.wait_ready(0))
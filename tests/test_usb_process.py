@@ -0,0 +1,141 @@
+import asyncio
+import threading
+import unittest.mock as mock
+
+import pytest
+
+from g13lib.device.g13_usb_device import FatalG13USBError, G13USBDevice, G13USBError
+from g13lib.device.usb_process import (
+    BACKLIGHT,
+    FAILED,
+    FRAME_BYTES,
+    LEDS,
+    RESTARTS,
+    STATE,
+    STOP,
+    STOPPED,
+    VALID,
+    G13USBProcess,
+    SharedState,
+    _usb_process_main,
+    serve,
+)
+
+
+@pytest.fixture
+def shared():
+    shared = SharedState.create()
+    yield shared
+    shared.close()
+    shared.memory.unlink()
+
+
+def test_report_ring(shared):
+    child = SharedState.attach(shared.memory.name)
+    for i in range(shared.RING_CAPACITY):
+        assert child.reports.push(bytes([i % 256] * 8), float(i))
+    # full: the newest report is refused, not the oldest overwritten
+    assert not child.reports.push(bytes(8), 0.0)
+    assert len(shared.reports) == shared.RING_CAPACITY
+
+    assert shared.reports.pop() == (0.0, bytes(8))
+    assert shared.reports.pop() == (1.0, bytes([1] * 8))
+    assert child.reports.push(bytes([9] * 8), 9.0)
+    assert len(shared.reports) == shared.RING_CAPACITY - 1
+    child.close()
+
+
+def test_frame_exchange(shared):
+    child = SharedState.attach(shared.memory.name)
+    assert child.frames.take() is None
+
+    shared.frames.publish(bytes([1]) * FRAME_BYTES)
+    shared.frames.publish(bytes([2]) * FRAME_BYTES)
+    # only the latest frame is sent
+    assert child.frames.take() == bytes([2]) * FRAME_BYTES
+    assert child.frames.take() is None
+
+    shared.frames.publish(bytes([3]) * FRAME_BYTES)
+    assert child.frames.take() == bytes([3]) * FRAME_BYTES
+    child.close()
+
+
+def test_serve(shared):
+    device = mock.MagicMock()
+    reports = [[1, 0x80, 0x80, 1, 0, 0, 0, 0], G13USBError("reset"), None]
+
+    def read_data():
+        if reports:
+            return reports.pop(0)
+        shared.set(STOP, 1)
+
+    device._read_data.side_effect = read_data
+    shared.set(LEDS, VALID | 0b0101)
+    shared.set(BACKLIGHT, VALID | 0x102030)
+    shared.frames.publish(bytes(FRAME_BYTES))
+
+    serve(device, shared)
+    device._setLCD.assert_called_once_with(bytes(FRAME_BYTES))
+    # sent again after the device was reset
+    assert device._update_leds.call_args_list == [mock.call([1, 0, 1, 0])] * 2
+    assert device._set_backlight.call_args_list == [mock.call(0x10, 0x20, 0x30)] * 2
+    assert shared.reports.pop()[1] == bytes([1, 0x80, 0x80, 1, 0, 0, 0, 0])
+
+
+def run_child(shared, **patches):
+    with (
+        mock.patch.object(G13USBDevice, "_wait_until_ready"),
+        mock.patch.object(G13USBDevice, "_close"),
+        mock.patch("g13lib.device.usb_process.time.sleep"),
+        mock.patch.multiple(G13USBDevice, **patches),
+    ):
+        child = threading.Thread(
+            target=_usb_process_main, args=(shared.memory.name, 2, 0)
+        )
+        child.start()
+        child.join(5)
+
+
+def test_child_restarts_then_gives_up(shared):
+    run_child(shared, start_usb_device=mock.Mock(side_effect=OSError("gone")))
+    assert shared.get(RESTARTS) == 2
+    assert shared.get(STATE) == FAILED
+
+
+def test_child_recovers(shared):
+    attempts = iter([OSError("not yet"), None])
+
+    def start_usb_device(device, drop_privileges=True):
+        # the child keeps root, so it can open the device again
+        assert not drop_privileges
+        device.usb_device = mock.MagicMock()
+        if error := next(attempts):
+            raise error
+
+    def stop(device):
+        shared.set(STOP, 1)
+
+    with mock.patch("g13lib.device.usb_process.usb.util.dispose_resources") as dispose:
+        run_child(shared, start_usb_device=start_usb_device, _read_data=stop)
+    assert shared.get(RESTARTS) == 1
+    assert shared.get(STATE) == STOPPED
+    # the device that failed was let go of before trying again
+    dispose.assert_called_once()
+
+
+class FailingUSBProcess(G13USBProcess):
+    MAX_RESTARTS = 2
+    RESTART_MS = 1
+
+
+def test_spawned_process_reports_failure():
+    # a real child process, with no G13 (or USB backend) to find
+    process = FailingUSBProcess()
+    try:
+        with pytest.raises(FatalG13USBError):
+            asyncio.run(process.wait_ready(timeout=30))
+        assert process.restarts == 2
+        assert isinstance(process.read_data(), FatalG13USBError)
+    finally:
+        process.close()
+    assert not process.process.is_alive()
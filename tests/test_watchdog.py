@@ -0,0 +1,92 @@
+import asyncio
+import time
+import unittest.mock as mock
+
+import blinker
+
+from g13lib.async_help import Scheduler, VirtualClock
+from g13lib.watchdog import WATCHED_SIGNALS, LoopWatchdog, watched
+
+
+class Watchdog(LoopWatchdog):
+    # keep the test's timers off the shared scheduler
+    scheduler = Scheduler(VirtualClock())
+
+
+def test_times_signal_handlers():
+    @watched("test_watchdog_sync")
+    def slow(sender):
+        time.sleep(0.03)
+
+    @watched("test_watchdog_async")
+    async def waits(sender):
+        # awaiting doesn't hold the loop
+        await asyncio.sleep(0.03)
+
+    sync_signal = blinker.signal("test_watchdog_sync")
+    async_signal = blinker.signal("test_watchdog_async")
+    sync_signal.connect(slow)
+    async_signal.connect(waits)
+
+    async def run():
+        watchdog = Watchdog(handler_budget_ms=20)
+        with mock.patch("g13lib.watchdog.logger") as logger:
+            sync_signal.send("x")
+            await async_signal.send_async("x")
+        await watchdog.stop_tasks()
+        # not timed once the watchdog's stopped
+        sync_signal.send("x")
+        return watchdog, logger
+
+    watchdog, logger = asyncio.run(run())
+    logger.warning.assert_called_once()
+    assert "slow" in logger.warning.call_args.args[1]
+
+    slow_stats = watchdog.stats["test_watchdog_sync: test_times_signal_handlers.<locals>.slow"]
+    assert slow_stats.calls == 1 and slow_stats.over_budget == 1
+    assert slow_stats.worst >= 0.03
+    wait_stats = watchdog.stats["test_watchdog_async: test_times_signal_handlers.<locals>.waits"]
+    assert wait_stats.calls == 1 and wait_stats.worst < 0.02
+
+    # the signals themselves are untouched
+    assert "send" not in vars(sync_signal)
+
+
+def test_times_scheduler_callbacks():
+    calls = []
+
+    async def run():
+        watchdog = Watchdog()
+        timer = watchdog.scheduler.every(10, lambda: calls.append(1), name="tick")
+        await watchdog.scheduler.run(until=watchdog.scheduler.clock.now() + 0.05)
+        await watchdog.stop_tasks()
+        watchdog.scheduler.cancel(timer)
+        return watchdog
+
+    watchdog = asyncio.run(run())
+    assert watchdog.stats["tick"].calls == len(calls) == 5
+    assert watchdog.scheduler.callback_wrapper is None
+
+
+def test_input_path_receivers_are_watched():
+    from g13lib.apps.general import GeneralManager
+    from g13lib.control import ControlServer
+    from g13lib.device.g13_output import G13DeviceOutputManager
+    from g13lib.plugins import PluginRegistry
+
+    # everything the daemon connects to the watched signals
+    components = [
+        GeneralManager(),
+        ControlServer(),
+        G13DeviceOutputManager(mock.MagicMock()),
+        PluginRegistry({}),
+    ]
+    for name in WATCHED_SIGNALS:
+        receivers = list(blinker.signal(name).receivers_for(blinker.ANY))
+        assert receivers, name
+        for receiver in receivers:
+            assert name in getattr(receiver, "watched_signals", ()), receiver
+
+    for component in components:
+        if hasattr(component, "stop_tasks"):
+            asyncio.run(component.stop_tasks())
@@ -0,0 +1,119 @@
+import asyncio
+import unittest.mock as mock
+
+import blinker
+import pytest
+
+from g13lib.lcd.widgets import BarMeter, BigNumber, ProgressBar, RingBuffer, Sparkline
+from g13lib.monitors import system_stats
+from g13lib.monitors.system_stats import SystemStats
+
+
+def column(widget, x: int) -> list[bool]:
+    return [bool(widget.image.getpixel((x, y))) for y in range(widget.size[1])]
+
+
+def test_ring_buffer():
+    ring = RingBuffer(3)
+    assert ring.values() == [] and ring.latest is None and ring.max() == 0.0
+    for value in (1, 5, 2, 4):
+        ring.append(value)
+    assert ring.values() == [5.0, 2.0, 4.0]
+    assert len(ring) == 3 and ring.latest == 4.0 and ring.max() == 5.0
+
+
+def test_sparkline_scrolls():
+    line = Sparkline((4, 4), maximum=4)
+    line.push(4)
+    line.push(2)
+    assert column(line, 3) == [False, False, True, True]
+    assert column(line, 2) == [True] * 4
+    assert column(line, 1) == [False] * 4
+    assert line.version == 2
+
+
+def test_sparkline_autoscale_redraws():
+    line = Sparkline((4, 4), autoscale=True)
+    line.push(2)
+    line.push(4)
+    # the first column's been drawn again at the new scale
+    assert column(line, 2) == [False, False, True, True]
+    assert column(line, 3) == [True] * 4
+    line.push(1)
+    assert column(line, 3) == [False, False, False, True]
+
+
+def test_bar_meter_only_changes_when_its_length_does():
+    meter = BarMeter((10, 2), maximum=10)
+    meter.push(5)
+    assert [bool(meter.image.getpixel((x, 0))) for x in range(10)] == [True] * 5 + [False] * 5
+    meter.push(5.01)
+    assert meter.version == 1
+    meter.push(2)
+    assert [bool(meter.image.getpixel((x, 1))) for x in range(10)] == [True] * 2 + [False] * 8
+    assert meter.version == 2
+
+
+def test_progress_bar_keeps_its_frame():
+    bar = ProgressBar((10, 6))
+    bar.push(1)
+    bar.push(0)
+    assert bar.image.getpixel((0, 3)) and bar.image.getpixel((9, 3))
+    assert not any(bar.image.getpixel((x, 3)) for x in range(1, 9))
+
+
+def test_big_number_redraws_on_new_text():
+    number = BigNumber((30, 24), scale=2)
+    number.push(42)
+    assert number.image.getbbox() is not None
+    number.push(42.2)
+    assert number.version == 1
+
+
+def test_widgets_follow_stats():
+    with mock.patch.dict(blinker.signal("g13_stats").receivers, clear=True):
+        meter = BarMeter((10, 2), stat="memory")
+        blinker.signal("g13_stats").send({"cpu": 1.0, "memory": 0.5})
+        assert meter.version == 1
+
+
+@pytest.fixture
+def proc(tmp_path, monkeypatch):
+    files = {
+        "PROC_STAT": "cpu  100 0 100 700 100 0 0 0 0 0\ncpu0 1 2 3 4 5\n",
+        "PROC_MEMINFO": "MemTotal:  1000 kB\nMemFree:  100 kB\nMemAvailable:  250 kB\n",
+        "PROC_NET_DEV": (
+            "Inter-|   Receive\n face |bytes\n"
+            "    lo: 999 0 0 0 0 0 0 0 999 0 0 0 0 0 0 0\n"
+            "  eth0: 1000 0 0 0 0 0 0 0 500 0 0 0 0 0 0 0\n"
+        ),
+    }
+    for name, content in files.items():
+        path = tmp_path / name
+        path.write_text(content)
+        monkeypatch.setattr(system_stats, name, str(path))
+    return tmp_path
+
+
+def test_system_stats(proc):
+    stats = SystemStats()
+    with mock.patch("g13lib.monitors.system_stats.time.monotonic", side_effect=[10, 12]):
+        first = stats.read()
+        assert first == {"cpu": 0.0, "memory": 0.75, "net_rx": 0.0, "net_tx": 0.0}
+        # a file kept open is read again from the start
+        (proc / "PROC_STAT").write_text("cpu  200 0 200 800 100 0 0 0 0 0\n")
+        (proc / "PROC_NET_DEV").write_text(
+            "h\nh\n  eth0: 3000 0 0 0 0 0 0 0 700 0 0 0 0 0 0 0\n"
+        )
+        second = stats.read()
+    assert second["cpu"] == pytest.approx(2 / 3)
+    assert second["net_rx"] == 1000 and second["net_tx"] == 100
+    asyncio.run(stats.stop_tasks())
+    assert stats.files == {}
+
+
+def test_system_stats_without_proc(monkeypatch):
+    monkeypatch.setattr(system_stats, "PROC_STAT", "/nonexistent/stat")
+    stats = SystemStats()
+    assert stats.files == {}
+    assert not getattr(stats, "_timers", [])